@@ -1,5 +1,119 @@
-from django.contrib import admin
-from .models import Group, Teacher, Classroom, Schedule, ExtraLesson
+from datetime import date
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.safestring import mark_safe
+
+from . import bulk, export
+from .conflicts import SCHEDULE, EXTRA
+from .models import (
+    Group, Teacher, Classroom, Schedule, ExtraLesson, ArchivedExtraLesson, LessonRequirement, WEEKDAYS,
+)
+from .month_calendar import render_month, shift_month
+from .profiling import stats_buffer, query_budget
+
+# Сколько конфликтов показывать в сообщении после неудачного массового действия.
+MAX_REPORTED_ERRORS = 10
+
+
+class LessonActionForm(ActionForm):
+    # Параметры массовых действий выводятся рядом со списком действий.
+    minutes = forms.IntegerField(required=False, label="Минуты",
+                                 widget=forms.NumberInput(attrs={'placeholder': "Минуты"}))
+    teacher = forms.ModelChoiceField(Teacher.objects.all(), required=False, label="Учитель")
+    classroom = forms.ModelChoiceField(Classroom.objects.all(), required=False, label="Аудитория")
+
+
+class ScheduleActionForm(LessonActionForm):
+    weekday = forms.ChoiceField(choices=[('', '---------')] + WEEKDAYS, required=False, label="День недели")
+
+
+class ExtraLessonActionForm(LessonActionForm):
+    date_from = forms.DateField(required=False, label="С", widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, label="По", widget=forms.DateInput(attrs={'type': 'date'}))
+
+
+class BulkLessonActionsMixin:
+    """
+    Массовые действия над уроками: весь набор проверяется на пересечения
+    в памяти и записывается одной транзакцией через bulk_update/bulk_create,
+    без save() и clean() на каждый объект. При конфликте не меняется ничего.
+    """
+    lesson_kind = None
+
+    def action_params(self, request, *required):
+        form = self.action_form(request.POST)
+        form.is_valid()
+        params = form.cleaned_data
+        missing = [form.fields[name].label for name in required if params.get(name) in (None, '')]
+        if missing:
+            self.message_user(request, "Укажите: " + ", ".join(missing), messages.ERROR)
+            return None
+        return params
+
+    def run_bulk(self, request, func, *args):
+        try:
+            count = func(*args)
+        except ValidationError as exc:
+            errors = exc.messages
+            text = "; ".join(errors[:MAX_REPORTED_ERRORS])
+            if len(errors) > MAX_REPORTED_ERRORS:
+                text += f" … и ещё {len(errors) - MAX_REPORTED_ERRORS}"
+            self.message_user(request, "Изменения не сохранены: " + text, messages.ERROR)
+            return
+        self.message_user(request, f"Сохранено уроков: {count}", messages.SUCCESS)
+
+    @admin.action(description="Сдвинуть время на N минут")
+    def shift_time(self, request, queryset):
+        params = self.action_params(request, 'minutes')
+        if params:
+            self.run_bulk(request, bulk.shift_time, self.lesson_kind, queryset, params['minutes'])
+
+    @admin.action(description="Назначить учителя")
+    def reassign_teacher(self, request, queryset):
+        params = self.action_params(request, 'teacher')
+        if params:
+            self.run_bulk(request, bulk.reassign, self.lesson_kind, queryset, 'teacher', params['teacher'])
+
+    @admin.action(description="Назначить аудиторию")
+    def reassign_classroom(self, request, queryset):
+        params = self.action_params(request, 'classroom')
+        if params:
+            self.run_bulk(request, bulk.reassign, self.lesson_kind, queryset, 'classroom', params['classroom'])
+
+
+def profiling_view(request):
+    # Сводка QueryProfilerMiddleware: перцентили времени и числа запросов по представлениям.
+    if request.method == 'POST':
+        stats_buffer.clear()
+        return redirect('admin_profiling')
+    summary = stats_buffer.summary()
+    context = {
+        **admin.site.each_context(request),
+        'title': "Профилирование запросов",
+        'rows': [(row, query_budget(row.view)) for row in summary],
+        'requests': sum(row.requests for row in summary),
+    }
+    return TemplateResponse(request, 'admin/profiling.html', context)
+
+
+class ExportActionsMixin:
+    # Потоковая выгрузка выбранных уроков (см. app/export.py).
+    exporter = None
+
+    @admin.action(description="Выгрузить в CSV")
+    def export_csv(self, request, queryset):
+        return self.exporter(queryset, 'csv')
+
+    @admin.action(description="Выгрузить в Excel (XLSX)")
+    def export_xlsx(self, request, queryset):
+        return self.exporter(queryset, 'xlsx')
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -22,26 +136,118 @@ class ClassroomAdmin(admin.ModelAdmin):
     list_per_page = 20
 
 @admin.register(Schedule)
-class ScheduleAdmin(admin.ModelAdmin):
+class ScheduleAdmin(ExportActionsMixin, BulkLessonActionsMixin, admin.ModelAdmin):
     list_display = ('group', 'teacher', 'classroom', 'start_time', 'end_time', 'repeat_weekly', 'weekday')
     list_filter = ('group', 'teacher', 'classroom', 'repeat_weekly', 'weekday')
     search_fields = ('group__name', 'teacher__name', 'teacher__surname', 'classroom__room_number')
     list_editable = ('repeat_weekly',)
     list_per_page = 20
-    actions = ['make_repeat_weekly', 'remove_repeat_weekly']
+    # classroom может быть пустым, а без явного списка Django подтягивает
+    # только обязательные внешние ключи — __str__ и list_display давали N+1.
+    list_select_related = ('group', 'teacher', 'classroom')
+    actions = [
+        'make_repeat_weekly', 'remove_repeat_weekly',
+        'shift_time', 'move_to_weekday', 'reassign_teacher', 'reassign_classroom',
+        'export_csv', 'export_xlsx',
+    ]
+    action_form = ScheduleActionForm
+    lesson_kind = SCHEDULE
+    exporter = staticmethod(export.export_schedules)
 
     @admin.action(description="Сделать повторяемым еженедельно")
     def make_repeat_weekly(self, request, queryset):
-        queryset.update(repeat_weekly=True)
+        self.run_bulk(request, bulk.set_repeat_weekly, queryset, True)
 
     @admin.action(description="Убрать повторение еженедельно")
     def remove_repeat_weekly(self, request, queryset):
-        queryset.update(repeat_weekly=False)
+        self.run_bulk(request, bulk.set_repeat_weekly, queryset, False)
+
+    @admin.action(description="Перенести на день недели")
+    def move_to_weekday(self, request, queryset):
+        params = self.action_params(request, 'weekday')
+        if params:
+            self.run_bulk(request, bulk.move_to_weekday, queryset, params['weekday'])
+
+    def get_urls(self):
+        urls = [
+            path('calendar/', self.admin_site.admin_view(self.calendar_view), name='app_schedule_calendar'),
+        ]
+        return urls + super().get_urls()
+
+    def calendar_view(self, request):
+        today = date.today()
+        try:
+            year = int(request.GET.get('year', today.year))
+            month = int(request.GET.get('month', today.month))
+        except ValueError:
+            year, month = today.year, today.month
+        # Месяц вне 1..12 переносится на соседний год.
+        year, month = shift_month(year, month, 0)
+        if not 1 <= year <= 9999:
+            year, month = today.year, today.month
+
+        prev_year, prev_month = shift_month(year, month, -1)
+        next_year, next_month = shift_month(year, month, 1)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f"Расписание на {month:02d}.{year}",
+            'calendar': mark_safe(render_month(year, month)),
+            'month': month,
+            'year': year,
+            'prev_month': prev_month,
+            'prev_year': prev_year,
+            'next_month': next_month,
+            'next_year': next_year,
+        }
+        return TemplateResponse(request, 'admin/schedule_calendar.html', context)
 
 @admin.register(ExtraLesson)
-class ExtraLessonAdmin(admin.ModelAdmin):
+class ExtraLessonAdmin(ExportActionsMixin, BulkLessonActionsMixin, admin.ModelAdmin):
     list_display = ('teacher', 'classroom', 'date', 'start_time', 'end_time', 'is_online')
     list_filter = ('is_online', 'date')
     search_fields = ('teacher__name', 'teacher__surname', 'classroom__room_number')
     date_hierarchy = 'date'
     list_per_page = 20
+    list_select_related = ('teacher', 'classroom')
+    actions = ['shift_time', 'reassign_teacher', 'reassign_classroom', 'copy_week', 'export_csv', 'export_xlsx']
+    action_form = ExtraLessonActionForm
+    lesson_kind = EXTRA
+    exporter = staticmethod(export.export_extra_lessons)
+
+    @admin.action(description="Скопировать неделю на период")
+    def copy_week(self, request, queryset):
+        params = self.action_params(request, 'date_from', 'date_to')
+        if not params:
+            return
+        if params['date_from'] > params['date_to']:
+            self.message_user(request, "Конец периода раньше начала.", messages.ERROR)
+            return
+        self.run_bulk(request, bulk.copy_week, queryset, params['date_from'], params['date_to'])
+
+@admin.register(ArchivedExtraLesson)
+class ArchivedExtraLessonAdmin(admin.ModelAdmin):
+    # Архив только для просмотра. Строк в нём много, поэтому без date_hierarchy
+    # и без подсчёта общего числа строк при фильтрации.
+    list_display = ('teacher', 'classroom', 'date', 'start_time', 'end_time', 'is_online')
+    list_filter = ('is_online',)
+    search_fields = ('teacher__name', 'teacher__surname', 'classroom__room_number')
+    list_per_page = 20
+    list_select_related = ('teacher', 'classroom')
+    show_full_result_count = False
+    ordering = ('-date', '-start_time')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(LessonRequirement)
+class LessonRequirementAdmin(admin.ModelAdmin):
+    list_display = ('group', 'teacher', 'lessons_per_week', 'duration')
+    list_filter = ('teacher',)
+    search_fields = ('group__name', 'teacher__name', 'teacher__surname')
+    list_editable = ('lessons_per_week', 'duration')
+    list_select_related = ('group', 'teacher')
+    list_per_page = 20
@@ -0,0 +1,192 @@
+from datetime import time, timedelta
+
+from django.db.models import DurationField, ExpressionWrapper, F, Q, Sum, TimeField, Value
+from django.db.models.functions import Greatest, Least
+
+from . import archive, caching
+from .availability import DAY_START, DAY_END, working_weekdays
+from .models import Classroom, Teacher, Schedule, WEEKDAYS, weekday_code
+
+ANALYTICS_PREFIX = 'timetable:analytics:'
+OWNER_NAMES = {
+    'classroom': lambda: dict(Classroom.objects.values_list('id', 'room_number')),
+    'teacher': lambda: {pk: f"{name} {surname}" for pk, name, surname in
+                        Teacher.objects.values_list('id', 'name', 'surname')},
+}
+WEEKDAY_CODES = [code for code, _ in WEEKDAYS]
+LESSON_DURATION = ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
+ONLINE_GROUP = Q(group__is_online=True) | Q(group__is_individual_online=True)
+
+
+def cached(name, compute, scopes, *params):
+    """
+    Результат считается один раз на версии своих областей: недельных сводок
+    нужного вида владельцев (или одного владельца) и названий. Изменение
+    урока другой недели или аудитории в отчёте по учителям его не сбрасывает.
+    """
+    cache = caching.get_cache()
+    key = ANALYTICS_PREFIX + ':'.join([name, *map(str, params)])
+    versions = caching.current_versions(scopes)
+    entry = cache.get(key)
+    if entry is not None and entry['versions'] == versions:
+        return entry['data']
+    data = compute(*params)
+    cache.set(key, {'versions': versions, 'data': data}, 60 * 60 * 24)
+    return data
+
+
+def monday(week):
+    return None if week is None else week - timedelta(days=week.weekday())
+
+
+def report_scopes(field, week, owner_id=None):
+    if owner_id is not None:
+        return {caching.scope(field, owner_id)}
+    scopes = {caching.week_scope(field, caching.WEEKLY), caching.NAMES}
+    if week is not None:
+        scopes.add(caching.week_scope(field, week.isoformat()))
+    return scopes
+
+
+def week_dates(week):
+    # week — любая дата недели; доп. уроки берутся с понедельника по воскресенье.
+    if week is None:
+        return {code: None for code in WEEKDAY_CODES}
+    week = monday(week)
+    return {code: week + timedelta(days=n) for n, code in enumerate(WEEKDAY_CODES)}
+
+
+def busy_time(start, end):
+    """
+    Сумма части уроков внутри [start, end) — для Sum() в БД. Уроки одного
+    владельца не пересекаются (это проверяется при записи), поэтому сумма
+    длительностей равна занятому времени.
+    """
+    overlap = ExpressionWrapper(
+        Least(F('end_time'), Value(end, output_field=TimeField()))
+        - Greatest(F('start_time'), Value(start, output_field=TimeField())),
+        output_field=DurationField(),
+    )
+    return Sum(overlap, filter=Q(start_time__lt=end, end_time__gt=start))
+
+
+def weekly_rows(field, week, owner_id=None, **aggregates):
+    """
+    Агрегаты по (владелец, день недели): еженедельное расписание и, если
+    указана неделя, её доп. уроки (вместе с архивом). Строки группируются
+    в БД, в Python приходят только суммы.
+    """
+    owner = f'{field}_id'
+    filters = Q(**{f'{owner}__isnull': False})
+    if owner_id is not None:
+        filters &= Q(**{owner: owner_id})
+    for row in Schedule.objects.filter(filters).values(owner, 'weekday').annotate(**aggregates):
+        yield row[owner], row['weekday'], row
+    if week is not None:
+        dates = week_dates(week)
+        extra_lessons = archive.extra_lessons(dates['mon']).filter(filters, date__range=(dates['mon'], dates['sun']))
+        for row in extra_lessons.values(owner, 'date').annotate(**aggregates):
+            yield row[owner], weekday_code(row['date']), row
+
+
+def _utilisation(field, week):
+    window = time_minutes(DAY_END) - time_minutes(DAY_START)
+    # Занятые минуты и ёмкость считаются по одним и тем же учебным дням:
+    # уроки в выходной видны в своей колонке, но долю за 100% не поднимают.
+    working = [code for code in WEEKDAY_CODES if code in set(working_weekdays())]
+    capacity = window * len(working)
+    rows = {
+        owner_id: {'id': owner_id, 'name': name, **{code: 0 for code in WEEKDAY_CODES}}
+        for owner_id, name in OWNER_NAMES[field]().items()
+    }
+    for owner_id, code, row in weekly_rows(field, week, busy=busy_time(DAY_START, DAY_END)):
+        if owner_id in rows:
+            rows[owner_id][code] += minutes(row['busy'])
+    result = sorted(rows.values(), key=lambda row: row['name'])
+    for row in result:
+        row['minutes'] = sum(row[code] for code in working)
+        row['utilisation'] = round(row['minutes'] / capacity, 4) if capacity else 0
+    return result
+
+
+def utilisation(field, week=None):
+    """
+    Загрузка каждой аудитории или учителя: занятые минуты по дням недели в
+    пределах DAY_START..DAY_END, их сумма по учебным дням (WORKING_WEEKDAYS)
+    и доля от учебной недели.
+    С week учитываются и доп. уроки этой недели.
+    """
+    week = monday(week)
+    return cached('utilisation', _utilisation, report_scopes(field, week), field, week)
+
+
+def hours():
+    last_hour = DAY_END.hour + (1 if DAY_END.minute else 0)
+    return list(range(DAY_START.hour, last_hour))
+
+
+def _heatmap(field, owner_id, week):
+    owners = 1 if owner_id is not None else len(OWNER_NAMES[field]())
+    aggregates = {
+        f'{hour:02d}': busy_time(time(hour), time(hour + 1) if hour < 23 else time.max)
+        for hour in hours()
+    }
+    busy = {code: dict.fromkeys(aggregates, 0) for code in WEEKDAY_CODES}
+    for _, code, row in weekly_rows(field, week, owner_id, **aggregates):
+        for name in aggregates:
+            busy[code][name] += minutes(row[name])
+    return [
+        {'weekday': code, **{name: round(value / (60 * owners), 4) if owners else 0 for name, value in busy[code].items()}}
+        for code in WEEKDAY_CODES
+    ]
+
+
+def heatmap(field, owner_id=None, week=None):
+    """
+    Тепловая карта «день недели × час»: доля занятого времени всех аудиторий
+    (учителей) или одного владельца. Часы пик — ячейки с наибольшей долей.
+    """
+    week = monday(week)
+    return cached('heatmap', _heatmap, report_scopes(field, week, owner_id), field, owner_id, week)
+
+
+def minutes(value):
+    return int(value.total_seconds() // 60) if value else 0
+
+
+def time_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _online_split(week):
+    names = OWNER_NAMES['teacher']()
+    totals = {pk: {'id': pk, 'name': name, 'online': 0, 'offline': 0} for pk, name in names.items()}
+    weekly = Schedule.objects.values('teacher_id').annotate(
+        online=Sum(LESSON_DURATION, filter=ONLINE_GROUP),
+        offline=Sum(LESSON_DURATION, filter=~ONLINE_GROUP),
+    )
+    rows = list(weekly)
+    if week is not None:
+        dates = week_dates(week)
+        rows += archive.extra_lessons(dates['mon']).filter(date__range=(dates['mon'], dates['sun'])).values('teacher_id').annotate(
+            online=Sum(LESSON_DURATION, filter=Q(is_online=True)),
+            offline=Sum(LESSON_DURATION, filter=Q(is_online=False)),
+        )
+    for row in rows:
+        total = totals.setdefault(row['teacher_id'], {'id': row['teacher_id'], 'name': '', 'online': 0, 'offline': 0})
+        total['online'] += minutes(row['online'])
+        total['offline'] += minutes(row['offline'])
+    result = sorted(totals.values(), key=lambda row: row['name'])
+    for row in result:
+        row['online_share'] = round(row['online'] / (row['online'] + row['offline']), 4) if row['online'] + row['offline'] else 0
+    return result
+
+
+def online_split(week=None):
+    """
+    Минуты онлайн и офлайн занятий каждого учителя в неделю. Считается
+    агрегацией в БД: онлайн — занятия онлайн-групп (is_online,
+    is_individual_online) и доп. уроки с is_online.
+    """
+    week = monday(week)
+    return cached('online', _online_split, report_scopes('teacher', week), week)
@@ -0,0 +1,95 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import caching
+from .bulk import reload_indexes
+from .models import ExtraLesson, ArchivedExtraLesson, ExtraLessonHistory
+
+COLUMNS = ('id', 'teacher_id', 'classroom_id', 'date', 'start_time', 'end_time', 'is_individual', 'is_online')
+
+
+def retention_days():
+    return getattr(settings, 'EXTRA_LESSON_RETENTION_DAYS', None)
+
+
+def archive_boundary(today=None):
+    """
+    Первая дата, которая гарантированно есть в рабочей таблице: всё, что
+    раньше, могло уйти в архив. Граница считается от настройки, а не от
+    содержимого архива, поэтому выбор таблицы не стоит ни одного запроса.
+    None — архивирование выключено.
+    """
+    days = retention_days()
+    if days is None:
+        return None
+    return (today or date.today()) - timedelta(days=days)
+
+
+def reaches_archive(date_from, date_to=None):
+    # Период без начала или с любой границей до границы архива захватывает архив.
+    boundary = archive_boundary()
+    if boundary is None:
+        return False
+    return date_from is None or date_from < boundary or (date_to is not None and date_to < boundary)
+
+
+def extra_lessons(date_from=None, date_to=None):
+    """
+    Менеджер доп. уроков для периода date_from..date_to (любая граница может
+    быть None). Период целиком не раньше границы архива — рабочая таблица,
+    иначе представление с рабочими и архивными уроками (только для чтения).
+    """
+    return ExtraLessonHistory.objects if reaches_archive(date_from, date_to) else ExtraLesson.objects
+
+
+def archive_extra_lessons(batch_size=5000, dry_run=False, progress=None):
+    """
+    Переносит доп. уроки с датой раньше границы архива в ArchivedExtraLesson
+    пачками по batch_size, каждая пачка — в своей транзакции (INSERT ...
+    SELECT и DELETE по списку id), так что рабочая таблица не блокируется
+    надолго. Сигналы не вызываются: урок не
+    изменился, поэтому в журнал изменений перенос не пишется. Возвращает
+    число перенесённых уроков.
+    """
+    before = archive_boundary()
+    if before is None:
+        return 0
+    queryset = ExtraLesson.objects.filter(date__lt=before)
+    if dry_run:
+        return queryset.count()
+
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(column) for column in COLUMNS)
+    live, archived = quote(ExtraLesson._meta.db_table), quote(ArchivedExtraLesson._meta.db_table)
+    moved, scopes = 0, {caching.ALL}
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.values_list('id', 'teacher_id', 'classroom_id')[:batch_size])
+            if not rows:
+                break
+            ids = [pk for pk, _, _ in rows]
+            placeholders = ', '.join(['%s'] * len(ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {archived} ({columns}) SELECT {columns} FROM {live} WHERE id IN ({placeholders})",
+                    ids,
+                )
+                cursor.execute(f"DELETE FROM {live} WHERE id IN ({placeholders})", ids)
+        for _, teacher_id, classroom_id in rows:
+            scopes.add(caching.scope('teacher', teacher_id))
+            if classroom_id is not None:
+                scopes.add(caching.scope('classroom', classroom_id))
+        moved += len(rows)
+        if progress:
+            progress(moved)
+
+    if moved:
+        # Как после bulk-операций: индексы в памяти больше не должны видеть
+        # перенесённые уроки, а закэшированные ответы с ними устарели.
+        def after_commit():
+            caching.bump(scopes)
+            reload_indexes()
+        transaction.on_commit(after_commit)
+    return moved
@@ -0,0 +1,125 @@
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.http import JsonResponse, Http404, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import ValidationError
+
+from . import archive, changes
+from .models import Group, Schedule, WEEKDAYS
+from .serializers import ScheduleSerializer, ExtraLessonSerializer
+from .views import filter_schedules, filter_extra_lessons, int_param, date_range_params, change_filter
+
+# Асинхронные эндпоинты чтения расписания для запуска под ASGI
+# (uvicorn core.asgi:application). Пагинация — по ключу (после id / даты и id),
+# без OFFSET, как и в синхронном API.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+WEEKDAY_ORDER = {code: number for number, (code, _) in enumerate(WEEKDAYS)}
+
+
+def page_size(params):
+    size = int_param(params, 'page_size') or DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def next_url(request, cursor):
+    params = request.GET.copy()
+    params['after'] = cursor
+    return f'{request.path}?{params.urlencode()}'
+
+
+def bad_request(exc):
+    return JsonResponse(exc.detail, status=400, safe=False)
+
+
+@require_safe
+async def schedule_list(request):
+    try:
+        queryset = filter_schedules(
+            Schedule.objects.select_related('group', 'teacher', 'classroom'), request.GET
+        )
+        after = int_param(request.GET, 'after')
+        size = page_size(request.GET)
+    except ValidationError as exc:
+        return bad_request(exc)
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+
+    lessons = [lesson async for lesson in queryset.order_by('id')[:size + 1]]
+    more = len(lessons) > size
+    lessons = lessons[:size]
+    return JsonResponse({
+        'next': next_url(request, lessons[-1].id) if more else None,
+        'results': ScheduleSerializer(lessons, many=True).data,
+    })
+
+
+@require_safe
+async def extra_lesson_list(request):
+    try:
+        lessons = archive.extra_lessons(*date_range_params(request.GET))
+        queryset = filter_extra_lessons(lessons.select_related('teacher', 'classroom'), request.GET)
+        size = page_size(request.GET)
+        after = request.GET.get('after')
+        if after:
+            after_date, _, after_id = after.partition('.')
+            after_date, after_id = parse_date(after_date), int(after_id)
+            if after_date is None:
+                raise ValueError
+            queryset = queryset.filter(Q(date__gt=after_date) | Q(date=after_date, id__gt=after_id))
+    except ValidationError as exc:
+        return bad_request(exc)
+    except ValueError:
+        return JsonResponse({'after': "Некорректный курсор."}, status=400)
+
+    lessons = [lesson async for lesson in queryset.order_by('date', 'id')[:size + 1]]
+    more = len(lessons) > size
+    lessons = lessons[:size]
+    return JsonResponse({
+        'next': next_url(request, f'{lessons[-1].date}.{lessons[-1].id}') if more else None,
+        'results': ExtraLessonSerializer(lessons, many=True).data,
+    })
+
+
+@require_safe
+async def group_timetable(request, pk):
+    try:
+        group = await Group.objects.aget(pk=pk)
+    except Group.DoesNotExist:
+        raise Http404
+    lessons = [
+        lesson async for lesson in Schedule.objects.filter(group=group)
+        .select_related('group', 'teacher', 'classroom')
+    ]
+    lessons.sort(key=lambda lesson: (WEEKDAY_ORDER[lesson.weekday], lesson.start_time))
+    return JsonResponse({
+        'id': group.id,
+        'name': group.name,
+        'is_online': group.is_online or group.is_individual_online,
+        'lessons': ScheduleSerializer(lessons, many=True).data,
+    })
+
+
+@require_safe
+async def change_stream(request):
+    """
+    Изменения уроков как Server-Sent Events (только под ASGI: соединение
+    держится открытым). Параметры как у /api/changes/; при переподключении
+    браузер сам передаёт номер последнего события в Last-Event-ID.
+    """
+    try:
+        field, owner_id = change_filter(request.GET)
+        since = int_param(request.GET, 'since')
+        if since is None:
+            since = int_param(request.headers, 'Last-Event-ID')
+    except ValidationError as exc:
+        return bad_request(exc)
+    if since is None:
+        since = await sync_to_async(changes.head)()
+    response = StreamingHttpResponse(
+        changes.event_stream(since, field, owner_id), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,144 @@
+from collections import namedtuple
+from datetime import time
+
+from django.conf import settings
+
+from . import caching
+from .conflicts import time_to_seconds
+from .models import Classroom, Schedule, ExtraLesson, weekday_code
+from .occupancy import get_occupancy
+
+AVAILABILITY_PREFIX = 'timetable:busy:'
+DAY_START = time(8, 0)
+DAY_END = time(21, 0)
+DEFAULT_WORKING_WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat')
+
+FreeSlot = namedtuple('FreeSlot', 'classroom_id room_number start end')
+
+
+def working_weekdays():
+    # Учебные дни недели: по ним решатель ставит занятия и считается загрузка.
+    return list(getattr(settings, 'WORKING_WEEKDAYS', DEFAULT_WORKING_WEEKDAYS))
+
+
+def seconds_to_time(value):
+    return time(value // 3600, value % 3600 // 60, value % 60)
+
+
+def merge_intervals(intervals):
+    # Сортирует и склеивает пересекающиеся и смежные интервалы: O(n log n).
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _busy_by_room(weekday, lesson_date):
+    busy = {}
+    rows = Schedule.objects.filter(weekday=weekday, classroom__isnull=False).values_list(
+        'classroom_id', 'start_time', 'end_time'
+    )
+    for classroom_id, start, end in rows:
+        busy.setdefault(classroom_id, []).append((time_to_seconds(start), time_to_seconds(end)))
+    if lesson_date is not None:
+        rows = ExtraLesson.objects.filter(date=lesson_date, classroom__isnull=False).values_list(
+            'classroom_id', 'start_time', 'end_time'
+        )
+        for classroom_id, start, end in rows:
+            busy.setdefault(classroom_id, []).append((time_to_seconds(start), time_to_seconds(end)))
+    return {classroom_id: merge_intervals(intervals) for classroom_id, intervals in busy.items()}
+
+
+def busy_intervals(weekday=None, lesson_date=None):
+    """
+    Занятые интервалы (в секундах от полуночи) всех аудиторий на день
+    недели или дату. Кэшируется на день и сбрасывается при любом изменении
+    расписания.
+    """
+    if lesson_date is not None:
+        weekday = weekday_code(lesson_date)
+    cache = caching.get_cache()
+    key = f'{AVAILABILITY_PREFIX}{lesson_date or weekday}'
+    version = caching.current_versions({caching.ALL})[caching.ALL]
+    entry = cache.get(key)
+    if entry is not None and entry['version'] == version:
+        return entry['rooms'], entry['busy']
+
+    rooms = dict(Classroom.objects.values_list('id', 'room_number'))
+    busy = _busy_by_room(weekday, lesson_date)
+    cache.set(key, {'version': version, 'rooms': rooms, 'busy': busy}, 60 * 60 * 24)
+    return rooms, busy
+
+
+def teacher_busy_intervals(teacher, weekday=None, lesson_date=None):
+    if lesson_date is not None:
+        weekday = weekday_code(lesson_date)
+    intervals = [
+        (time_to_seconds(start), time_to_seconds(end))
+        for start, end in Schedule.objects.filter(teacher=teacher, weekday=weekday).values_list(
+            'start_time', 'end_time'
+        )
+    ]
+    if lesson_date is not None:
+        intervals += [
+            (time_to_seconds(start), time_to_seconds(end))
+            for start, end in ExtraLesson.objects.filter(teacher=teacher, date=lesson_date).values_list(
+                'start_time', 'end_time'
+            )
+        ]
+    return merge_intervals(intervals)
+
+
+def free_slots(duration, weekday=None, lesson_date=None, classrooms=None, teacher=None,
+               day_start=DAY_START, day_end=DAY_END):
+    """
+    Свободные окна (аудитория, начало, конец) длиной не меньше duration минут
+    в пределах [day_start, day_end]. Если указан учитель, его занятость
+    вычитается из окон всех аудиторий.
+    """
+    if weekday is None and lesson_date is None:
+        raise ValueError("Нужно указать день недели или дату.")
+    occupancy = get_occupancy()
+    if occupancy is not None:
+        return occupancy_free_slots(occupancy, duration, weekday, lesson_date, classrooms, teacher, day_start, day_end)
+    rooms, busy = busy_intervals(weekday, lesson_date)
+    extra_busy = teacher_busy_intervals(teacher, weekday, lesson_date) if teacher is not None else []
+
+    need = duration * 60
+    lower, upper = time_to_seconds(day_start), time_to_seconds(day_end)
+    room_ids = sorted(rooms, key=rooms.get) if classrooms is None else [pk for pk in classrooms if pk in rooms]
+    slots = []
+    for classroom_id in room_ids:
+        intervals = busy.get(classroom_id, [])
+        if extra_busy:
+            intervals = merge_intervals(intervals + extra_busy)
+        cursor = lower
+        for start, end in intervals:
+            if start >= upper:
+                break
+            if start - cursor >= need:
+                slots.append(FreeSlot(classroom_id, rooms[classroom_id], seconds_to_time(cursor), seconds_to_time(start)))
+            cursor = max(cursor, end)
+        if upper - cursor >= need:
+            slots.append(FreeSlot(classroom_id, rooms[classroom_id], seconds_to_time(cursor), seconds_to_time(upper)))
+    return slots
+
+
+def occupancy_free_slots(occupancy, duration, weekday, lesson_date, classrooms, teacher, day_start, day_end):
+    # То же по битовым маскам (app/occupancy.py): одно побитовое И на аудиторию.
+    if lesson_date is not None:
+        weekday = weekday_code(lesson_date)
+    rooms = dict(Classroom.objects.values_list('id', 'room_number'))
+    teacher_busy = occupancy.mask('teacher', teacher, weekday, lesson_date) if teacher is not None else 0
+    room_ids = sorted(rooms, key=rooms.get) if classrooms is None else [pk for pk in classrooms if pk in rooms]
+    return [
+        FreeSlot(classroom_id, rooms[classroom_id], start, end)
+        for classroom_id in room_ids
+        for start, end in occupancy.free_slots(
+            'classroom', classroom_id, weekday, day_start, day_end, duration, date=lesson_date, busy=teacher_busy
+        )
+    ]
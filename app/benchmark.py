@@ -0,0 +1,689 @@
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time as perf
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import date, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import Q
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from . import caching, daily
+from .models import Group, Teacher, Classroom, Schedule, ExtraLesson, LessonRequirement, DailyTimetable, WEEKDAYS
+from .profiling import percentile
+
+
+def close_connection():
+    # close() у SQLite в памяти ничего не делает (иначе БД пропала бы), а
+    # следующему сценарию нужна пустая БД: соединение закрывается напрямую.
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        BaseDatabaseWrapper.close(connection)
+    else:
+        connection.close()
+
+
+@contextmanager
+def temporary_database():
+    # Отдельная тестовая БД, чтобы бенчмарки не трогали рабочие данные.
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        close_connection()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def generate(groups=200, teachers=100, classrooms=50, lessons=5000, extra_lessons=5000,
+             start_date=date(2025, 1, 1), days=365, seed=0, batch_size=2000):
+    """
+    Заполняет БД синтетическими данными через bulk_create (без clean()),
+    поэтому пересечения в сгенерированном расписании возможны.
+    """
+    rnd = random.Random(seed)
+    Group.objects.bulk_create(
+        Group(
+            name=f"Группа {n}",
+            is_online=rnd.random() < 0.15,
+            is_individual=rnd.random() < 0.1,
+            is_individual_online=rnd.random() < 0.05,
+        )
+        for n in range(groups)
+    )
+    Teacher.objects.bulk_create(
+        Teacher(name=f"Имя {n}", surname=f"Фамилия {n}") for n in range(teachers)
+    )
+    Classroom.objects.bulk_create(Classroom(room_number=f"{n + 100}") for n in range(classrooms))
+
+    groups = list(Group.objects.values_list('id', 'is_online', 'is_individual_online'))
+    teacher_ids = list(Teacher.objects.values_list('id', flat=True))
+    classroom_ids = list(Classroom.objects.values_list('id', flat=True))
+    weekday_codes = [code for code, _ in WEEKDAYS]
+
+    def random_slot():
+        start = rnd.randrange(8 * 60, 20 * 60, 15)
+        end = start + rnd.choice([45, 60, 90])
+        return time(start // 60, start % 60), time(end // 60, end % 60)
+
+    def schedules():
+        for _ in range(lessons):
+            group_id, is_online, is_individual_online = rnd.choice(groups)
+            start_time, end_time = random_slot()
+            yield Schedule(
+                group_id=group_id,
+                teacher_id=rnd.choice(teacher_ids),
+                classroom_id=None if is_online or is_individual_online else rnd.choice(classroom_ids),
+                weekday=rnd.choice(weekday_codes),
+                start_time=start_time,
+                end_time=end_time,
+            )
+
+    def extras():
+        for _ in range(extra_lessons):
+            is_online = rnd.random() < 0.2
+            start_time, end_time = random_slot()
+            yield ExtraLesson(
+                teacher_id=rnd.choice(teacher_ids),
+                classroom_id=None if is_online else rnd.choice(classroom_ids),
+                date=start_date + timedelta(days=rnd.randrange(days)),
+                start_time=start_time,
+                end_time=end_time,
+                is_individual=f"Ученик {rnd.randrange(1000)}",
+                is_online=is_online,
+            )
+
+    Schedule.objects.bulk_create(schedules(), batch_size=batch_size)
+    ExtraLesson.objects.bulk_create(extras(), batch_size=batch_size)
+
+
+def timed(func):
+    # Время одного вызова в миллисекундах.
+    started = perf.perf_counter()
+    func()
+    return (perf.perf_counter() - started) * 1000
+
+
+def summarize(timings, queries):
+    timings = sorted(timings)
+    return {
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'best_ms': round(timings[0], 3),
+        'queries': queries,
+        'repeat': len(timings),
+    }
+
+
+def sample(func, repeat=50):
+    """
+    Время каждого вызова func (первый прогон — разогрев, не учитывается)
+    и число запросов к БД за один вызов.
+    """
+    func()
+    timings = [timed(func) for _ in range(repeat)]
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    return summarize(timings, len(queries))
+
+
+# Имя замера -> функция(repeat), возвращающая словарь summarize().
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def fresh_owners(count):
+    # Свои группа, учитель и аудитория на каждый вызов: сохранение всегда
+    # проходит проверку пересечений и доходит до INSERT.
+    marker = uuid.uuid4().hex[:8]
+    groups = Group.objects.bulk_create(Group(name=f"Замер {marker} {n}") for n in range(count))
+    teachers = Teacher.objects.bulk_create(Teacher(name="Замер", surname=f"{marker} {n}") for n in range(count))
+    classrooms = Classroom.objects.bulk_create(Classroom(room_number=f"{marker}-{n}") for n in range(count))
+    return iter(list(zip(groups, teachers, classrooms)))
+
+
+@benchmark('schedule_create')
+def bench_schedule_create(repeat):
+    owners = fresh_owners(repeat + 2)
+
+    def create():
+        group, teacher, classroom = next(owners)
+        Schedule(group=group, teacher=teacher, classroom=classroom, weekday='mon',
+                 start_time=time(10), end_time=time(11)).save()
+    return sample(create, repeat)
+
+
+@benchmark('schedule_update')
+def bench_schedule_update(repeat):
+    group, teacher, classroom = next(fresh_owners(1))
+    lesson = Schedule.objects.create(group=group, teacher=teacher, classroom=classroom, weekday='tue',
+                                     start_time=time(10), end_time=time(11))
+    return sample(lesson.save, repeat)
+
+
+@benchmark('extra_lesson_create')
+def bench_extra_lesson_create(repeat):
+    owners = fresh_owners(repeat + 2)
+
+    def create():
+        _, teacher, classroom = next(owners)
+        ExtraLesson(teacher=teacher, classroom=classroom, date=date(2025, 3, 5), is_individual="Замер",
+                    start_time=time(10), end_time=time(11)).save()
+    return sample(create, repeat)
+
+
+@benchmark('extra_lesson_update')
+def bench_extra_lesson_update(repeat):
+    _, teacher, classroom = next(fresh_owners(1))
+    lesson = ExtraLesson.objects.create(teacher=teacher, classroom=classroom, date=date(2025, 3, 6),
+                                        is_individual="Замер", start_time=time(10), end_time=time(11))
+    return sample(lesson.save, repeat)
+
+
+def admin_client():
+    client = Client(HTTP_HOST='localhost')
+    user = User.objects.filter(username='bench').first() or User.objects.create_superuser('bench', '', 'bench')
+    client.force_login(user)
+    return client
+
+
+def get(client, url, **params):
+    def request():
+        response = client.get(url, params)
+        assert response.status_code == 200, (url, response.status_code)
+        # Потоковые ответы (iCalendar) считаются целиком.
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return request
+
+
+@benchmark('admin_schedule_changelist')
+def bench_admin_schedule_changelist(repeat):
+    return sample(get(admin_client(), '/admin/app/schedule/'), repeat)
+
+
+@benchmark('admin_extralesson_changelist')
+def bench_admin_extralesson_changelist(repeat):
+    return sample(get(admin_client(), '/admin/app/extralesson/'), repeat)
+
+
+@benchmark('api_schedules_cold')
+def bench_api_schedules_cold(repeat):
+    request = get(Client(HTTP_HOST='localhost'), '/api/schedules/', weekday='mon')
+
+    def cold():
+        caching.get_cache().clear()
+        request()
+    return sample(cold, repeat)
+
+
+@benchmark('api_schedules_cached')
+def bench_api_schedules_cached(repeat):
+    return sample(get(Client(HTTP_HOST='localhost'), '/api/schedules/', weekday='mon'), repeat)
+
+
+@benchmark('api_extra_lessons')
+def bench_api_extra_lessons(repeat):
+    request = get(Client(HTTP_HOST='localhost'), '/api/extra-lessons/', date_from='2025-03-01', date_to='2025-03-31')
+
+    def cold():
+        caching.get_cache().clear()
+        request()
+    return sample(cold, repeat)
+
+
+@benchmark('api_async_schedules')
+def bench_api_async_schedules(repeat):
+    return sample(get(Client(HTTP_HOST='localhost'), '/api/async/schedules/', weekday='mon'), repeat)
+
+
+@benchmark('api_free_slots')
+def bench_api_free_slots(repeat):
+    request = get(Client(HTTP_HOST='localhost'), '/api/free-slots/', date='2025-03-05', duration=60)
+
+    def cold():
+        caching.get_cache().clear()
+        request()
+    return sample(cold, repeat)
+
+
+@benchmark('ical_group_feed')
+def bench_ical_group_feed(repeat):
+    group_id = Schedule.objects.values_list('group_id', flat=True).first()
+    return sample(get(Client(HTTP_HOST='localhost'), f'/api/ical/group/{group_id}.ics'), repeat)
+
+
+@benchmark('api_my_day')
+def bench_api_my_day(repeat):
+    daily.build_window()
+    teacher_id = Schedule.objects.values_list('teacher_id', flat=True).first()
+    return sample(get(Client(HTTP_HOST='localhost'), f'/api/my-day/teacher/{teacher_id}/'), repeat)
+
+
+@benchmark('api_my_day_computed')
+def bench_api_my_day_computed(repeat):
+    # Тот же ответ без готовой строки: день считается по урокам на каждый запрос.
+    teacher_id = Schedule.objects.values_list('teacher_id', flat=True).first()
+    request = get(Client(HTTP_HOST='localhost'), f'/api/my-day/teacher/{teacher_id}/')
+
+    def cold():
+        DailyTimetable.objects.all().delete()
+        request()
+    return sample(cold, repeat)
+
+
+# Сценарии — замеры со своими данными: каждый запускается в отдельной
+# временной БД и возвращает {случай: summarize()}. Они тяжёлые (миллион
+# доп. уроков, потоки, отдельные процессы), поэтому в набор по умолчанию
+# не входят и запускаются через bench --scenario.
+SCENARIOS = {}
+
+
+def scenario(name, database=True):
+    def register(func):
+        SCENARIOS[name] = (func, database)
+        return func
+    return register
+
+
+def uncached(request):
+    # Ответы API кэшируются (app/caching.py); замеряется сам запрос к БД.
+    def cold():
+        caching.get_cache().clear()
+        request()
+    return cold
+
+
+@scenario('archive')
+def scenario_archive(repeat, extra_lessons=1000000, years=5, batch_size=5000):
+    """Список доп. уроков в админке и API на большой истории до и после переноса в архив."""
+    from .archive import archive_extra_lessons, archive_boundary
+
+    today = date.today()
+    days = years * 365
+    generate(groups=50, teachers=100, classrooms=50, lessons=1000, extra_lessons=extra_lessons,
+             start_date=today - timedelta(days=days - 60), days=days)
+    admin = admin_client()
+    api = Client(HTTP_HOST='localhost')
+    recent = (today - timedelta(days=7)).isoformat()
+    history = (archive_boundary() - timedelta(days=30)).isoformat()
+    cases = {
+        'admin_list': get(admin, '/admin/app/extralesson/'),
+        'admin_week': get(admin, '/admin/app/extralesson/', date__gte=recent),
+        'admin_year': get(admin, '/admin/app/extralesson/', date__year=today.year),
+        'api_week': uncached(get(api, '/api/extra-lessons/', date_from=recent)),
+        'api_teacher_history': uncached(get(api, '/api/extra-lessons/', date_from=history, teacher=1)),
+    }
+    results = {f'{name}/before': sample(request, repeat) for name, request in cases.items()}
+    with CaptureQueriesContext(connection) as queries:
+        elapsed = timed(lambda: archive_extra_lessons(batch_size=batch_size))
+    results['archive'] = summarize([elapsed], len(queries))
+    results.update({f'{name}/after': sample(request, repeat) for name, request in cases.items()})
+    return results
+
+
+@scenario('bookings')
+def scenario_bookings(repeat, threads=8, attempts=200, classrooms=5):
+    """Одновременные бронирования из нескольких потоков: время save() и отсутствие пересечений."""
+    from .conflicts import find_conflicts
+
+    group_ids = [Group.objects.create(name=f"Группа {n}").id for n in range(threads)]
+    teacher_ids = [Teacher.objects.create(name="Учитель", surname=str(n)).id for n in range(threads)]
+    room_ids = [Classroom.objects.create(room_number=str(n)).id for n in range(classrooms)]
+    timings = []
+
+    def book(worker):
+        rnd = random.Random(worker)
+        try:
+            for _ in range(attempts):
+                start = rnd.randrange(8 * 60, 20 * 60, 15)
+                lesson = Schedule(
+                    group_id=group_ids[worker], teacher_id=teacher_ids[worker],
+                    classroom_id=rnd.choice(room_ids), weekday=rnd.choice(WEEKDAYS)[0],
+                    start_time=time(start // 60, start % 60), end_time=time(start // 60 + 1, start % 60),
+                )
+                started = perf.perf_counter()
+                try:
+                    lesson.save()
+                except ValidationError:
+                    pass
+                timings.append((perf.perf_counter() - started) * 1000)
+        finally:
+            close_connection()
+
+    workers = [threading.Thread(target=book, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    conflicts = sum(1 for _ in find_conflicts())
+    assert not conflicts, f"Пересечений в итоговом расписании: {conflicts}"
+    return {'save': summarize(timings, None)}
+
+
+@scenario('calendar')
+def scenario_calendar(repeat, lessons=1500, extra_lessons=3000):
+    """Построение месячного календаря: группировка по дням, рендер HTML и ответ из кэша."""
+    from .month_calendar import month_lessons, render_month, ScheduleCalendar
+
+    generate(groups=300, teachers=150, classrooms=100, lessons=lessons, extra_lessons=extra_lessons)
+    days = month_lessons(2025, 3)
+
+    def cold():
+        caching.get_cache().clear()
+        render_month(2025, 3)
+    return {
+        'month_lessons': sample(lambda: month_lessons(2025, 3), repeat),
+        'render_html': sample(lambda: ScheduleCalendar(days).formatmonth(2025, 3), repeat),
+        'render_month': sample(cold, repeat),
+        'render_month_cached': sample(lambda: render_month(2025, 3), repeat),
+    }
+
+
+@scenario('indexes')
+def scenario_indexes(repeat, lessons=30000, extra_lessons=50000):
+    """Запросы расписания без составных индексов моделей и с ними."""
+    generate(groups=500, teachers=300, classrooms=200, lessons=lessons, extra_lessons=extra_lessons)
+    rnd = random.Random(1)
+    classroom_id = Schedule.objects.exclude(classroom=None).values_list('classroom_id', flat=True)[0]
+    teacher_id = Schedule.objects.values_list('teacher_id', flat=True)[0]
+    group_id = Schedule.objects.values_list('group_id', flat=True)[0]
+    lesson_date = date(2025, 1, 1) + timedelta(days=rnd.randrange(365))
+    weekday = rnd.choice(WEEKDAYS)[0]
+    start, end = time(10, 0), time(11, 30)
+    queries = {
+        'schedule_overlap': Schedule.objects.filter(
+            classroom_id=classroom_id, weekday=weekday, start_time__lt=end, end_time__gt=start
+        ),
+        'extra_lesson_overlap': ExtraLesson.objects.filter(
+            classroom_id=classroom_id, date=lesson_date, start_time__lt=end, end_time__gt=start
+        ),
+        'schedule_by_teacher': Schedule.objects.filter(teacher_id=teacher_id).order_by('weekday', 'start_time'),
+        'schedule_by_group': Schedule.objects.filter(group_id=group_id).order_by('weekday', 'start_time'),
+        'extra_lesson_by_teacher': ExtraLesson.objects.filter(
+            teacher_id=teacher_id, date__range=(lesson_date, lesson_date + timedelta(days=30))
+        ),
+        'extra_lesson_by_date': ExtraLesson.objects.filter(
+            date__range=(lesson_date, lesson_date + timedelta(days=7))
+        ).order_by('date', 'start_time'),
+    }
+
+    def set_indexes(enabled):
+        with connection.schema_editor() as editor:
+            for model in (Schedule, ExtraLesson):
+                for index in model._meta.indexes:
+                    if enabled:
+                        editor.add_index(model, index)
+                    else:
+                        editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    results = {}
+    for enabled, suffix in ((False, 'no_index'), (True, 'index')):
+        set_indexes(enabled)
+        for name, queryset in queries.items():
+            results[f'{name}/{suffix}'] = sample(lambda: list(queryset.values_list('id', flat=True)), repeat)
+    return results
+
+
+@scenario('occupancy')
+def scenario_occupancy(repeat, lessons=20000, extra_lessons=20000, checks=500):
+    """Битовые маски занятости (app/occupancy.py) против запросов через ORM."""
+    from .availability import free_slots, DAY_START, DAY_END
+    from .conflicts import busy_fields, time_to_seconds
+    from .occupancy import occupancy
+
+    generate(groups=500, teachers=300, classrooms=100, lessons=lessons, extra_lessons=extra_lessons)
+    results = {'load': sample(occupancy.load, 1)}
+
+    rnd = random.Random(1)
+    room_ids = list(Classroom.objects.values_list('id', flat=True))
+    weekdays = [code for code, _ in WEEKDAYS]
+    slots = []
+    for _ in range(checks):
+        start = rnd.randrange(8 * 60, 20 * 60, 5)
+        slots.append((rnd.choice(room_ids), rnd.choice(weekdays),
+                      time(start // 60, start % 60), time(start // 60 + 1, start % 60)))
+
+    def orm_overlaps():
+        return [bool(busy_fields(Schedule.objects.filter(weekday=weekday), {'classroom': room}, start, end))
+                for room, weekday, start, end in slots]
+
+    def bitset_overlaps():
+        return [occupancy.overlaps('classroom', room, weekday, start, end) for room, weekday, start, end in slots]
+
+    assert orm_overlaps() == bitset_overlaps()
+    results['overlaps/orm'] = sample(orm_overlaps, repeat)
+    results['overlaps/bitset'] = sample(bitset_overlaps, repeat)
+
+    # free_slots() сам выбирает путь: без карты — ORM (кэш сбрасывается), с картой — маски.
+    def orm_free_slots():
+        caching.get_cache().clear()
+        return free_slots(60, lesson_date=date(2025, 3, 5))
+
+    occupancy.clear()
+    expected = orm_free_slots()
+    results['free_slots/orm'] = sample(orm_free_slots, repeat)
+    occupancy.load()
+    assert expected == free_slots(60, lesson_date=date(2025, 3, 5))
+    results['free_slots/bitset'] = sample(lambda: free_slots(60, lesson_date=date(2025, 3, 5)), repeat)
+
+    def orm_utilisation():
+        window = time_to_seconds(DAY_END) - time_to_seconds(DAY_START)
+        busy = {}
+        rows = Schedule.objects.filter(
+            ~Q(classroom=None), weekday='wed', start_time__lt=DAY_END, end_time__gt=DAY_START,
+        ).values_list('classroom_id', 'start_time', 'end_time')
+        for room, start, end in rows:
+            busy.setdefault(room, []).append((time_to_seconds(start), time_to_seconds(end)))
+        result = {}
+        for room, intervals in busy.items():
+            covered, cursor = 0, 0
+            for start, end in sorted(intervals):
+                start = max(start, cursor, time_to_seconds(DAY_START))
+                end = min(end, time_to_seconds(DAY_END))
+                if end > start:
+                    covered += end - start
+                    cursor = end
+            result[room] = covered / window
+        return result
+
+    results['utilisation/orm'] = sample(orm_utilisation, repeat)
+    results['utilisation/bitset'] = sample(
+        lambda: {room: occupancy.utilisation('classroom', room, 'wed', DAY_START, DAY_END) for room in room_ids},
+        repeat,
+    )
+    occupancy.clear()
+    return results
+
+
+@scenario('solver')
+def scenario_solver(repeat, groups=300, teachers=120, classrooms=60, per_group=3):
+    """Решатель расписания: полное решение и повторное для одного учителя."""
+    from .conflicts import find_conflicts
+    from .solver import solve, apply_solution
+
+    generate(groups=groups, teachers=teachers, classrooms=classrooms, lessons=0, extra_lessons=0)
+    generate_requirements(per_group=per_group)
+    # Решение занимает секунды: повторов меньше, чем у быстрых замеров.
+    repeat = min(repeat, 3)
+    results = {'solve': sample(solve, repeat)}
+    apply_solution(solve())
+    conflicts = sum(1 for _ in find_conflicts())
+    assert not conflicts, f"Конфликтов после записи: {conflicts}"
+
+    teacher = Teacher.objects.order_by('id').first()
+    LessonRequirement.objects.filter(teacher=teacher).update(duration=90)
+    results['solve_teacher'] = sample(lambda: solve(teacher=teacher), repeat)
+    return results
+
+
+# Выполняется в отдельном процессе: время импорта приложения, затем первого
+# и второго запроса к нему (без сети — прямой вызов WSGI/ASGI).
+STARTUP_PROBE = r'''
+import asyncio, importlib, json, sys, time
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+module_name, url = sys.argv[1], sys.argv[2]
+path = urlsplit(url)
+started = time.perf_counter()
+application = importlib.import_module(module_name).application
+timings = {'import': time.perf_counter() - started}
+
+
+def wsgi_request():
+    environ = {'PATH_INFO': path.path, 'QUERY_STRING': path.query, 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    status = []
+    body = b''.join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+    return int(status[0].split()[0]), len(body)
+
+
+def asgi_request():
+    messages, requests = [], [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path.path, 'raw_path': path.path.encode(),
+        'query_string': path.query.encode(), 'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+    }
+    asyncio.run(application(scope, receive, send))
+    return messages[0]['status'], sum(len(m.get('body', b'')) for m in messages[1:])
+
+
+request = asgi_request if module_name.endswith('asgi') else wsgi_request
+for name in ('first', 'second'):
+    started = time.perf_counter()
+    status, size = request()
+    timings[name] = time.perf_counter() - started
+timings['status'] = status
+print(json.dumps(timings))
+'''
+STARTUP_PROFILES = {
+    'dev': {'DJANGO_DEBUG': '1'},
+    'prod': {'DJANGO_DEBUG': '0'},
+    'prod-nowarmup': {'DJANGO_DEBUG': '0', 'DJANGO_WARMUP': '0'},
+}
+
+
+@scenario('startup', database=False)
+def scenario_startup(repeat, url='/api/schedules/?weekday=mon'):
+    """
+    Холодный старт: импорт core.wsgi / core.asgi, первый и второй запрос в
+    профилях dev (DEBUG) и prod (DJANGO_DEBUG=0). Каждый замер — новый процесс.
+    """
+    # Процесс на замер стоит сотни миллисекунд: повторов меньше, чем у быстрых замеров.
+    repeat = min(repeat, 5)
+
+    def run(command, env):
+        completed = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        assert not completed.returncode, completed.stderr.strip().splitlines()[-1] if completed.stderr else command
+        return completed.stdout
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        base_env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'core.settings',
+            'DB_NAME': os.path.join(directory, 'startup.sqlite3'),
+            'DB_ENGINE': 'sqlite',
+            # Профиль prod без ключа в окружении не запустится.
+            'DJANGO_SECRET_KEY': settings.SECRET_KEY,
+        }
+        base_env.pop('DJANGO_WARMUP', None)
+        run([sys.executable, '-m', 'django', 'migrate', '--no-input', '-v', '0'], base_env)
+        for profile, profile_env in STARTUP_PROFILES.items():
+            for server in ('wsgi', 'asgi'):
+                env = {**base_env, **profile_env}
+                samples = [
+                    json.loads(run([sys.executable, '-c', STARTUP_PROBE, f'core.{server}', url], env))
+                    for _ in range(repeat)
+                ]
+                assert all(sample['status'] == 200 for sample in samples), (profile, server, url)
+                for phase in ('import', 'first', 'second'):
+                    results[f'{profile}/{server}/{phase}'] = summarize(
+                        [sample[phase] * 1000 for sample in samples], None
+                    )
+    return results
+
+
+def run_suite(names=None, repeat=50, progress=None):
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = func(repeat)
+        if progress:
+            progress(name, results[name])
+    return results
+
+
+def run_scenarios(names, repeat=50, progress=None):
+    # Результаты сценариев — в том же формате, что у run_suite(), с именами «сценарий.случай».
+    results = {}
+    for name in names:
+        func, database = SCENARIOS[name]
+        with temporary_database() if database else nullcontext():
+            for case, stats in func(repeat).items():
+                results[f'{name}.{case}'] = stats
+                if progress:
+                    progress(f'{name}.{case}', stats)
+    return results
+
+
+def compare(results, baseline, threshold=1.2):
+    """
+    Сравнивает медианы с прошлым прогоном. Возвращает строки
+    (имя, было, стало, отношение, регрессия).
+    """
+    rows = []
+    for name, stats in results.items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        ratio = stats['median_ms'] / before['median_ms'] if before['median_ms'] else float('inf')
+        rows.append((name, before['median_ms'], stats['median_ms'], ratio, ratio > threshold))
+    return rows
+
+
+def generate_requirements(per_group=3, lessons_per_week=(1, 2, 3), durations=(45, 60, 90), seed=0):
+    """Учебная нагрузка для решателя: per_group пар «группа — учитель» на каждую группу."""
+    rnd = random.Random(seed)
+    teacher_ids = list(Teacher.objects.values_list('id', flat=True))
+    LessonRequirement.objects.bulk_create(
+        LessonRequirement(
+            group_id=group_id, teacher_id=teacher_id,
+            lessons_per_week=rnd.choice(lessons_per_week), duration=rnd.choice(durations),
+        )
+        for group_id in Group.objects.values_list('id', flat=True)
+        for teacher_id in rnd.sample(teacher_ids, min(per_group, len(teacher_ids)))
+    )
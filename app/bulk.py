@@ -0,0 +1,212 @@
+from datetime import time, timedelta
+from itertools import chain
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+
+from . import caching, changes, daily
+from .conflicts import (
+    ConflictIndex, conflict_index, lesson_owners, time_to_seconds, SCHEDULE, EXTRA, CONFLICT_MESSAGES,
+)
+from .locking import booking_lock, booking_scopes
+from .models import Schedule, ExtraLesson, overlap_errors, weekday_code
+from .occupancy import occupancy
+
+MODELS = {SCHEDULE: Schedule, EXTRA: ExtraLesson}
+# Ограничения-исключения из миграции 0007 (только PostgreSQL).
+NO_OVERLAP_CONSTRAINTS = ('schedule_classroom_no_overlap', 'extralesson_classroom_no_overlap')
+DAY_SECONDS = 24 * 3600
+
+
+def seconds_to_time(seconds):
+    return time(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def lesson_day(lesson, kind):
+    return lesson.weekday if kind == SCHEDULE else lesson.date
+
+
+def lesson_weekday(lesson, kind):
+    return lesson.weekday if kind == SCHEDULE else weekday_code(lesson.date)
+
+
+def normalize(lesson, kind):
+    # То же, что делает clean(): у онлайн-уроков нет аудитории.
+    if kind == SCHEDULE and (lesson.group.is_online or lesson.group.is_individual_online):
+        lesson.classroom = None
+    if kind == EXTRA and lesson.is_online:
+        lesson.classroom = None
+
+
+def find_busy(index, lesson, kind):
+    start, end = lesson.start_time, lesson.end_time
+    weekday = lesson_weekday(lesson, kind)
+    for field, owner_id in lesson_owners(lesson, kind).items():
+        if owner_id is None:
+            continue
+        if kind == SCHEDULE:
+            if index.schedule_overlaps(field, owner_id, weekday, start, end, exclude=lesson.pk):
+                return field
+        elif (index.schedule_overlaps(field, owner_id, weekday, start, end)
+              or index.extra_lesson_overlaps(field, owner_id, lesson.date, start, end, exclude=lesson.pk)):
+            return field
+    return None
+
+
+def reload_indexes():
+    # Индекс пересечений и карта занятости в памяти перестраиваются, если загружены.
+    for index in (conflict_index, occupancy):
+        if index.loaded:
+            index.load()
+
+
+def after_bulk_write(scopes, using=None):
+    # bulk_update/bulk_create не вызывают сигналы: готовые дни групп и
+    # учителей пересчитываются здесь же, а версии кэша и индексы в памяти —
+    # после коммита (apply_solution, например, вызывает это внутри своей транзакции).
+    daily.refresh_scopes(scopes)
+    scopes = set(scopes)
+
+    def after_commit():
+        caching.bump(scopes)
+        reload_indexes()
+    transaction.on_commit(after_commit, using=using)
+
+
+def apply_bulk(kind, updated=(), created=(), fields=(), touched_scopes=()):
+    """
+    Проверяет весь набор изменённых и новых уроков по индексу занятости в
+    памяти и записывает его через bulk_update/bulk_create в одной
+    транзакции. Если хоть один урок конфликтует, ничего не записывается и
+    выбрасывается ValidationError со списком всех конфликтов.
+    """
+    model = MODELS[kind]
+    updated, created = list(updated), list(created)
+    for lesson in chain(updated, created):
+        normalize(lesson, kind)
+        if lesson.end_time <= lesson.start_time:
+            raise ValidationError(f"{lesson}: время окончания должно быть позже времени начала.")
+
+    scopes = set(touched_scopes)
+    lock_scopes = set()
+    for lesson in chain(updated, created):
+        scopes |= caching.lesson_scopes(lesson)
+        lock_scopes.update(booking_scopes(lesson_owners(lesson, kind), lesson_weekday(lesson, kind)))
+
+    using = router.db_for_write(model)
+    with overlap_errors(), booking_lock(sorted(lock_scopes), using):
+        index = ConflictIndex()
+        index.load()
+        for lesson in updated:
+            index.discard(kind, lesson.pk)
+
+        errors = []
+        next_key = 0
+        for lesson in chain(updated, created):
+            busy = find_busy(index, lesson, kind)
+            if busy is not None:
+                errors.append(f"{lesson}: {CONFLICT_MESSAGES[busy]}")
+                continue
+            next_key -= 1
+            index.add(kind, lesson.pk or next_key, lesson_owners(lesson, kind), lesson_day(lesson, kind),
+                      lesson.start_time, lesson.end_time)
+        if errors:
+            raise ValidationError(errors)
+
+        # bulk_update/bulk_create не вызывают сигналы: журнал изменений
+        # пополняется здесь же, в той же транзакции.
+        previous = changes.previous_owners(model, kind, [lesson.pk for lesson in updated]) if updated else {}
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            # Набор уже проверен целиком; пачки bulk_update могут временно
+            # пересекаться между собой, поэтому ограничения проверяются после записи.
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET CONSTRAINTS {', '.join(NO_OVERLAP_CONSTRAINTS)} DEFERRED")
+        if updated:
+            model.objects.bulk_update(updated, fields, batch_size=500)
+        if created:
+            model.objects.bulk_create(created, batch_size=500)
+        changes.record(
+            [changes.change(lesson, kind, changes.UPDATED, previous.get(lesson.pk)) for lesson in updated]
+            + [changes.change(lesson, kind, changes.CREATED) for lesson in created],
+            using,
+        )
+        if connection.vendor == 'postgresql':
+            # Отложенная проверка выполняется здесь, а не при коммите внешней
+            # транзакции (apply_solution), чтобы ошибка пришла из apply_bulk.
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET CONSTRAINTS {', '.join(NO_OVERLAP_CONSTRAINTS)} IMMEDIATE")
+
+    after_bulk_write(scopes, using)
+    return len(updated) + len(created)
+
+
+def load_lessons(kind, queryset):
+    related = ('group', 'teacher', 'classroom') if kind == SCHEDULE else ('teacher', 'classroom')
+    lessons = list(queryset.select_related(*related))
+    touched = set()
+    for lesson in lessons:
+        touched |= caching.lesson_scopes(lesson)
+    return lessons, touched
+
+
+def shift_time(kind, queryset, minutes):
+    """Сдвигает начало и конец уроков на minutes минут (можно отрицательное)."""
+    lessons, touched = load_lessons(kind, queryset)
+    for lesson in lessons:
+        start = time_to_seconds(lesson.start_time) + minutes * 60
+        end = time_to_seconds(lesson.end_time) + minutes * 60
+        if start < 0 or end >= DAY_SECONDS:
+            raise ValidationError(f"{lesson}: после сдвига урок выходит за пределы суток.")
+        lesson.start_time, lesson.end_time = seconds_to_time(start), seconds_to_time(end)
+    return apply_bulk(kind, updated=lessons, fields=['start_time', 'end_time'], touched_scopes=touched)
+
+
+def move_to_weekday(queryset, weekday):
+    lessons, touched = load_lessons(SCHEDULE, queryset)
+    for lesson in lessons:
+        lesson.weekday = weekday
+    return apply_bulk(SCHEDULE, updated=lessons, fields=['weekday'], touched_scopes=touched)
+
+
+def set_repeat_weekly(queryset, value):
+    # Не queryset.update(): тот не вызывает сигналы, и кэш, индексы, журнал
+    # изменений и готовые дни остались бы со старыми данными.
+    lessons, touched = load_lessons(SCHEDULE, queryset.exclude(repeat_weekly=value))
+    for lesson in lessons:
+        lesson.repeat_weekly = value
+    return apply_bulk(SCHEDULE, updated=lessons, fields=['repeat_weekly'], touched_scopes=touched)
+
+
+def reassign(kind, queryset, field, value):
+    """Назначает всем урокам другого учителя (field='teacher') или аудиторию (field='classroom')."""
+    lessons, touched = load_lessons(kind, queryset)
+    for lesson in lessons:
+        setattr(lesson, field, value)
+    return apply_bulk(kind, updated=lessons, fields=[field], touched_scopes=touched)
+
+
+def copy_week(queryset, date_from, date_to):
+    """
+    Копирует доп. уроки одной недели на каждую неделю периода date_from..date_to:
+    копия ставится на тот же день недели, сами исходные уроки не дублируются.
+    """
+    lessons, _ = load_lessons(EXTRA, queryset)
+    if not lessons:
+        return 0
+    dates = [lesson.date for lesson in lessons]
+    if (max(dates) - min(dates)).days > 6:
+        raise ValidationError("Выбранные уроки должны укладываться в одну неделю.")
+
+    created = []
+    for lesson in lessons:
+        day = date_from + timedelta(days=(lesson.date.weekday() - date_from.weekday()) % 7)
+        while day <= date_to:
+            if day != lesson.date:
+                created.append(ExtraLesson(
+                    teacher=lesson.teacher, classroom=lesson.classroom, date=day,
+                    start_time=lesson.start_time, end_time=lesson.end_time,
+                    is_individual=lesson.is_individual, is_online=lesson.is_online,
+                ))
+            day += timedelta(days=7)
+    return apply_bulk(EXTRA, created=created)
@@ -0,0 +1,170 @@
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+ALL = 'all'
+# Растёт при любом изменении групп, учителей и аудиторий (их названия попадают в ответы).
+NAMES = 'names'
+WEEKLY = 'weekly'
+VERSION_PREFIX = 'timetable:v:'
+RESPONSE_PREFIX = 'timetable:r:'
+SCOPE_FIELDS = ('group', 'teacher', 'classroom')
+
+
+def get_cache():
+    return caches[getattr(settings, 'TIMETABLE_CACHE', 'default')]
+
+
+def scope(kind, pk):
+    return f'{kind}:{pk}'
+
+
+def week_scope(field, week):
+    """
+    Все владельцы вида field за неделю week (понедельник; WEEKLY — еженедельное
+    расписание). По таким областям кэшируются сводки вроде аналитики.
+    """
+    return f'week:{week}:{field}'
+
+
+def lesson_week(instance):
+    day = getattr(instance, 'date', None)
+    return WEEKLY if day is None else (day - timedelta(days=day.weekday())).isoformat()
+
+
+def lesson_scopes(instance):
+    # Области, которые затрагивает урок: его группа, учитель, аудитория, их
+    # недельные сводки и общий список.
+    scopes = {ALL}
+    week = lesson_week(instance)
+    for field in SCOPE_FIELDS:
+        pk = getattr(instance, f'{field}_id', None)
+        if pk is not None:
+            scopes.add(scope(field, pk))
+            scopes.add(week_scope(field, week))
+    return scopes
+
+
+def current_versions(scopes):
+    """
+    Текущие номера версий областей. Отсутствующий счётчик заводится со
+    значением времени в наносекундах, чтобы после вытеснения из кэша он
+    не совпал со старым номером.
+    """
+    cache = get_cache()
+    keys = {VERSION_PREFIX + name: name for name in scopes}
+    versions = cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        cache.add(key, time.time_ns())
+        versions[key] = cache.get(key)
+    return {keys[key]: value for key, value in versions.items()}
+
+
+def bump_on_commit(scopes, using=None):
+    """
+    Увеличивает версии после коммита текущей транзакции (вне транзакции —
+    сразу). Иначе читатель, пришедший между bump и коммитом, закэширует
+    старые строки уже под новой версией.
+    """
+    scopes = set(scopes)
+    transaction.on_commit(lambda: bump(scopes), using=using)
+
+
+def bump(scopes):
+    cache = get_cache()
+    for name in scopes:
+        key = VERSION_PREFIX + name
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns())
+
+
+class TimetableCacheMixin:
+    """
+    Кэширует отрендеренные ответы list() по пути и параметрам запроса.
+
+    Вместе с ответом хранятся версии всех групп, учителей и аудиторий,
+    которые в нём встречаются (и фильтров запроса). Запись действительна,
+    пока ни одна из этих версий не изменилась, поэтому и попадание в кэш,
+    и ответ 304 на условный GET обходятся без запросов к БД.
+    """
+    cache_timeout = 60 * 60 * 24
+
+    def response_key(self, request):
+        raw = f'{request.path}?{sorted(request.query_params.lists())}|{request.accepted_media_type}'
+        return RESPONSE_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+    def request_scopes(self, request):
+        scopes = {
+            scope(field, request.query_params[field])
+            for field in SCOPE_FIELDS if request.query_params.get(field)
+        }
+        return scopes or {ALL}
+
+    def response_scopes(self, request, data):
+        scopes = self.request_scopes(request)
+        for row in data.get('results', ()) if isinstance(data, dict) else data:
+            for field in SCOPE_FIELDS:
+                if row.get(field) is not None:
+                    scopes.add(scope(field, row[field]))
+        return scopes
+
+    def cached_entry(self, request):
+        entry = get_cache().get(self.response_key(request))
+        if entry is None or current_versions(entry['versions']) != entry['versions']:
+            return None
+        return entry
+
+    def not_modified(self, request, entry):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            return entry['etag'] in [tag.strip() for tag in if_none_match.split(',')] or if_none_match == '*'
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return if_modified_since is not None and int(entry['modified']) <= if_modified_since
+
+    def entry_response(self, request, entry):
+        if self.not_modified(request, entry):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['modified'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        entry = self.cached_entry(request)
+        if entry is not None:
+            return self.entry_response(request, entry)
+        # Версии снимаются до чтения данных: изменение во время запроса
+        # сделает запись устаревшей, а не закэширует старый ответ как новый.
+        self._pending_versions = current_versions(self.request_scopes(request))
+        return super().list(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        versions = getattr(self, '_pending_versions', None)
+        if versions is None or response.status_code != 200:
+            return response
+
+        scopes = self.response_scopes(request, response.data)
+        versions.update(current_versions(scopes - versions.keys()))
+        response.render()
+        etag = quote_etag(hashlib.md5(repr(sorted(versions.items())).encode() + response.content).hexdigest())
+        entry = {
+            'versions': versions,
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'etag': etag,
+            'modified': time.time(),
+        }
+        get_cache().set(self.response_key(request), entry, self.cache_timeout)
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['modified'])
+        return response
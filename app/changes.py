@@ -0,0 +1,233 @@
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+from django.db.models import Max, Q
+from django.utils.module_loading import import_string
+
+from .conflicts import SCHEDULE, EXTRA
+from .locking import lock_key
+from .models import LessonChange
+
+CREATED, UPDATED, DELETED = 'created', 'updated', 'deleted'
+SNAPSHOT_FIELDS = {
+    SCHEDULE: ('group_id', 'teacher_id', 'classroom_id', 'weekday', 'start_time', 'end_time', 'repeat_weekly'),
+    EXTRA: ('teacher_id', 'classroom_id', 'date', 'start_time', 'end_time', 'is_individual', 'is_online'),
+}
+OWNER_FIELDS = ('group', 'teacher')
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+
+def snapshot(lesson, kind):
+    return {field.removesuffix('_id'): getattr(lesson, field) for field in SNAPSHOT_FIELDS[kind]}
+
+
+def change(lesson, kind, action, previous=None):
+    """
+    Запись журнала для урока. previous — владельцы до изменения
+    {'group': id, 'teacher': id}: если урок перешёл к другому учителю или
+    группе, изменение увидят и прежние.
+    """
+    group_id = getattr(lesson, 'group_id', None)
+    previous = previous or {}
+    previous_group = previous.get('group')
+    previous_teacher = previous.get('teacher')
+    return LessonChange(
+        kind=kind, object_id=lesson.pk, action=action, group_id=group_id, teacher_id=lesson.teacher_id,
+        previous_group_id=previous_group if previous_group != group_id else None,
+        previous_teacher_id=previous_teacher if previous_teacher != lesson.teacher_id else None,
+        data=None if action == DELETED else snapshot(lesson, kind),
+    )
+
+
+def record(changes, using=None):
+    """
+    Дописывает изменения в журнал в текущей транзакции; подписчики
+    оповещаются после коммита.
+
+    Клиент, запросивший since=N, не должен пропустить запись с меньшим
+    номером, закоммиченную позже, поэтому номер seq выдаётся в порядке
+    коммитов. В SQLite пишущие транзакции и так идут по одной, и номер
+    выдаётся сразу. На PostgreSQL записи вставляются без номера (без общей
+    блокировки, параллельно с другими записями расписания), а номера им
+    выдаёт sequence() после коммита.
+    """
+    changes = list(changes)
+    if not changes:
+        return
+    using = using or router.db_for_write(LessonChange)
+    with transaction.atomic(using=using, savepoint=False):
+        if connections[using].vendor == 'postgresql':
+            transaction.on_commit(lambda: sequence(using), using=using)
+        else:
+            start = last_seq(using)
+            for number, entry in enumerate(changes, start + 1):
+                entry.seq = number
+        LessonChange.objects.using(using).bulk_create(changes, batch_size=500)
+        transaction.on_commit(lambda: get_broker().publish(), using=using)
+
+
+def last_seq(using=None):
+    return LessonChange.objects.using(using).aggregate(last=Max('seq'))['last'] or 0
+
+
+def sequence(using=None):
+    """
+    Выдаёт номера всем закоммиченным записям без номера. Короткая
+    транзакция под advisory-блокировкой: номера становятся видимы строго
+    по возрастанию. Заодно подбирает записи, чей процесс упал между
+    коммитом и выдачей номера.
+    """
+    using = using or router.db_for_write(LessonChange)
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [lock_key('lesson-changes')])
+        pending = list(LessonChange.objects.using(using).filter(seq__isnull=True).order_by('id').only('id'))
+        if not pending:
+            return 0
+        start = last_seq(using)
+        for number, entry in enumerate(pending, start + 1):
+            entry.seq = number
+        LessonChange.objects.using(using).bulk_update(pending, ['seq'], batch_size=500)
+    return len(pending)
+
+
+def previous_owners(model, kind, pks):
+    # Владельцы уроков до массового изменения (bulk_update не вызывает pre_save).
+    fields = OWNER_FIELDS if kind == SCHEDULE else ('teacher',)
+    rows = model.objects.filter(pk__in=pks).values_list('id', *[f'{field}_id' for field in fields])
+    return {pk: dict(zip(fields, owners)) for pk, *owners in rows}
+
+
+def head():
+    return last_seq()
+
+
+def owner_filter(field, owner_id):
+    return Q(**{f'{field}_id': owner_id}) | Q(**{f'previous_{field}_id': owner_id})
+
+
+def as_event(entry, field=None, owner_id=None):
+    action, data = entry.action, entry.data
+    if field is not None and getattr(entry, f'{field}_id') != owner_id:
+        # Урок ушёл к другому учителю или группе: для этого владельца он удалён.
+        action, data = DELETED, None
+    return {'seq': entry.seq, 'kind': entry.kind, 'action': action, 'id': entry.object_id, 'data': data}
+
+
+def delta(since, field=None, owner_id=None, limit=DEFAULT_LIMIT):
+    """
+    Изменения с номером больше since, для всех уроков или для одного
+    учителя (field='teacher') или группы (field='group'; доп. уроков у
+    групп нет). Возвращает события, номер, с которого продолжать, и
+    признак, что изменения ещё есть.
+
+    Если под фильтр ничего не подошло, последним номером всё равно
+    становится голова журнала — следующий запрос не просматривает те же
+    записи снова.
+    """
+    last = head()
+    queryset = LessonChange.objects.filter(seq__gt=since, seq__lte=last)
+    if field is not None:
+        queryset = queryset.filter(owner_filter(field, owner_id))
+    entries = list(queryset.order_by('seq')[:limit + 1])
+    more = len(entries) > limit
+    entries = entries[:limit]
+    if more:
+        last = entries[-1].seq
+    return [as_event(entry, field, owner_id) for entry in entries], max(last, since), more
+
+
+class LocalBroker:
+    """
+    Оповещения внутри одного процесса: подписчики (SSE-потоки в цикле
+    событий ASGI) ждут publish(), который вызывается из любого потока после
+    коммита. Само изменение подписчик читает из журнала, брокер только будит.
+
+    version растёт при каждом publish(): подписчик запоминает его до чтения
+    журнала и не пропускает изменение, пришедшее между чтением и ожиданием.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = set()
+        self.version = 0
+
+    def publish(self):
+        with self._lock:
+            self.version += 1
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    async def wait(self, version, timeout):
+        """True — было изменение после version, False — истёк timeout."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            if self.version != version:
+                return True
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+class PollingBroker:
+    """
+    Для нескольких процессов без общего брокера: подписчики просто
+    перечитывают журнал раз в CHANGE_POLL_INTERVAL секунд.
+    """
+    version = 0
+
+    def publish(self):
+        pass
+
+    async def wait(self, version, timeout):
+        await asyncio.sleep(min(timeout, getattr(settings, 'CHANGE_POLL_INTERVAL', 2)))
+        return True
+
+
+_broker = None
+
+
+def get_broker():
+    # Класс брокера задаётся настройкой CHANGE_BROKER (путь для импорта).
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, 'CHANGE_BROKER', 'app.changes.LocalBroker'))()
+    return _broker
+
+
+def format_event(event):
+    return f"id: {event['seq']}\nevent: change\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def event_stream(since, field=None, owner_id=None, heartbeat=15):
+    """
+    Поток Server-Sent Events: сначала накопившиеся изменения после since,
+    затем новые по мере коммитов. Раз в heartbeat секунд без изменений
+    отправляется комментарий, чтобы прокси не закрывали соединение.
+    """
+    broker = get_broker()
+    yield "retry: 3000\n\n"
+    while True:
+        version = broker.version
+        events, since, more = await sync_to_async(delta)(since, field, owner_id)
+        if events:
+            yield ''.join(format_event(event) for event in events)
+        if more:
+            continue
+        if not await broker.wait(version, heartbeat):
+            yield ": ping\n\n"
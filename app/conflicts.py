@@ -0,0 +1,276 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models import Q
+
+SCHEDULE = 'schedule'
+EXTRA = 'extra'
+
+# Чья занятость проверяется: у доп. урока нет группы.
+OWNER_FIELDS = {
+    SCHEDULE: ('classroom', 'teacher', 'group'),
+    EXTRA: ('classroom', 'teacher'),
+}
+CONFLICT_MESSAGES = {
+    'classroom': "Аудитория занята в указанное время.",
+    'teacher': "Учитель занят в указанное время.",
+    'group': "Группа занята в указанное время.",
+}
+
+
+def time_to_seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def lesson_owners(instance, kind):
+    return {field: getattr(instance, f'{field}_id') for field in OWNER_FIELDS[kind]}
+
+
+def busy_fields(queryset, owners, start, end):
+    """
+    Проверка через ORM: один запрос на все владельцы сразу. Возвращает
+    множество полей (classroom/teacher/group), по которым есть пересечение.
+    """
+    owners = {field: pk for field, pk in owners.items() if pk is not None}
+    if not owners:
+        return set()
+    condition = Q()
+    for field, pk in owners.items():
+        condition |= Q(**{f'{field}_id': pk})
+    rows = queryset.filter(condition, start_time__lt=end, end_time__gt=start).values_list(
+        *[f'{field}_id' for field in owners]
+    )
+    busy = set()
+    for row in rows:
+        busy.update(field for field, pk in zip(owners, row) if owners[field] == pk)
+        if len(busy) == len(owners):
+            break
+    return busy
+
+
+class _Bucket:
+    # Интервалы одного владельца за один день недели / одну дату,
+    # отсортированные по началу. max_length позволяет не просматривать
+    # интервалы, которые гарантированно закончились до начала запроса.
+    __slots__ = ('items', 'max_length')
+
+    def __init__(self):
+        self.items = []
+        self.max_length = 0
+
+    def add(self, start, end, pk):
+        insort(self.items, (start, end, pk))
+        self.max_length = max(self.max_length, end - start)
+
+    def remove(self, start, end, pk):
+        i = bisect_left(self.items, (start, end, pk))
+        if i < len(self.items) and self.items[i] == (start, end, pk):
+            del self.items[i]
+
+    def overlaps(self, start, end, exclude=None):
+        i = bisect_left(self.items, (end,))
+        lower = start - self.max_length
+        while i > 0:
+            i -= 1
+            item_start, item_end, pk = self.items[i]
+            if item_start < lower:
+                break
+            if item_end > start and pk != exclude:
+                return True
+        return False
+
+
+class ConflictIndex:
+    """
+    Индекс занятости аудиторий, учителей и групп в памяти процесса.
+
+    Расписания хранятся по ключу (владелец, день недели), доп. уроки —
+    по ключу (владелец, дата). Пока индекс загружен, проверки в clean()
+    выполняются без запросов к БД; изменения подхватываются сигналами
+    post_save/post_delete. Массовые операции (update, bulk_create) сигналы
+    не вызывают — после них индекс нужно перезагрузить через load().
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._buckets = {}
+        self._entries = {}
+        self.loaded = False
+
+    def load(self):
+        from .models import Schedule, ExtraLesson
+
+        with self._lock:
+            self._buckets = {}
+            self._entries = {}
+            schedules = Schedule.objects.values_list(
+                'id', 'classroom_id', 'teacher_id', 'group_id', 'weekday', 'start_time', 'end_time'
+            )
+            for pk, classroom_id, teacher_id, group_id, weekday, start, end in schedules.iterator():
+                owners = {'classroom': classroom_id, 'teacher': teacher_id, 'group': group_id}
+                self._add(SCHEDULE, pk, owners, weekday, start, end)
+            extra_lessons = ExtraLesson.objects.values_list(
+                'id', 'classroom_id', 'teacher_id', 'date', 'start_time', 'end_time'
+            )
+            for pk, classroom_id, teacher_id, date, start, end in extra_lessons.iterator():
+                owners = {'classroom': classroom_id, 'teacher': teacher_id}
+                self._add(EXTRA, pk, owners, date, start, end)
+            self.loaded = True
+
+    def clear(self):
+        with self._lock:
+            self._buckets = {}
+            self._entries = {}
+            self.loaded = False
+
+    def _add(self, kind, pk, owners, key, start, end):
+        start, end = time_to_seconds(start), time_to_seconds(end)
+        bucket_keys = []
+        for field, owner_id in owners.items():
+            if owner_id is None:
+                continue
+            bucket_key = (kind, field, owner_id, key)
+            self._buckets.setdefault(bucket_key, _Bucket()).add(start, end, pk)
+            bucket_keys.append(bucket_key)
+        self._entries[(kind, pk)] = (bucket_keys, start, end)
+
+    def _discard(self, kind, pk):
+        entry = self._entries.pop((kind, pk), None)
+        if entry is None:
+            return
+        bucket_keys, start, end = entry
+        for bucket_key in bucket_keys:
+            bucket = self._buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.remove(start, end, pk)
+
+    def add(self, kind, pk, owners, key, start, end):
+        with self._lock:
+            self._discard(kind, pk)
+            self._add(kind, pk, owners, key, start, end)
+
+    def discard(self, kind, pk):
+        with self._lock:
+            self._discard(kind, pk)
+
+    def overlaps(self, kind, field, owner_id, key, start, end, exclude=None):
+        bucket = self._buckets.get((kind, field, owner_id, key))
+        if bucket is None:
+            return False
+        with self._lock:
+            return bucket.overlaps(time_to_seconds(start), time_to_seconds(end), exclude)
+
+    def schedule_overlaps(self, field, owner_id, weekday, start, end, exclude=None):
+        return self.overlaps(SCHEDULE, field, owner_id, weekday, start, end, exclude)
+
+    def extra_lesson_overlaps(self, field, owner_id, date, start, end, exclude=None):
+        return self.overlaps(EXTRA, field, owner_id, date, start, end, exclude)
+
+
+conflict_index = ConflictIndex()
+
+
+def get_conflict_index():
+    """
+    Возвращает индекс, если он загружен, иначе None (проверка идёт через ORM).
+    При SCHEDULE_CONFLICT_INDEX = True индекс загружается при первом обращении;
+    включать это стоит только при одном процессе-писателе.
+    """
+    if not conflict_index.loaded and getattr(settings, 'SCHEDULE_CONFLICT_INDEX', False):
+        conflict_index.load()
+    return conflict_index if conflict_index.loaded else None
+
+
+@contextmanager
+def use_conflict_index():
+    # Для массовой загрузки: индекс строится один раз и сбрасывается на выходе,
+    # если до этого он не был загружен.
+    was_loaded = conflict_index.loaded
+    if not was_loaded:
+        conflict_index.load()
+    try:
+        yield conflict_index
+    finally:
+        if not was_loaded:
+            conflict_index.clear()
+
+
+Conflict = namedtuple('Conflict', 'field owner_id day first second')
+Booking = namedtuple('Booking', 'start end kind id')
+
+
+def _sweep(bookings):
+    """
+    Все пересекающиеся пары среди броней одного владельца за один день.
+    Сортировка по началу и куча активных броней по концу: O(n log n + k).
+    """
+    bookings.sort()
+    active = []
+    for booking in bookings:
+        while active and active[0][0] <= booking.start:
+            heapq.heappop(active)
+        for _, other in active:
+            yield other, booking
+        heapq.heappush(active, (booking.end, booking))
+
+
+def find_conflicts():
+    """
+    Находит за один проход все двойные бронирования аудиторий, учителей и
+    групп. Еженедельные занятия сравниваются по дню недели; доп. урок
+    сравнивается с доп. уроками той же даты и с расписанием её дня недели.
+    """
+    from .models import Schedule, ExtraLesson, weekday_code
+
+    weekly = {}
+    schedules = Schedule.objects.values_list(
+        'id', 'classroom_id', 'teacher_id', 'group_id', 'weekday', 'start_time', 'end_time'
+    )
+    for pk, classroom_id, teacher_id, group_id, weekday, start, end in schedules.iterator(chunk_size=5000):
+        booking = Booking(time_to_seconds(start), time_to_seconds(end), SCHEDULE, pk)
+        for field, owner_id in (('classroom', classroom_id), ('teacher', teacher_id), ('group', group_id)):
+            if owner_id is not None:
+                weekly.setdefault((field, owner_id, weekday), []).append(booking)
+
+    dated = {}
+    extra_lessons = ExtraLesson.objects.values_list(
+        'id', 'classroom_id', 'teacher_id', 'date', 'start_time', 'end_time'
+    )
+    for pk, classroom_id, teacher_id, date, start, end in extra_lessons.iterator(chunk_size=5000):
+        booking = Booking(time_to_seconds(start), time_to_seconds(end), EXTRA, pk)
+        for field, owner_id in (('classroom', classroom_id), ('teacher', teacher_id)):
+            if owner_id is not None:
+                dated.setdefault((field, owner_id, date), []).append(booking)
+
+    for bookings in weekly.values():
+        bookings.sort()
+    for (field, owner_id, weekday), bookings in weekly.items():
+        for first, second in _sweep(bookings):
+            yield Conflict(field, owner_id, weekday, first, second)
+
+    # Еженедельные брони уже отсортированы по началу; для каждого доп. урока
+    # пересекающиеся с ним занятия ищутся бинарным поиском, как в _Bucket.
+    longest = {key: max(b.end - b.start for b in bookings) for key, bookings in weekly.items()}
+    starts = {key: [b.start for b in bookings] for key, bookings in weekly.items()}
+    for (field, owner_id, date), bookings in dated.items():
+        for first, second in _sweep(bookings):
+            yield Conflict(field, owner_id, date, first, second)
+
+        key = (field, owner_id, weekday_code(date))
+        if key not in weekly:
+            continue
+        schedule_bookings, schedule_starts = weekly[key], starts[key]
+        for booking in bookings:
+            i = bisect_left(schedule_starts, booking.end)
+            lower = booking.start - longest[key]
+            while i > 0:
+                i -= 1
+                other = schedule_bookings[i]
+                if other.start < lower:
+                    break
+                if other.end > booking.start:
+                    yield Conflict(field, owner_id, date, other, booking)
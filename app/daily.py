@@ -0,0 +1,179 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .conflicts import SCHEDULE, EXTRA
+from .models import Group, Teacher, Schedule, ExtraLesson, DailyTimetable, WEEKDAYS
+
+# Расписание «на мой день» заранее собирается в готовый JSON для каждой
+# группы и каждого учителя на DAILY_TIMETABLE_DAYS дней вперёд. Сигналы и
+# массовые операции пересчитывают только затронутые дни затронутых групп и
+# учителей; build_daily_timetables раз в сутки сдвигает окно.
+KINDS = {'group': Group, 'teacher': Teacher}
+# Поля групп, учителей и аудиторий, которые попадают в готовый JSON.
+DISPLAYED_FIELDS = {
+    'group': ('name', 'is_online', 'is_individual_online'),
+    'teacher': ('name', 'surname'),
+    'classroom': ('room_number',),
+}
+WEEKDAY_CODES = [code for code, _ in WEEKDAYS]
+
+
+def window(today=None):
+    today = today or timezone.localdate()
+    return [today + timedelta(days=n) for n in range(getattr(settings, 'DAILY_TIMETABLE_DAYS', 14))]
+
+
+def render(day, lessons):
+    lessons.sort(key=lambda lesson: (lesson['start'], lesson['end'], lesson['id']))
+    return json.dumps({'date': day.isoformat(), 'lessons': lessons}, ensure_ascii=False, separators=(',', ':'))
+
+
+def compute(days, groups=None, teachers=None):
+    """
+    JSON на каждый день из days для групп groups и учителей teachers
+    (None — для всех, пустое множество — ни для кого): {(kind, id, дата): JSON}.
+    Два запроса на весь набор: еженедельное расписание и доп. уроки.
+    """
+    if groups is None:
+        groups = set(Group.objects.values_list('id', flat=True))
+    if teachers is None:
+        teachers = set(Teacher.objects.values_list('id', flat=True))
+    lessons = {('group', pk, day): [] for pk in groups for day in days}
+    lessons.update({('teacher', pk, day): [] for pk in teachers for day in days})
+    if not lessons:
+        return {}
+
+    days_by_weekday = {}
+    for day in days:
+        days_by_weekday.setdefault(WEEKDAY_CODES[day.weekday()], []).append(day)
+
+    weekly = Schedule.objects.filter(
+        Q(group_id__in=groups) | Q(teacher_id__in=teachers), repeat_weekly=True, weekday__in=days_by_weekday,
+    ).values_list(
+        'id', 'weekday', 'start_time', 'end_time', 'group_id', 'group__name', 'teacher_id',
+        'teacher__name', 'teacher__surname', 'classroom__room_number', 'group__is_online',
+        'group__is_individual_online',
+    )
+    for pk, weekday, start, end, group_id, group, teacher_id, name, surname, room, online, individual_online in weekly:
+        lesson = {
+            'start': f"{start:%H:%M}", 'end': f"{end:%H:%M}", 'kind': SCHEDULE, 'id': pk, 'group': group,
+            'teacher': f"{name} {surname}", 'room': room, 'online': online or individual_online,
+        }
+        for day in days_by_weekday[weekday]:
+            for key in (('group', group_id, day), ('teacher', teacher_id, day)):
+                if key in lessons:
+                    lessons[key].append(lesson)
+
+    if teachers:
+        extra_lessons = ExtraLesson.objects.filter(teacher_id__in=teachers, date__in=days).values_list(
+            'id', 'date', 'start_time', 'end_time', 'teacher_id', 'teacher__name', 'teacher__surname',
+            'classroom__room_number', 'is_individual', 'is_online',
+        )
+        for pk, day, start, end, teacher_id, name, surname, room, student, online in extra_lessons:
+            lessons[('teacher', teacher_id, day)].append({
+                'start': f"{start:%H:%M}", 'end': f"{end:%H:%M}", 'kind': EXTRA, 'id': pk, 'student': student,
+                'teacher': f"{name} {surname}", 'room': room, 'online': online,
+            })
+
+    return {key: render(key[2], day_lessons) for key, day_lessons in lessons.items()}
+
+
+def store(contents):
+    # Вставка или замена по уникальному ключу: два одновременных пересчёта
+    # одного дня не упираются в ограничение уникальности.
+    DailyTimetable.objects.bulk_create(
+        [DailyTimetable(kind=kind, owner_id=pk, date=day, content=content)
+         for (kind, pk, day), content in contents.items()],
+        batch_size=1000, update_conflicts=True, unique_fields=['kind', 'owner_id', 'date'],
+        update_fields=['content', 'updated_at'],
+    )
+
+
+def refresh(days, groups=(), teachers=()):
+    """Пересчитывает и сохраняет дни days (только из окна) указанных групп и учителей."""
+    days = sorted(set(days) & set(window()))
+    groups, teachers = set(groups) - {None}, set(teachers) - {None}
+    if not days or not (groups or teachers):
+        return {}
+    contents = compute(days, groups, teachers)
+    store(contents)
+    return contents
+
+
+def refresh_scopes(scopes):
+    # После массовых операций: области кэша group:<id> и teacher:<id> — всё окно.
+    owners = {kind: set() for kind in KINDS}
+    for name in scopes:
+        kind, _, pk = name.partition(':')
+        if kind in owners and pk:
+            owners[kind].add(int(pk))
+    refresh(window(), owners['group'], owners['teacher'])
+
+
+def refresh_entity(model_name, pk):
+    """
+    После изменения отображаемых полей группы, учителя или аудитории:
+    пересчитывается окно только у тех групп и учителей, в чьих днях она есть.
+    """
+    groups, teachers = set(), set()
+    if model_name == 'group':
+        groups.add(pk)
+    elif model_name == 'teacher':
+        teachers.add(pk)
+    for group_id, teacher_id in Schedule.objects.filter(**{f'{model_name}_id': pk}).values_list(
+            'group_id', 'teacher_id'):
+        groups.add(group_id)
+        teachers.add(teacher_id)
+    if model_name == 'classroom':
+        teachers.update(ExtraLesson.objects.filter(classroom_id=pk, date__in=window()).values_list(
+            'teacher_id', flat=True))
+    refresh(window(), groups, teachers)
+
+
+def refresh_lesson(lesson, kind, old_owners=None, old_day=None):
+    """
+    После сохранения или удаления одного урока: его группа и учитель (и
+    прежние, если урок перенесли), и только дни, на которые он приходится —
+    все даты дня недели в окне или одна дата доп. урока.
+    """
+    old_owners = old_owners or {}
+    groups = {getattr(lesson, 'group_id', None), old_owners.get('group')}
+    teachers = {lesson.teacher_id, old_owners.get('teacher')}
+    if kind == SCHEDULE:
+        weekdays = {lesson.weekday, old_day}
+        days = [day for day in window() if WEEKDAY_CODES[day.weekday()] in weekdays]
+    else:
+        days = [day for day in (lesson.date, old_day) if day is not None]
+    refresh(days, groups, teachers)
+
+
+def build_window(today=None):
+    """Полная пересборка окна для всех групп и учителей; прошедшие дни удаляются."""
+    days = window(today)
+    contents = compute(days)
+    with transaction.atomic():
+        # Прошедшие дни и строки удалённых групп и учителей.
+        DailyTimetable.objects.filter(Q(date__lt=days[0]) | Q(date__in=days)).delete()
+        store(contents)
+    return len(contents)
+
+
+def day_json(kind, pk, day):
+    """
+    JSON дня одним запросом по уникальному индексу. Если строки нет (новая
+    группа, день только вошёл в окно), день считается сразу и, если он в
+    окне, сохраняется. None — нет такой группы или учителя.
+    """
+    rows = DailyTimetable.objects.filter(kind=kind, owner_id=pk, date=day).values_list('content', flat=True)
+    for content in rows[:1]:
+        return content
+    if not KINDS[kind].objects.filter(pk=pk).exists():
+        return None
+    owners = {'groups': {pk} if kind == 'group' else set(), 'teachers': {pk} if kind == 'teacher' else set()}
+    contents = refresh([day], **owners) if day in window() else compute([day], **owners)
+    return contents[(kind, pk, day)]
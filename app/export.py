@@ -0,0 +1,178 @@
+import csv
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.db.models import Case, When, IntegerField
+from django.http import StreamingHttpResponse
+
+from .models import WEEKDAYS, weekday_code
+
+CHUNK_SIZE = 2000
+WEEKDAY_LABELS = dict(WEEKDAYS)
+WEEKDAY_ORDER = Case(
+    *[When(weekday=code, then=n) for n, (code, _) in enumerate(WEEKDAYS)], output_field=IntegerField()
+)
+
+SCHEDULE_HEADER = ("Группа", "Учитель", "Аудитория", "День недели", "Начало", "Конец", "Онлайн", "Еженедельно")
+EXTRA_LESSON_HEADER = ("Дата", "День недели", "Учитель", "Аудитория", "Начало", "Конец", "Ученик", "Онлайн")
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def yes_no(value):
+    return "да" if value else "нет"
+
+
+def schedule_rows(queryset):
+    """
+    Строки выгрузки расписания. Названия подтягиваются в том же запросе
+    (JOIN, как select_related), а строки читаются курсором порциями по
+    CHUNK_SIZE — память не зависит от размера выгрузки.
+    """
+    rows = queryset.order_by(WEEKDAY_ORDER, 'start_time', 'id').values_list(
+        'group__name', 'teacher__name', 'teacher__surname', 'classroom__room_number', 'weekday',
+        'start_time', 'end_time', 'group__is_online', 'group__is_individual_online', 'repeat_weekly',
+    )
+    for group, name, surname, room, weekday, start, end, online, individual_online, weekly in rows.iterator(
+        chunk_size=CHUNK_SIZE
+    ):
+        yield (
+            group, f"{name} {surname}", room or "", WEEKDAY_LABELS[weekday],
+            f"{start:%H:%M}", f"{end:%H:%M}", yes_no(online or individual_online), yes_no(weekly),
+        )
+
+
+def extra_lesson_rows(queryset):
+    rows = queryset.order_by('date', 'start_time', 'id').values_list(
+        'date', 'teacher__name', 'teacher__surname', 'classroom__room_number',
+        'start_time', 'end_time', 'is_individual', 'is_online',
+    )
+    for day, name, surname, room, start, end, student, online in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield (
+            day.isoformat(), WEEKDAY_LABELS[weekday_code(day)], f"{name} {surname}", room or "",
+            f"{start:%H:%M}", f"{end:%H:%M}", student, yes_no(online),
+        )
+
+
+class _Buffer:
+    # Принимает запись от csv.writer / zipfile и отдаёт накопленное генератору.
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(chunk if isinstance(chunk, bytes) else chunk.encode() for chunk in self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_csv(header, rows, batch=500):
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открыл кириллицу без выбора кодировки.
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for n, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if n % batch == 0:
+            yield buffer.take()
+    yield buffer.take()
+
+
+XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def xlsx_row(row):
+    # Все ячейки — встроенные строки: таблица общих строк не нужна,
+    # поэтому лист пишется за один проход.
+    cells = ''.join(
+        f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>' for value in row
+    )
+    return f'<row>{cells}</row>'
+
+
+def iter_xlsx(header, rows, sheet_name="Расписание", batch=500):
+    """
+    Потоковая запись XLSX: zip пишется в поток без перемотки (размеры файлов
+    — в дескрипторах данных), лист — строка за строкой. Первые байты уходят
+    клиенту сразу, в памяти держится не больше batch строк.
+    """
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        yield buffer.take()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + xlsx_row(header)
+            ).encode())
+            for n, row in enumerate(rows, 1):
+                sheet.write(xlsx_row(row).encode())
+                if n % batch == 0:
+                    yield buffer.take()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.take()
+
+
+WRITERS = {'csv': iter_csv, 'xlsx': iter_xlsx}
+
+
+def export_response(fmt, filename, header, rows):
+    response = StreamingHttpResponse(WRITERS[fmt](header, rows), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+def export_schedules(queryset, fmt):
+    return export_response(fmt, 'schedule', SCHEDULE_HEADER, schedule_rows(queryset))
+
+
+def export_extra_lessons(queryset, fmt):
+    return export_response(fmt, 'extra-lessons', EXTRA_LESSON_HEADER, extra_lesson_rows(queryset))
@@ -0,0 +1,129 @@
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+
+from . import archive, caching
+from .models import Group, Teacher, Classroom, WEEKDAYS
+from .occurrences import weekly_schedules
+
+PRODID = '-//Ansar//Schedule//RU'
+BYDAY = {'mon': 'MO', 'tue': 'TU', 'wed': 'WE', 'thu': 'TH', 'fri': 'FR', 'sat': 'SA', 'sun': 'SU'}
+WEEKDAY_NUMBERS = {code: number for number, (code, _) in enumerate(WEEKDAYS)}
+FEED_MODELS = {'group': Group, 'teacher': Teacher, 'classroom': Classroom}
+
+
+def escape_text(value):
+    return (
+        str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    # RFC 5545: строки длиннее 75 октетов переносятся, продолжение начинается с пробела.
+    if len(line.encode()) <= 75:
+        return line + '\r\n'
+    parts, current, size, limit = [], [], 0, 75
+    for char in line:
+        char_size = len(char.encode())
+        if size + char_size > limit:
+            parts.append(''.join(current))
+            current, size, limit = [], 0, 74
+        current.append(char)
+        size += char_size
+    parts.append(''.join(current))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def term_start(today=None):
+    # Учебный год начинается 1 сентября; от этой даты отсчитываются повторения.
+    today = today or date.today()
+    return date(today.year if today.month >= 9 else today.year - 1, 9, 1)
+
+
+def first_weekday(start, weekday):
+    return start + timedelta(days=(WEEKDAY_NUMBERS[weekday] - start.weekday()) % 7)
+
+
+def feed_etag(kind, pk, today=None):
+    """
+    ETag ленты считается только по версиям из кэша, без обращения к БД:
+    версия самой группы/учителя/аудитории, версия названий и дата начала
+    учебного года (от неё зависят DTSTART).
+    """
+    today = today or date.today()
+    versions = caching.current_versions({caching.scope(kind, pk), caching.NAMES})
+    raw = f'{kind}:{pk}:{sorted(versions.items())}:{term_start(today)}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _event(uid, stamp, start, end, summary, description, location, rrule=None):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{stamp}',
+        f'DTSTART:{start:%Y%m%dT%H%M%S}',
+        f'DTEND:{end:%Y%m%dT%H%M%S}',
+    ]
+    if rrule:
+        lines.append(f'RRULE:{rrule}')
+    lines += [
+        f'SUMMARY:{escape_text(summary)}',
+        f'DESCRIPTION:{escape_text(description)}',
+        f'LOCATION:{escape_text(location)}',
+        'END:VEVENT',
+    ]
+    return ''.join(fold(line) for line in lines)
+
+
+def iter_calendar(kind, pk, name, today=None):
+    """
+    Построчно генерирует VCALENDAR для группы, учителя или аудитории.
+
+    Еженедельные занятия становятся событиями с RRULE:FREQ=WEEKLY от начала
+    учебного года, доп. уроки (и архивные) — отдельными событиями. Разовые
+    занятия пропускаются, как в occurrences.expand() и календаре месяца.
+    Строки читаются из БД итератором, так что лента не собирается целиком
+    в памяти. Время «плавающее» (без TZID).
+    """
+    today = today or date.today()
+    start = term_start(today)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+    yield ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ))
+
+    schedules = weekly_schedules().filter(**{f'{kind}_id': pk}).values_list(
+        'id', 'weekday', 'start_time', 'end_time', 'group__name',
+        'teacher__name', 'teacher__surname', 'classroom__room_number',
+    ).order_by('id')
+    for lesson_id, weekday, start_time, end_time, group, t_name, t_surname, room in (
+        schedules.iterator(chunk_size=500)
+    ):
+        day = first_weekday(start, weekday)
+        yield _event(
+            f'schedule-{lesson_id}@ansar', stamp,
+            datetime.combine(day, start_time), datetime.combine(day, end_time),
+            group, f'{t_name} {t_surname}', f'ауд. {room}' if room else 'Онлайн',
+            rrule=f'FREQ=WEEKLY;BYDAY={BYDAY[weekday]}',
+        )
+
+    if kind != 'group':
+        extra_lessons = archive.extra_lessons(start).filter(**{f'{kind}_id': pk}, date__gte=start).values_list(
+            'id', 'date', 'start_time', 'end_time', 'is_individual',
+            'teacher__name', 'teacher__surname', 'classroom__room_number',
+        ).order_by('date', 'start_time')
+        for lesson_id, lesson_date, start_time, end_time, student, t_name, t_surname, room in (
+            extra_lessons.iterator(chunk_size=500)
+        ):
+            yield _event(
+                f'extra-{lesson_id}@ansar', stamp,
+                datetime.combine(lesson_date, start_time), datetime.combine(lesson_date, end_time),
+                f'Доп. урок: {student}', f'{t_name} {t_surname}', f'ауд. {room}' if room else 'Онлайн',
+            )
+
+    yield 'END:VCALENDAR\r\n'
@@ -0,0 +1,240 @@
+import csv
+import json
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+
+from . import caching, changes
+from .bulk import after_bulk_write
+from .conflicts import ConflictIndex, SCHEDULE, CONFLICT_MESSAGES, lesson_owners
+from .locking import table_lock
+from .models import Group, Teacher, Classroom, Schedule, ExtraLesson, WEEKDAYS
+
+FIELDS = ('group', 'teacher', 'classroom', 'weekday', 'start_time', 'end_time', 'repeat_weekly')
+WEEKDAY_LOOKUP = {
+    **{code: code for code, _ in WEEKDAYS},
+    **{label.lower(): code for code, label in WEEKDAYS},
+}
+TRUE_VALUES = {'1', 'true', 'yes', 'да', '+'}
+FALSE_VALUES = {'0', 'false', 'no', 'нет', '-'}
+
+
+class RowError(Exception):
+    pass
+
+
+class ImportResult:
+    def __init__(self, max_errors=1000):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return {'created': self.created, 'error_count': self.error_count, 'errors': self.errors}
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream):
+    # Одна запись JSON на строку — файл читается построчно, а не целиком.
+    for line_num, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_num, RowError(f"Некорректный JSON: {exc}")
+            continue
+        yield line_num, row
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+# Другие расширения тех же форматов.
+FORMAT_ALIASES = {
+    'ndjson': 'jsonl',
+}
+
+
+def import_format(name):
+    """Формат по имени или расширению файла (без точки); None — неизвестный."""
+    name = name.lower()
+    name = FORMAT_ALIASES.get(name, name)
+    return name if name in READERS else None
+
+
+def parse_time(value):
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            return datetime.strptime(str(value).strip(), fmt).time()
+        except ValueError:
+            continue
+    raise RowError(f"Некорректное время: {value!r}")
+
+
+def parse_bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError(f"Некорректное логическое значение: {value!r}")
+
+
+class ScheduleImporter:
+    """
+    Потоковый импорт расписания.
+
+    Группы, учителя и аудитории загружаются одним запросом каждый и
+    сопоставляются по названию. Пересечения аудиторий, учителей и групп проверяются по
+    индексу в памяти, в который попадают и уже импортированные строки,
+    а запись идёт пачками через bulk_create.
+    """
+
+    def __init__(self, chunk_size=1000, dry_run=False, max_errors=1000):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.max_errors = max_errors
+
+    def load_references(self):
+        self.groups = {
+            name.lower(): (pk, is_online or is_individual_online)
+            for pk, name, is_online, is_individual_online in Group.objects.values_list(
+                'id', 'name', 'is_online', 'is_individual_online'
+            )
+        }
+        self.teachers = {}
+        for pk, name, surname in Teacher.objects.values_list('id', 'name', 'surname'):
+            self.teachers.setdefault(f"{name} {surname}".lower(), []).append(pk)
+        self.classrooms = {
+            room_number.lower(): pk
+            for pk, room_number in Classroom.objects.values_list('id', 'room_number')
+        }
+        self.index = ConflictIndex()
+        self.index.load()
+        self._next_key = 0
+        self.touched_scopes = set()
+
+    def build(self, row):
+        if isinstance(row, RowError):
+            raise row
+        if not isinstance(row, dict):
+            raise RowError("Строка должна быть объектом с полями " + ", ".join(FIELDS))
+        row = {key: (value.strip() if isinstance(value, str) else value) for key, value in row.items()}
+
+        group = self.groups.get(str(row.get('group') or '').lower())
+        if group is None:
+            raise RowError(f"Группа не найдена: {row.get('group')!r}")
+        group_id, group_is_online = group
+
+        teacher_ids = self.teachers.get(str(row.get('teacher') or '').lower(), [])
+        if not teacher_ids:
+            raise RowError(f"Учитель не найден: {row.get('teacher')!r}")
+        if len(teacher_ids) > 1:
+            raise RowError(f"Несколько учителей с именем {row.get('teacher')!r}")
+
+        classroom_id = None
+        if row.get('classroom') and not group_is_online:
+            classroom_id = self.classrooms.get(str(row['classroom']).lower())
+            if classroom_id is None:
+                raise RowError(f"Аудитория не найдена: {row['classroom']!r}")
+
+        weekday = WEEKDAY_LOOKUP.get(str(row.get('weekday') or '').lower())
+        if weekday is None:
+            raise RowError(f"Некорректный день недели: {row.get('weekday')!r}")
+
+        start_time = parse_time(row.get('start_time'))
+        end_time = parse_time(row.get('end_time'))
+        if end_time <= start_time:
+            raise RowError("Время окончания должно быть позже времени начала.")
+
+        owners = {'classroom': classroom_id, 'teacher': teacher_ids[0], 'group': group_id}
+        for field, message in CONFLICT_MESSAGES.items():
+            if owners[field] is not None and self.index.schedule_overlaps(
+                field, owners[field], weekday, start_time, end_time
+            ):
+                raise RowError(message)
+
+        return Schedule(
+            group_id=group_id,
+            teacher_id=teacher_ids[0],
+            classroom_id=classroom_id,
+            weekday=weekday,
+            start_time=start_time,
+            end_time=end_time,
+            repeat_weekly=parse_bool(row.get('repeat_weekly')),
+        )
+
+    def remember(self, schedule):
+        # Строки ещё не сохранены, поэтому в индексе им выдаются временные отрицательные ключи.
+        self._next_key -= 1
+        self.index.add(
+            SCHEDULE, self._next_key, lesson_owners(schedule, SCHEDULE), schedule.weekday,
+            schedule.start_time, schedule.end_time
+        )
+
+    def flush(self, chunk, result):
+        if chunk and not self.dry_run:
+            Schedule.objects.bulk_create(chunk)
+            changes.record(changes.change(schedule, SCHEDULE, changes.CREATED) for schedule in chunk)
+            for schedule in chunk:
+                self.touched_scopes |= caching.lesson_scopes(schedule)
+        result.created += len(chunk)
+        chunk.clear()
+
+    def run(self, rows):
+        result = ImportResult(max_errors=self.max_errors)
+        # Проверка по индексу и запись идут под блокировкой таблиц уроков:
+        # иначе урок, сохранённый параллельно после загрузки индекса, не
+        # попадёт в проверку. Пробный прогон ничего не пишет и не блокирует.
+        lock = transaction.atomic() if self.dry_run else table_lock([Schedule, ExtraLesson])
+        try:
+            with lock:
+                self.load_references()
+                chunk = []
+                for line, row in rows:
+                    try:
+                        schedule = self.build(row)
+                    except RowError as exc:
+                        result.add_error(line, str(exc))
+                        continue
+                    self.remember(schedule)
+                    chunk.append(schedule)
+                    if len(chunk) >= self.chunk_size:
+                        self.flush(chunk, result)
+                self.flush(chunk, result)
+        except IntegrityError as exc:
+            # Транзакция откатилась целиком: ни одна строка не записана.
+            message = CONFLICT_MESSAGES['classroom'] if '_classroom_no_overlap' in str(exc) else str(exc)
+            result.created = 0
+            result.add_error(None, f"Импорт отменён: {message}")
+            return result
+
+        # bulk_create не вызывает сигналы: индексы, готовые дни и версии кэша
+        # затронутых групп, учителей и аудиторий обновляются как после bulk-операций.
+        if not self.dry_run:
+            after_bulk_write(self.touched_scopes)
+        return result
+
+
+def import_schedule(stream, fmt='csv', **options):
+    if fmt not in READERS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+    return ScheduleImporter(**options).run(READERS[fmt](stream))
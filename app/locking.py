@@ -0,0 +1,69 @@
+import hashlib
+import threading
+from contextlib import contextmanager, nullcontext
+
+from django.db import connections, transaction
+
+# В SQLite запись сериализуется самой БД (BEGIN IMMEDIATE, см. DATABASES в
+# settings), но общая БД в памяти (тесты, bench) не ждёт по timeout, а сразу
+# отвечает «table is locked»: потоки процесса выстраиваются в очередь здесь.
+_process_lock = threading.RLock()
+
+
+def lock_key(name):
+    # pg_advisory_xact_lock принимает знаковое 64-битное число.
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+def booking_scopes(owners, weekday):
+    """
+    Ключи блокировок брони: владелец (аудитория, учитель, группа) и день
+    недели. Доп. урок блокирует день недели своей даты, поэтому он
+    сериализуется и с еженедельным расписанием этого дня.
+    """
+    return sorted(
+        f'booking:{field}:{owner_id}:{weekday}'
+        for field, owner_id in owners.items() if owner_id is not None
+    )
+
+
+@contextmanager
+def booking_lock(scopes, using='default'):
+    """
+    Транзакция, внутри которой проверка пересечений и запись атомарны.
+
+    На PostgreSQL берутся транзакционные advisory-блокировки по каждому
+    ключу (в отсортированном порядке, чтобы не было взаимоблокировок).
+    На остальных БД — блокировка процесса, и только до открытия транзакции:
+    внутри уже открытой запись и так закреплена за этим соединением, а
+    ожидание блокировки процесса под BEGIN IMMEDIATE переворачивало бы
+    порядок захвата.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                for key in sorted({lock_key(name) for name in scopes}):
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s)", [key])
+            yield
+    else:
+        lock = nullcontext() if connection.in_atomic_block else _process_lock
+        with lock, transaction.atomic(using=using):
+            yield
+
+
+@contextmanager
+def table_lock(models, using='default'):
+    """
+    Транзакция с блокировкой записи в таблицы models целиком — для импорта,
+    где владельцы уроков заранее неизвестны. На PostgreSQL SHARE ROW
+    EXCLUSIVE не мешает чтению, но ждёт и останавливает любые записи,
+    в том числе под booking_lock; в SQLite хватает BEGIN IMMEDIATE.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if connection.vendor == 'postgresql':
+            tables = ', '.join(connection.ops.quote_name(model._meta.db_table) for model in models)
+            with connection.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE")
+        yield
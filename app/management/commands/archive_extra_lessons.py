@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.archive import archive_extra_lessons, archive_boundary
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит доп. уроки старше EXTRA_LESSON_RETENTION_DAYS дней в архивную таблицу "
+        "пачками, каждая пачка — отдельной транзакцией"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help="Только посчитать уроки для переноса")
+
+    def handle(self, *args, **options):
+        boundary = archive_boundary()
+        if boundary is None:
+            raise CommandError("Архивирование выключено: EXTRA_LESSON_RETENTION_DAYS = None.")
+
+        started = time.perf_counter()
+        moved = archive_extra_lessons(
+            batch_size=options['batch_size'], dry_run=options['dry_run'],
+            progress=lambda count: self.stdout.write(f"Перенесено: {count}") if options['verbosity'] > 1 else None,
+        )
+        elapsed = time.perf_counter() - started
+        if options['dry_run']:
+            self.stdout.write(f"К переносу (раньше {boundary}): {moved}")
+        else:
+            self.stdout.write(f"Перенесено в архив уроков раньше {boundary}: {moved} за {elapsed:.1f} с")
@@ -0,0 +1,97 @@
+import json
+import platform
+from datetime import datetime, date
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app.benchmark import temporary_database, generate, run_suite, run_scenarios, compare, BENCHMARKS, SCENARIOS
+
+
+class Command(BaseCommand):
+    help = (
+        "Набор замеров горячих путей на синтетических данных: save()/clean() уроков, "
+        "списки в админке и эндпоинты чтения. С --scenario запускаются тяжёлые сценарии "
+        "со своими данными (архив, бронирования в потоках, календарь, индексы, карта "
+        "занятости, решатель, холодный старт); --groups и другие размеры данных к ним не "
+        "относятся. Результаты сохраняются в JSON; "
+        "с --compare медианы сравниваются с прошлым прогоном."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', type=int, default=200)
+        parser.add_argument('--teachers', type=int, default=100)
+        parser.add_argument('--classrooms', type=int, default=50)
+        parser.add_argument('--lessons', type=int, default=5000, help="Еженедельных занятий")
+        parser.add_argument('--extra-lessons', type=int, default=5000, help="Доп. уроков за год")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS), help="Запустить только этот замер")
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS) + ['all'],
+                            help="Запустить сценарий (без --only горячие пути не замеряются)")
+        parser.add_argument('--output', help="Куда сохранить результаты (JSON)")
+        parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+        parser.add_argument('--threshold', type=float, default=1.2,
+                            help="Во сколько раз медиана может вырасти без ошибки")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        data_options = {
+            name: options[name]
+            for name in ('groups', 'teachers', 'classrooms', 'lessons', 'extra_lessons', 'seed')
+        }
+        scenarios = options['scenario'] or []
+        if 'all' in scenarios:
+            scenarios = sorted(SCENARIOS)
+        vendor = connection.vendor
+        results = {}
+        if options['only'] or not scenarios:
+            with temporary_database():
+                generate(start_date=date(2025, 1, 1), days=365, **data_options)
+                results.update(run_suite(options['only'], options['repeat'], progress=self.report))
+        results.update(run_scenarios(scenarios, options['repeat'], progress=self.report))
+
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': vendor,
+            },
+            'data': data_options,
+            'scenarios': scenarios,
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+        if baseline is not None:
+            if baseline.get('data') != data_options:
+                self.stderr.write("Внимание: прошлый прогон сделан на других данных, сравнение неточное.")
+            self.check_regressions(results, baseline, options['threshold'])
+
+    def report(self, name, stats):
+        # queries = None — замер вне этого процесса или из нескольких потоков.
+        queries = f"  запросов {stats['queries']}" if stats['queries'] is not None else ""
+        self.stdout.write(
+            f"{name:32} медиана {stats['median_ms']:9.3f} мс  p95 {stats['p95_ms']:9.3f} мс{queries}"
+        )
+
+    def check_regressions(self, results, baseline, threshold):
+        regressions = []
+        self.stdout.write("Сравнение с прошлым прогоном (медианы):")
+        for name, before, after, ratio, regressed in compare(results, baseline, threshold):
+            mark = "  РЕГРЕССИЯ" if regressed else ""
+            self.stdout.write(f"{name:32} {before:9.3f} → {after:9.3f} мс  ×{ratio:.2f}{mark}")
+            if regressed:
+                regressions.append(name)
+        if regressions:
+            raise CommandError("Медиана выросла больше чем в %.2f раза: %s" % (threshold, ", ".join(regressions)))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.daily import build_window
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает готовое расписание на день для всех групп и учителей на "
+        "DAILY_TIMETABLE_DAYS дней вперёд и удаляет прошедшие дни. Запускать раз в сутки после полуночи."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = build_window()
+        self.stdout.write(f"Собрано дней: {count} за {time.perf_counter() - started:.1f} с")
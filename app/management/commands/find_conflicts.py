@@ -0,0 +1,63 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.conflicts import find_conflicts
+from app.models import Group, Teacher, Classroom, WEEKDAYS
+
+OWNER_LABELS = {'classroom': "Аудитория", 'teacher': "Учитель", 'group': "Группа"}
+KIND_LABELS = {'schedule': "Расписание", 'extra': "Доп. урок"}
+WEEKDAY_LABELS = dict(WEEKDAYS)
+
+
+def format_seconds(value):
+    return f"{value // 3600:02d}:{value % 3600 // 60:02d}"
+
+
+class Command(BaseCommand):
+    help = "Ищет двойные бронирования аудиторий, учителей и групп во всём расписании"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=('text', 'json', 'csv'), default='text')
+        parser.add_argument('--owner', choices=sorted(OWNER_LABELS), help="Проверять только этот тип")
+
+    def handle(self, *args, **options):
+        names = {
+            'group': dict(Group.objects.values_list('id', 'name')),
+            'teacher': {pk: f"{name} {surname}" for pk, name, surname in
+                        Teacher.objects.values_list('id', 'name', 'surname')},
+            'classroom': dict(Classroom.objects.values_list('id', 'room_number')),
+        }
+
+        started = time.perf_counter()
+        rows = []
+        for conflict in find_conflicts():
+            if options['owner'] and conflict.field != options['owner']:
+                continue
+            rows.append({
+                'owner_type': conflict.field,
+                'owner_id': conflict.owner_id,
+                'owner': names[conflict.field].get(conflict.owner_id, conflict.owner_id),
+                'day': WEEKDAY_LABELS.get(conflict.day) or conflict.day.isoformat(),
+                'first': f"{conflict.first.kind}:{conflict.first.id}",
+                'first_time': f"{format_seconds(conflict.first.start)}-{format_seconds(conflict.first.end)}",
+                'second': f"{conflict.second.kind}:{conflict.second.id}",
+                'second_time': f"{format_seconds(conflict.second.start)}-{format_seconds(conflict.second.end)}",
+            })
+        elapsed = time.perf_counter() - started
+
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
+        elif options['format'] == 'csv':
+            writer = csv.DictWriter(self.stdout, fieldnames=list(rows[0]) if rows else ['owner_type'])
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                self.stdout.write(
+                    f"{OWNER_LABELS[row['owner_type']]} {row['owner']}, {row['day']}: "
+                    f"{row['first']} ({row['first_time']}) и {row['second']} ({row['second_time']})"
+                )
+        self.stderr.write(f"Найдено конфликтов: {len(rows)} за {elapsed:.2f} с")
@@ -0,0 +1,38 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.importer import import_schedule, import_format, READERS
+
+
+class Command(BaseCommand):
+    help = "Импортирует расписание из CSV или JSON Lines (по записи на строку)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(READERS), help="По умолчанию — по расширению файла")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Только проверить, ничего не записывать")
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        fmt = import_format(options['format'] or path.suffix.lstrip('.'))
+        if fmt is None:
+            raise CommandError(f"Не удалось определить формат файла {path}, укажите --format")
+
+        with path.open(encoding='utf-8-sig', newline='') as stream:
+            result = import_schedule(
+                stream, fmt, chunk_size=options['chunk_size'], dry_run=options['dry_run']
+            )
+
+        for error in result.errors:
+            # Ошибка без номера строки относится ко всему импорту.
+            prefix = f"Строка {error['line']}: " if error['line'] is not None else ""
+            self.stderr.write(prefix + error['error'])
+        if result.error_count > len(result.errors):
+            self.stderr.write(f"... и ещё {result.error_count - len(result.errors)} ошибок")
+        verb = "Проверено" if options['dry_run'] else "Создано"
+        self.stdout.write(f"{verb} записей: {result.created}, ошибок: {result.error_count}")
+        if options['verbosity'] > 1:
+            self.stdout.write(json.dumps(result.as_dict(), ensure_ascii=False, indent=2))
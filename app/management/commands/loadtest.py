@@ -0,0 +1,67 @@
+import statistics
+import threading
+import time
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест эндпоинта: запросы в секунду и задержки p50/p99. "
+        "Для сравнения WSGI и ASGI запустите, например, "
+        "`gunicorn core.wsgi -w 4 -b :8001` и `uvicorn core.asgi:application --workers 4 --port 8002` "
+        "и прогоните команду против обоих адресов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help="Полные адреса, например http://127.0.0.1:8002/api/async/schedules/")
+        parser.add_argument('--requests', type=int, default=2000, help="Всего запросов на адрес")
+        parser.add_argument('--concurrency', type=int, default=50)
+
+    def handle(self, *args, **options):
+        for url in options['urls']:
+            self.run(url, options['requests'], options['concurrency'])
+
+    def run(self, url, total, concurrency):
+        parts = urlsplit(url)
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        latencies, errors = [], []
+        counter = iter(range(total))
+        counter_lock = threading.Lock()
+
+        def worker():
+            connection = HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+            while True:
+                with counter_lock:
+                    if next(counter, None) is None:
+                        break
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', path)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status >= 400:
+                        errors.append(response.status)
+                except OSError as exc:
+                    errors.append(exc)
+                    connection.close()
+                    connection = HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+                latencies.append(time.perf_counter() - started)
+            connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        self.stdout.write(
+            f"{url}: {len(latencies) / elapsed:.0f} запросов/с, "
+            f"p50 {statistics.median(latencies) * 1000:.1f} мс, p99 {p99:.1f} мс, ошибок: {len(errors)}"
+        )
@@ -0,0 +1,46 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import Teacher, Classroom, WEEKDAYS
+from app.solver import solve, apply_solution, tick_to_time
+
+WEEKDAY_LABELS = dict(WEEKDAYS)
+
+
+class Command(BaseCommand):
+    help = (
+        "Составляет еженедельное расписание по учебной нагрузке. "
+        "С --dry-run только показывает результат, ничего не записывая."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teacher', type=int, help="Пересчитать только нагрузку этого учителя")
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--step', type=int, default=30, help="Шаг начала занятий, мин")
+        parser.add_argument('--max-steps', type=int, default=200000, help="Лимит шагов перебора")
+
+    def handle(self, *args, **options):
+        if options['teacher'] is not None and not Teacher.objects.filter(pk=options['teacher']).exists():
+            raise CommandError(f"Учитель {options['teacher']} не найден.")
+        result = solve(teacher=options['teacher'], step=options['step'], max_steps=options['max_steps'])
+
+        if options['dry_run']:
+            rooms = dict(Classroom.objects.values_list('id', 'room_number'))
+            for p in result.placements:
+                self.stdout.write(
+                    f"{WEEKDAY_LABELS[p.weekday]:12} {tick_to_time(p.start):%H:%M}-{tick_to_time(p.end):%H:%M}  "
+                    f"{p.requirement.group} / {p.requirement.teacher} / {rooms.get(p.classroom_id, 'онлайн')}"
+                )
+        for requirement, count in result.unplaced:
+            self.stderr.write(f"Не размещено занятий: {count} — {requirement}")
+        self.stderr.write(
+            f"Размещено занятий: {len(result.placements)}, заменяется строк: {len(result.replaced_ids)}, "
+            f"шагов: {result.steps}, {result.elapsed:.2f} с"
+        )
+        if options['dry_run']:
+            return
+        try:
+            created = apply_solution(result)
+        except ValidationError as exc:
+            raise CommandError("; ".join(exc.messages))
+        self.stdout.write(f"Записано занятий: {created}")
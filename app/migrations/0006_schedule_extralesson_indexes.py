@@ -0,0 +1,37 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_group_is_individual_online_alter_group_is_individual'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='extralesson',
+            index=models.Index(fields=['classroom', 'date', 'start_time'], name='extralesson_room_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extralesson',
+            index=models.Index(fields=['teacher', 'date'], name='extralesson_teacher_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extralesson',
+            index=models.Index(fields=['date', 'start_time'], name='extralesson_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['classroom', 'weekday', 'start_time'], name='schedule_room_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['teacher', 'weekday', 'start_time'], name='schedule_teacher_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['group', 'weekday', 'start_time'], name='schedule_group_day_idx'),
+        ),
+    ]
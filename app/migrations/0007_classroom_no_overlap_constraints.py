@@ -0,0 +1,105 @@
+from django.db import migrations, models
+
+# Ограничения-исключения есть только в PostgreSQL; на SQLite миграция ничего не делает,
+# а одновременные записи сериализуются блокировками из app/locking.py.
+# DEFERRABLE INITIALLY IMMEDIATE: проверка идёт в конце оператора, а не по
+# строкам, поэтому сдвиг всех уроков одним UPDATE или обмен аудиторий не
+# спотыкается о промежуточное состояние; bulk.apply_bulk откладывает её до коммита.
+CREATE_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    """
+    ALTER TABLE app_schedule ADD CONSTRAINT schedule_classroom_no_overlap
+    EXCLUDE USING gist (
+        classroom_id WITH =,
+        weekday WITH =,
+        tsrange('2000-01-01'::date + start_time, '2000-01-01'::date + end_time) WITH &&
+    ) WHERE (classroom_id IS NOT NULL)
+    DEFERRABLE INITIALLY IMMEDIATE
+    """,
+    """
+    ALTER TABLE app_extralesson ADD CONSTRAINT extralesson_classroom_no_overlap
+    EXCLUDE USING gist (
+        classroom_id WITH =,
+        tsrange(date + start_time, date + end_time) WITH &&
+    ) WHERE (classroom_id IS NOT NULL)
+    DEFERRABLE INITIALLY IMMEDIATE
+    """,
+]
+DROP_SQL = [
+    "ALTER TABLE app_schedule DROP CONSTRAINT IF EXISTS schedule_classroom_no_overlap",
+    "ALTER TABLE app_extralesson DROP CONSTRAINT IF EXISTS extralesson_classroom_no_overlap",
+]
+
+
+# Существующие данные проверяются до создания ограничений: перевёрнутый
+# интервал ломает CHECK и tsrange (DataError), а пересечения — сам ALTER TABLE.
+# Вместо ошибки PostgreSQL миграция называет уроки, которые надо исправить
+# (пересечения во всём расписании показывает manage.py find_conflicts).
+REVERSED_SQL = {
+    'app_schedule': "SELECT id FROM app_schedule WHERE end_time <= start_time LIMIT 20",
+    'app_extralesson': "SELECT id FROM app_extralesson WHERE end_time <= start_time LIMIT 20",
+}
+OVERLAP_SQL = {
+    'app_schedule': """
+        SELECT a.id, b.id FROM app_schedule a JOIN app_schedule b
+        ON a.classroom_id = b.classroom_id AND a.weekday = b.weekday AND a.id < b.id
+        AND a.start_time < b.end_time AND b.start_time < a.end_time
+        LIMIT 20
+    """,
+    'app_extralesson': """
+        SELECT a.id, b.id FROM app_extralesson a JOIN app_extralesson b
+        ON a.classroom_id = b.classroom_id AND a.date = b.date AND a.id < b.id
+        AND a.start_time < b.end_time AND b.start_time < a.end_time
+        LIMIT 20
+    """,
+}
+
+
+def check_existing_lessons(apps, schema_editor):
+    # Перевёрнутые интервалы ломают и CHECK *_end_after_start на любой БД.
+    problems = []
+    postgresql = schema_editor.connection.vendor == 'postgresql'
+    with schema_editor.connection.cursor() as cursor:
+        for table, sql in REVERSED_SQL.items():
+            cursor.execute(sql)
+            ids = [str(pk) for pk, in cursor.fetchall()]
+            if ids:
+                problems.append(f"{table}: время окончания не позже начала у id {', '.join(ids)}")
+        for table, sql in OVERLAP_SQL.items() if postgresql else ():
+            cursor.execute(sql)
+            pairs = [f"{a}/{b}" for a, b in cursor.fetchall()]
+            if pairs:
+                problems.append(f"{table}: пересечения в одной аудитории у id {', '.join(pairs)}")
+    if problems:
+        raise RuntimeError(
+            "Ограничения на время уроков не созданы, сначала исправьте уроки:\n" + "\n".join(problems)
+        )
+
+
+def run_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_schedule_extralesson_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_existing_lessons, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='extralesson',
+            constraint=models.CheckConstraint(condition=models.Q(('end_time__gt', models.F('start_time'))), name='extralesson_end_after_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='schedule',
+            constraint=models.CheckConstraint(condition=models.Q(('end_time__gt', models.F('start_time'))), name='schedule_end_after_start'),
+        ),
+        migrations.RunPython(run_postgresql(CREATE_SQL), run_postgresql(DROP_SQL)),
+    ]
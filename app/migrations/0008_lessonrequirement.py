@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_classroom_no_overlap_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonRequirement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lessons_per_week', models.PositiveSmallIntegerField(default=2, verbose_name='Занятий в неделю')),
+                ('duration', models.PositiveSmallIntegerField(default=90, verbose_name='Длительность занятия, мин')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.group', verbose_name='Группа')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.teacher', verbose_name='Учитель')),
+            ],
+            options={
+                'verbose_name': 'Учебная нагрузка',
+                'verbose_name_plural': 'Учебная нагрузка',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:47
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_lessonrequirement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('schedule', 'Расписание'), ('extra', 'Доп. урок')], max_length=10, verbose_name='Тип урока')),
+                ('object_id', models.BigIntegerField(verbose_name='ID урока')),
+                ('action', models.CharField(max_length=10, verbose_name='Действие')),
+                ('group_id', models.BigIntegerField(null=True, verbose_name='Группа')),
+                ('teacher_id', models.BigIntegerField(verbose_name='Учитель')),
+                ('previous_group_id', models.BigIntegerField(null=True, verbose_name='Прежняя группа')),
+                ('previous_teacher_id', models.BigIntegerField(null=True, verbose_name='Прежний учитель')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Урок после изменения')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время изменения')),
+                ('seq', models.BigIntegerField(null=True, unique=True, verbose_name='Номер изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение урока',
+                'verbose_name_plural': 'Журнал изменений',
+                'indexes': [models.Index(fields=['teacher_id', 'seq'], name='change_teacher_seq_idx'), models.Index(fields=['group_id', 'seq'], name='change_group_seq_idx'), models.Index(fields=['previous_teacher_id', 'seq'], name='change_prev_teacher_seq_idx'), models.Index(fields=['previous_group_id', 'seq'], name='change_prev_group_seq_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Представление для запросов, захватывающих архив. Столбец archived — выражение
+# сравнения: в PostgreSQL это boolean, в SQLite 0/1.
+COLUMNS = "id, teacher_id, classroom_id, date, start_time, end_time, is_individual, is_online"
+CREATE_VIEW = f"""
+    CREATE VIEW app_extralessonhistory AS
+    SELECT {COLUMNS}, 1 = 0 AS archived FROM app_extralesson
+    UNION ALL
+    SELECT {COLUMNS}, 1 = 1 AS archived FROM app_archivedextralesson
+"""
+DROP_VIEW = "DROP VIEW IF EXISTS app_extralessonhistory"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_lessonchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtraLessonHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateField(verbose_name='Дата урока')),
+                ('start_time', models.TimeField(verbose_name='Время начала')),
+                ('end_time', models.TimeField(verbose_name='Время окончания')),
+                ('is_individual', models.CharField(max_length=200, verbose_name='Инициалы студента')),
+                ('is_online', models.BooleanField(default=False, verbose_name='Онлайн урок')),
+                ('archived', models.BooleanField(default=False, verbose_name='В архиве')),
+            ],
+            options={
+                'verbose_name': 'Доп. урок (с архивом)',
+                'verbose_name_plural': 'Доп. уроки (с архивом)',
+                'db_table': 'app_extralessonhistory',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedExtraLesson',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateField(verbose_name='Дата урока')),
+                ('start_time', models.TimeField(verbose_name='Время начала')),
+                ('end_time', models.TimeField(verbose_name='Время окончания')),
+                ('is_individual', models.CharField(max_length=200, verbose_name='Инициалы студента')),
+                ('is_online', models.BooleanField(default=False, verbose_name='Онлайн урок')),
+                ('classroom', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='app.classroom', verbose_name='Аудитория')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.teacher', verbose_name='Учитель')),
+            ],
+            options={
+                'verbose_name': 'Архивный доп. урок',
+                'verbose_name_plural': 'Архив доп. уроков',
+                'indexes': [models.Index(fields=['teacher', 'date'], name='archivedextra_teacher_date_idx'), models.Index(fields=['classroom', 'date'], name='archivedextra_room_date_idx'), models.Index(fields=['date', 'start_time'], name='archivedextra_date_idx')],
+            },
+        ),
+        migrations.RunSQL(CREATE_VIEW, DROP_VIEW),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_extra_lesson_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTimetable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('group', 'Группа'), ('teacher', 'Учитель')], max_length=10, verbose_name='Чьё расписание')),
+                ('owner_id', models.BigIntegerField(verbose_name='ID группы или учителя')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('content', models.TextField(verbose_name='JSON')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Расписание на день',
+                'verbose_name_plural': 'Расписания на день',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'owner_id', 'date'), name='daily_timetable_unique')],
+            },
+        ),
+    ]
@@ -1,5 +1,13 @@
-from django.db import models
+from contextlib import contextmanager
+
+from django.db import models, router, IntegrityError
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .conflicts import (
+    get_conflict_index, busy_fields, lesson_owners, SCHEDULE, EXTRA, CONFLICT_MESSAGES,
+)
+from .locking import booking_lock, booking_scopes
 
 # Дни недели
 WEEKDAYS = [
@@ -12,6 +20,51 @@ WEEKDAYS = [
     ('sun', 'Воскресенье'),
 ]
 
+
+def weekday_code(date):
+    return WEEKDAYS[date.weekday()][0]
+
+
+def raise_if_busy(busy):
+    # Аудитория проверяется первой, затем учитель и группа.
+    for field, message in CONFLICT_MESSAGES.items():
+        if field in busy:
+            raise ValidationError(message)
+
+
+def check_time_range(lesson):
+    # Поддержано CheckConstraint *_end_after_start: перевёрнутый интервал в
+    # PostgreSQL ещё и ломает tsrange ограничений-исключений (DataError вместо ошибки формы).
+    if lesson.start_time is not None and lesson.end_time is not None and lesson.end_time <= lesson.start_time:
+        raise ValidationError({'end_time': "Время окончания должно быть позже времени начала."})
+
+
+def end_after_start(name):
+    return models.CheckConstraint(condition=models.Q(end_time__gt=models.F('start_time')), name=name)
+
+
+def save_lesson(lesson, kind, weekday, save, *args, **kwargs):
+    # Проверка и запись выполняются под блокировкой брони, поэтому два
+    # одновременных сохранения не могут оба пройти проверку пересечений.
+    using = kwargs.get('using') or router.db_for_write(type(lesson), instance=lesson)
+    with overlap_errors():
+        with booking_lock(booking_scopes(lesson_owners(lesson, kind), weekday), using):
+            lesson.clean()
+            save(*args, **kwargs)
+
+
+@contextmanager
+def overlap_errors():
+    # Ограничения-исключения PostgreSQL (миграция 0007) называются
+    # *_classroom_no_overlap; их нарушение — та же ошибка формы, что и у clean().
+    try:
+        yield
+    except IntegrityError as exc:
+        if '_classroom_no_overlap' not in str(exc):
+            raise
+        raise ValidationError(CONFLICT_MESSAGES['classroom']) from exc
+
+
 class Group(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="Название группы")
     is_closed = models.BooleanField(default=False, verbose_name="Закрытая группа")
@@ -57,23 +110,28 @@ class Schedule(models.Model):
     weekday = models.CharField(max_length=3, choices=WEEKDAYS, verbose_name="День недели")
 
     def clean(self):
+        check_time_range(self)
         if self.group.is_online or self.group.is_individual_online:
             self.classroom = None
 
-        if self.classroom:
-            overlapping_schedules = Schedule.objects.filter(
-                classroom=self.classroom,
-                weekday=self.weekday,
-                start_time__lt=self.end_time,
-                end_time__gt=self.start_time
-            ).exclude(id=self.id)
-
-            if overlapping_schedules.exists():
-                raise ValidationError("Аудитория занята в указанное время.")
+        owners = lesson_owners(self, SCHEDULE)
+        index = get_conflict_index()
+        if index is not None:
+            busy = {
+                field for field, owner_id in owners.items()
+                if owner_id is not None and index.schedule_overlaps(
+                    field, owner_id, self.weekday, self.start_time, self.end_time, exclude=self.id
+                )
+            }
+        else:
+            busy = busy_fields(
+                Schedule.objects.filter(weekday=self.weekday).exclude(id=self.id),
+                owners, self.start_time, self.end_time
+            )
+        raise_if_busy(busy)
 
     def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
+        save_lesson(self, SCHEDULE, self.weekday, super().save, *args, **kwargs)
 
     def __str__(self):
         return f"{self.group} - {self.teacher} - {self.weekday} ({self.start_time}-{self.end_time})"
@@ -81,6 +139,26 @@ class Schedule(models.Model):
     class Meta:
         verbose_name = "Расписание"
         verbose_name_plural = "Расписания"
+        indexes = [
+            models.Index(fields=['classroom', 'weekday', 'start_time'], name='schedule_room_day_idx'),
+            models.Index(fields=['teacher', 'weekday', 'start_time'], name='schedule_teacher_day_idx'),
+            models.Index(fields=['group', 'weekday', 'start_time'], name='schedule_group_day_idx'),
+        ]
+        constraints = [end_after_start('schedule_end_after_start')]
+
+class LessonRequirement(models.Model):
+    # Исходные данные для автоматического составления расписания (app/solver.py).
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, verbose_name="Группа")
+    teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE, verbose_name="Учитель")
+    lessons_per_week = models.PositiveSmallIntegerField(default=2, verbose_name="Занятий в неделю")
+    duration = models.PositiveSmallIntegerField(default=90, verbose_name="Длительность занятия, мин")
+
+    def __str__(self):
+        return f"{self.group} - {self.teacher}: {self.lessons_per_week} × {self.duration} мин"
+
+    class Meta:
+        verbose_name = "Учебная нагрузка"
+        verbose_name_plural = "Учебная нагрузка"
 
 class ExtraLesson(models.Model):
     teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE, verbose_name="Учитель")
@@ -92,30 +170,34 @@ class ExtraLesson(models.Model):
     is_online = models.BooleanField(default=False, verbose_name="Онлайн урок")
 
     def clean(self):
+        check_time_range(self)
         if self.is_online:
             self.classroom = None
 
-        if self.classroom:
-            overlapping_lessons = Schedule.objects.filter(
-                classroom=self.classroom,
-                weekday=self.date.strftime('%a').lower(),
-                start_time__lt=self.end_time,
-                end_time__gt=self.start_time
+        owners = lesson_owners(self, EXTRA)
+        weekday = weekday_code(self.date)
+        index = get_conflict_index()
+        if index is not None:
+            busy = {
+                field for field, owner_id in owners.items()
+                if owner_id is not None and (
+                    index.schedule_overlaps(field, owner_id, weekday, self.start_time, self.end_time)
+                    or index.extra_lesson_overlaps(
+                        field, owner_id, self.date, self.start_time, self.end_time, exclude=self.id
+                    )
+                )
+            }
+        else:
+            busy = busy_fields(
+                Schedule.objects.filter(weekday=weekday), owners, self.start_time, self.end_time
+            ) | busy_fields(
+                ExtraLesson.objects.filter(date=self.date).exclude(id=self.id),
+                owners, self.start_time, self.end_time
             )
-
-            overlapping_extra_lessons = ExtraLesson.objects.filter(
-                classroom=self.classroom,
-                date=self.date,
-                start_time__lt=self.end_time,
-                end_time__gt=self.start_time
-            ).exclude(id=self.id)
-
-            if overlapping_lessons.exists() or overlapping_extra_lessons.exists():
-                raise ValidationError("Аудитория занята в указанное время.")
+        raise_if_busy(busy)
 
     def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
+        save_lesson(self, EXTRA, weekday_code(self.date), super().save, *args, **kwargs)
 
     def __str__(self):
         lesson_type = "Онлайн" if self.is_online else "Оффлайн"
@@ -124,3 +206,98 @@ class ExtraLesson(models.Model):
     class Meta:
         verbose_name = "Дополнительный урок"
         verbose_name_plural = "Дополнительные уроки"
+        indexes = [
+            models.Index(fields=['classroom', 'date', 'start_time'], name='extralesson_room_date_idx'),
+            models.Index(fields=['teacher', 'date'], name='extralesson_teacher_date_idx'),
+            models.Index(fields=['date', 'start_time'], name='extralesson_date_idx'),
+        ]
+        constraints = [end_after_start('extralesson_end_after_start')]
+
+class LessonChange(models.Model):
+    # Журнал изменений уроков только дополняется (см. app/changes.py): seq —
+    # порядковый номер изменения в порядке коммитов, по нему клиенты
+    # досинхронизируются; пока номер не выдан, запись клиентам не видна.
+    # Владельцы хранятся числами, а не внешними ключами, чтобы записи
+    # переживали удаление учителя или группы.
+    kind = models.CharField(max_length=10, choices=[(SCHEDULE, "Расписание"), (EXTRA, "Доп. урок")],
+                            verbose_name="Тип урока")
+    object_id = models.BigIntegerField(verbose_name="ID урока")
+    action = models.CharField(max_length=10, verbose_name="Действие")
+    group_id = models.BigIntegerField(null=True, verbose_name="Группа")
+    teacher_id = models.BigIntegerField(verbose_name="Учитель")
+    previous_group_id = models.BigIntegerField(null=True, verbose_name="Прежняя группа")
+    previous_teacher_id = models.BigIntegerField(null=True, verbose_name="Прежний учитель")
+    data = models.JSONField(null=True, encoder=DjangoJSONEncoder, verbose_name="Урок после изменения")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Время изменения")
+    seq = models.BigIntegerField(null=True, unique=True, verbose_name="Номер изменения")
+
+    class Meta:
+        verbose_name = "Изменение урока"
+        verbose_name_plural = "Журнал изменений"
+        indexes = [
+            models.Index(fields=['teacher_id', 'seq'], name='change_teacher_seq_idx'),
+            models.Index(fields=['group_id', 'seq'], name='change_group_seq_idx'),
+            models.Index(fields=['previous_teacher_id', 'seq'], name='change_prev_teacher_seq_idx'),
+            models.Index(fields=['previous_group_id', 'seq'], name='change_prev_group_seq_idx'),
+        ]
+
+class ArchivedExtraLesson(models.Model):
+    # Доп. уроки старше EXTRA_LESSON_RETENTION_DAYS переносятся сюда командой
+    # archive_extra_lessons (app/archive.py) с прежним id.
+    id = models.BigIntegerField(primary_key=True)
+    teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE, verbose_name="Учитель")
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Аудитория")
+    date = models.DateField(verbose_name="Дата урока")
+    start_time = models.TimeField(verbose_name="Время начала")
+    end_time = models.TimeField(verbose_name="Время окончания")
+    is_individual = models.CharField(verbose_name="Инициалы студента", max_length=200)
+    is_online = models.BooleanField(default=False, verbose_name="Онлайн урок")
+
+    def __str__(self):
+        return f"Доп. урок (архив) - {self.teacher} - {self.date} ({self.start_time}-{self.end_time})"
+
+    class Meta:
+        verbose_name = "Архивный доп. урок"
+        verbose_name_plural = "Архив доп. уроков"
+        indexes = [
+            models.Index(fields=['teacher', 'date'], name='archivedextra_teacher_date_idx'),
+            models.Index(fields=['classroom', 'date'], name='archivedextra_room_date_idx'),
+            models.Index(fields=['date', 'start_time'], name='archivedextra_date_idx'),
+        ]
+
+class ExtraLessonHistory(models.Model):
+    # Представление БД (миграция 0010): рабочие и архивные доп. уроки вместе,
+    # только для чтения. Используется, когда запрошенный период захватывает архив.
+    id = models.BigIntegerField(primary_key=True)
+    teacher = models.ForeignKey(Teacher, on_delete=models.DO_NOTHING, related_name='+', verbose_name="Учитель")
+    classroom = models.ForeignKey(Classroom, on_delete=models.DO_NOTHING, null=True, related_name='+',
+                                  verbose_name="Аудитория")
+    date = models.DateField(verbose_name="Дата урока")
+    start_time = models.TimeField(verbose_name="Время начала")
+    end_time = models.TimeField(verbose_name="Время окончания")
+    is_individual = models.CharField(verbose_name="Инициалы студента", max_length=200)
+    is_online = models.BooleanField(default=False, verbose_name="Онлайн урок")
+    archived = models.BooleanField(default=False, verbose_name="В архиве")
+
+    class Meta:
+        managed = False
+        db_table = 'app_extralessonhistory'
+        verbose_name = "Доп. урок (с архивом)"
+        verbose_name_plural = "Доп. уроки (с архивом)"
+
+class DailyTimetable(models.Model):
+    # Готовый JSON «моего дня» группы или учителя на одну дату (app/daily.py):
+    # эндпоинт отдаёт его одним запросом по уникальному индексу.
+    kind = models.CharField(max_length=10, choices=[('group', "Группа"), ('teacher', "Учитель")],
+                            verbose_name="Чьё расписание")
+    owner_id = models.BigIntegerField(verbose_name="ID группы или учителя")
+    date = models.DateField(verbose_name="Дата")
+    content = models.TextField(verbose_name="JSON")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        verbose_name = "Расписание на день"
+        verbose_name_plural = "Расписания на день"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'owner_id', 'date'], name='daily_timetable_unique'),
+        ]
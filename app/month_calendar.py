@@ -0,0 +1,101 @@
+import calendar
+from datetime import date
+
+from django.utils.html import escape
+
+from . import archive, caching
+from .models import WEEKDAYS
+from .occurrences import weekly_schedules
+
+CALENDAR_PREFIX = 'timetable:calendar:'
+WEEKDAY_NUMBERS = {code: number for number, (code, _) in enumerate(WEEKDAYS)}
+
+
+def shift_month(year, month, delta):
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+def _lesson_html(start, end, text, css_class):
+    return (
+        f'<li class="{css_class}"><b>{start:%H:%M}–{end:%H:%M}</b> {escape(text)}</li>'
+    )
+
+
+def month_lessons(year, month):
+    """
+    Занятия месяца, сгруппированные по дням за один проход: {день: [html, ...]}.
+
+    Еженедельные занятия читаются одним запросом и рендерятся один раз на
+    день недели, доп. уроки месяца — вторым запросом.
+    """
+    weekly = [[] for _ in WEEKDAYS]
+    schedules = weekly_schedules().values_list(
+        'weekday', 'start_time', 'end_time', 'group__name', 'teacher__name', 'teacher__surname',
+        'classroom__room_number',
+    )
+    for weekday, start, end, group, name, surname, room in schedules:
+        room = f"ауд. {room}" if room else "онлайн"
+        weekly[WEEKDAY_NUMBERS[weekday]].append(
+            (start, end, _lesson_html(start, end, f"{group} — {name} {surname}, {room}", 'schedule'))
+        )
+    for lessons in weekly:
+        lessons.sort(key=lambda lesson: (lesson[0], lesson[1]))
+
+    last_day = calendar.monthrange(year, month)[1]
+    extras = {}
+    extra_lessons = archive.extra_lessons(date(year, month, 1)).filter(
+        date__range=(date(year, month, 1), date(year, month, last_day))
+    ).values_list(
+        'date', 'start_time', 'end_time', 'is_individual', 'teacher__name', 'teacher__surname',
+        'classroom__room_number',
+    )
+    for lesson_date, start, end, student, name, surname, room in extra_lessons:
+        room = f"ауд. {room}" if room else "онлайн"
+        extras.setdefault(lesson_date.day, []).append(
+            (start, end, _lesson_html(start, end, f"Доп. урок: {student} — {name} {surname}, {room}", 'extra'))
+        )
+
+    days = {}
+    for day in range(1, last_day + 1):
+        lessons = weekly[date(year, month, day).weekday()]
+        if day in extras:
+            lessons = sorted(lessons + extras[day], key=lambda lesson: (lesson[0], lesson[1]))
+        days[day] = [html for _, _, html in lessons]
+    return days
+
+
+class ScheduleCalendar(calendar.HTMLCalendar):
+    def __init__(self, days):
+        super().__init__(firstweekday=0)
+        self.days = days
+
+    def formatday(self, day, weekday):
+        if day == 0:
+            return '<td class="noday">&nbsp;</td>'
+        lessons = self.days.get(day, ())
+        items = f'<ul>{"".join(lessons)}</ul>' if lessons else ''
+        return f'<td class="{self.cssclasses[weekday]}"><div class="day">{day}</div>{items}</td>'
+
+    def formatweekday(self, day):
+        return f'<th class="{self.cssclasses_weekday_head[day]}">{WEEKDAYS[day][1]}</th>'
+
+    def formatmonthname(self, theyear, themonth, withyear=True):
+        return ''
+
+
+def render_month(year, month):
+    """
+    HTML-календарь месяца. Результат кэшируется и сбрасывается при любом
+    изменении уроков, групп, учителей или аудиторий.
+    """
+    cache = caching.get_cache()
+    key = f'{CALENDAR_PREFIX}{year}-{month}'
+    version = caching.current_versions({caching.ALL})[caching.ALL]
+    entry = cache.get(key)
+    if entry is not None and entry['version'] == version:
+        return entry['html']
+
+    html = ScheduleCalendar(month_lessons(year, month)).formatmonth(year, month)
+    cache.set(key, {'version': version, 'html': html}, 60 * 60 * 24)
+    return html
@@ -0,0 +1,174 @@
+import threading
+from datetime import time
+
+from django.conf import settings
+
+from .conflicts import time_to_seconds, SCHEDULE, EXTRA
+
+# Сутки делятся на отрезки по 5 минут: занятость владельца за день — целое
+# число, в котором бит n означает отрезок [n * 5 мин, (n + 1) * 5 мин).
+# Начало урока округляется вниз, конец — вверх, поэтому для времени, не
+# кратного 5 минутам, ответы консервативны (лишний занятый отрезок, но не
+# пропущенное пересечение). Точные проверки при сохранении по-прежнему
+# выполняет ConflictIndex / ORM.
+TICK_SECONDS = 5 * 60
+TICKS_PER_DAY = 24 * 3600 // TICK_SECONDS
+
+
+def to_tick(value, round_up=False):
+    seconds = time_to_seconds(value)
+    return -(-seconds // TICK_SECONDS) if round_up else seconds // TICK_SECONDS
+
+
+def tick_to_time(tick):
+    seconds = tick * TICK_SECONDS
+    return time(seconds // 3600, seconds // 60 % 60)
+
+
+def span_mask(start, end):
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+def time_mask(start, end):
+    return span_mask(to_tick(start), to_tick(end, round_up=True))
+
+
+def window_mask(day_start, day_end):
+    # Окно дня берётся внутрь: только целые 5-минутные отрезки.
+    return span_mask(to_tick(day_start, round_up=True), to_tick(day_end))
+
+
+def free_runs(free, min_ticks=1):
+    """Непрерывные отрезки единичных битов длиной не меньше min_ticks: [(начало, конец)]."""
+    runs = []
+    while free:
+        low = (free & -free).bit_length() - 1
+        shifted = free >> low
+        length = (shifted ^ (shifted + 1)).bit_length() - 1
+        if length >= min_ticks:
+            runs.append((low, low + length))
+        free &= ~span_mask(low, low + length)
+    return runs
+
+
+class OccupancyMap:
+    """
+    Битовые маски занятости аудиторий, учителей и групп: еженедельное
+    расписание — по дню недели, доп. уроки — по дате. Пересечение,
+    свободные окна и загрузка считаются побитовыми И/ИЛИ без запросов к БД.
+
+    Для каждого владельца и дня хранится и маска каждого урока, чтобы при
+    удалении одного из двух пересекающихся уроков не освободить время
+    второго. Как и ConflictIndex, после load() поддерживается сигналами
+    post_save/post_delete, а после массовых операций перезагружается.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._lessons = {}
+        self._masks = {}
+        self._entries = {}
+        self.loaded = False
+
+    def load(self):
+        from .models import Schedule, ExtraLesson
+
+        with self._lock:
+            self._lessons, self._masks, self._entries = {}, {}, {}
+            schedules = Schedule.objects.values_list(
+                'id', 'classroom_id', 'teacher_id', 'group_id', 'weekday', 'start_time', 'end_time'
+            )
+            for pk, classroom_id, teacher_id, group_id, weekday, start, end in schedules.iterator(chunk_size=5000):
+                owners = {'classroom': classroom_id, 'teacher': teacher_id, 'group': group_id}
+                self._add(SCHEDULE, pk, owners, weekday, time_mask(start, end))
+            extra_lessons = ExtraLesson.objects.values_list(
+                'id', 'classroom_id', 'teacher_id', 'date', 'start_time', 'end_time'
+            )
+            for pk, classroom_id, teacher_id, date, start, end in extra_lessons.iterator(chunk_size=5000):
+                owners = {'classroom': classroom_id, 'teacher': teacher_id}
+                self._add(EXTRA, pk, owners, date, time_mask(start, end))
+            self.loaded = True
+
+    def clear(self):
+        with self._lock:
+            self._lessons, self._masks, self._entries = {}, {}, {}
+            self.loaded = False
+
+    def _add(self, kind, pk, owners, day, mask):
+        keys = []
+        for field, owner_id in owners.items():
+            if owner_id is None:
+                continue
+            key = (field, owner_id, day)
+            self._lessons.setdefault(key, {})[(kind, pk)] = mask
+            self._masks[key] = self._masks.get(key, 0) | mask
+            keys.append(key)
+        self._entries[(kind, pk)] = keys
+
+    def _discard(self, kind, pk):
+        for key in self._entries.pop((kind, pk), ()):
+            lessons = self._lessons.get(key, {})
+            lessons.pop((kind, pk), None)
+            mask = 0
+            for lesson_mask in lessons.values():
+                mask |= lesson_mask
+            if mask:
+                self._masks[key] = mask
+            else:
+                self._masks.pop(key, None)
+                self._lessons.pop(key, None)
+
+    def add(self, kind, pk, owners, day, start, end):
+        with self._lock:
+            self._discard(kind, pk)
+            self._add(kind, pk, owners, day, time_mask(start, end))
+
+    def discard(self, kind, pk):
+        with self._lock:
+            self._discard(kind, pk)
+
+    def mask(self, field, owner_id, weekday, date=None):
+        """Занятость владельца за день недели, а с датой — ещё и доп. уроками этой даты."""
+        mask = self._masks.get((field, owner_id, weekday), 0)
+        if date is not None:
+            mask |= self._masks.get((field, owner_id, date), 0)
+        return mask
+
+    def overlaps(self, field, owner_id, weekday, start, end, date=None):
+        return bool(self.mask(field, owner_id, weekday, date) & time_mask(start, end))
+
+    def free_slots(self, field, owner_id, weekday, day_start, day_end, duration, date=None, busy=0):
+        """Свободные окна владельца длиной не меньше duration минут; busy — дополнительная занятость."""
+        window = window_mask(day_start, day_end)
+        free = window & ~(self.mask(field, owner_id, weekday, date) | busy)
+        return [
+            (tick_to_time(start), tick_to_time(end) if end < TICKS_PER_DAY else time.max)
+            for start, end in free_runs(free, -(-duration * 60 // TICK_SECONDS))
+        ]
+
+    def utilisation(self, field, owner_id, weekday, day_start, day_end, date=None):
+        """Доля занятых 5-минутных отрезков в окне [day_start, day_end]."""
+        window = window_mask(day_start, day_end)
+        if not window:
+            return 0.0
+        return (self.mask(field, owner_id, weekday, date) & window).bit_count() / window.bit_count()
+
+    def owners(self, field):
+        return {key[1] for key in self._masks if key[0] == field}
+
+
+occupancy = OccupancyMap()
+
+
+def get_occupancy():
+    """
+    Возвращает карту занятости, если она загружена, иначе None (ответы
+    считаются через ORM). При SCHEDULE_OCCUPANCY = True карта строится при
+    первом обращении; как и для индекса пересечений, это для одного
+    процесса-писателя.
+    """
+    if not occupancy.loaded and getattr(settings, 'SCHEDULE_OCCUPANCY', False):
+        occupancy.load()
+    return occupancy if occupancy.loaded else None
@@ -0,0 +1,133 @@
+import heapq
+from collections import namedtuple
+from datetime import timedelta
+
+from . import archive
+from .conflicts import SCHEDULE, EXTRA
+from .models import Schedule, WEEKDAYS
+
+# Поля расположены так, чтобы обычное сравнение кортежей давало хронологический порядок.
+Lesson = namedtuple(
+    'Lesson', 'start_time end_time kind id group_id teacher_id classroom_id is_online'
+)
+Occurrence = namedtuple('Occurrence', ('date',) + Lesson._fields)
+
+# Начиная с этой длины периода expand() разворачивает расписание по дням,
+# а не сливает потоки по дням недели через кучу.
+FAST_PATH_DAYS = 28
+
+WEEKDAY_NUMBERS = {code: number for number, (code, _) in enumerate(WEEKDAYS)}
+
+
+def weekly_schedules():
+    """
+    Занятия, которые повторяются по датам. У разового занятия
+    (repeat_weekly=False) есть только день недели, но не дата, поэтому ни
+    календари, ни «мой день», ни iCal его не показывают.
+    """
+    return Schedule.objects.filter(repeat_weekly=True)
+
+
+def _weekly_lessons(group=None, teacher=None, classroom=None):
+    # Шаблоны занятий по дням недели (0 — понедельник), отсортированные по времени.
+    queryset = weekly_schedules()
+    if group is not None:
+        queryset = queryset.filter(group=group)
+    if teacher is not None:
+        queryset = queryset.filter(teacher=teacher)
+    if classroom is not None:
+        queryset = queryset.filter(classroom=classroom)
+
+    lessons = [[] for _ in WEEKDAYS]
+    rows = queryset.values_list(
+        'weekday', 'start_time', 'end_time', 'id', 'group_id', 'teacher_id', 'classroom_id',
+        'group__is_online', 'group__is_individual_online',
+    )
+    for weekday, start, end, pk, group_id, teacher_id, classroom_id, is_online, is_individual_online in rows:
+        lessons[WEEKDAY_NUMBERS[weekday]].append(Lesson(
+            start, end, SCHEDULE, pk, group_id, teacher_id, classroom_id, is_online or is_individual_online
+        ))
+    return [tuple(sorted(day)) for day in lessons]
+
+
+def _extra_lessons(date_from, date_to, group=None, teacher=None, classroom=None):
+    # У доп. урока нет группы, поэтому при фильтре по группе они не попадают в выборку.
+    if group is not None:
+        return
+    queryset = archive.extra_lessons(date_from).filter(date__range=(date_from, date_to))
+    if teacher is not None:
+        queryset = queryset.filter(teacher=teacher)
+    if classroom is not None:
+        queryset = queryset.filter(classroom=classroom)
+    rows = queryset.order_by('date', 'start_time', 'end_time', 'id').values_list(
+        'date', 'start_time', 'end_time', 'id', 'teacher_id', 'classroom_id', 'is_online'
+    )
+    for lesson_date, start, end, pk, teacher_id, classroom_id, is_online in rows.iterator(chunk_size=2000):
+        yield Occurrence(lesson_date, start, end, EXTRA, pk, None, teacher_id, classroom_id, is_online)
+
+
+def iter_days(date_from, date_to, group=None, teacher=None, classroom=None, include_extra=True):
+    """
+    Выдаёт пары (дата, занятия) за каждый день периода.
+
+    Кортежи еженедельных занятий строятся один раз на день недели и
+    переиспользуются, так что на день без доп. уроков не создаётся ни
+    одного объекта. В памяти держатся только шаблоны и один день доп. уроков.
+    """
+    weekly = _weekly_lessons(group, teacher, classroom)
+    extras = _extra_lessons(date_from, date_to, group, teacher, classroom) if include_extra else iter(())
+    pending = next(extras, None)
+
+    day = date_from
+    one_day = timedelta(days=1)
+    while day <= date_to:
+        lessons = weekly[day.weekday()]
+        if pending is not None and pending.date == day:
+            extra = []
+            while pending is not None and pending.date == day:
+                extra.append(Lesson(*pending[1:]))
+                pending = next(extras, None)
+            # Два уже отсортированных прогона — timsort сливает их за линейное время.
+            lessons = tuple(sorted(lessons + tuple(extra)))
+        yield day, lessons
+        day += one_day
+
+
+def _weekday_stream(lessons, first_day, date_to):
+    day = first_day
+    week = timedelta(days=7)
+    while day <= date_to:
+        for lesson in lessons:
+            yield Occurrence(day, *lesson)
+        day += week
+
+
+def expand(date_from, date_to, group=None, teacher=None, classroom=None, include_extra=True, fast=None):
+    """
+    Лениво выдаёт занятия периода [date_from, date_to] в хронологическом порядке.
+
+    На коротких периодах сливает через кучу семь потоков по дням недели и
+    поток доп. уроков; на длинных (или при fast=True) разворачивает
+    расписание по дням через iter_days(). Результат в обоих случаях одинаковый.
+    """
+    if date_from > date_to:
+        return
+    if fast is None:
+        fast = (date_to - date_from).days >= FAST_PATH_DAYS
+
+    if fast:
+        for day, lessons in iter_days(date_from, date_to, group, teacher, classroom, include_extra):
+            for lesson in lessons:
+                yield Occurrence(day, *lesson)
+        return
+
+    weekly = _weekly_lessons(group, teacher, classroom)
+    streams = []
+    for offset in range(7):
+        first_day = date_from + timedelta(days=offset)
+        lessons = weekly[first_day.weekday()]
+        if lessons and first_day <= date_to:
+            streams.append(_weekday_stream(lessons, first_day, date_to))
+    if include_extra:
+        streams.append(_extra_lessons(date_from, date_to, group, teacher, classroom))
+    yield from heapq.merge(*streams)
@@ -0,0 +1,70 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class ScheduleCursorPagination(CursorPagination):
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class ExtraLessonCursorPagination(ScheduleCursorPagination):
+    """
+    Курсор по паре (date, id). Стандартный CursorPagination фильтрует только
+    по первому полю сортировки, а внутри одной даты досчитывает OFFSET (и
+    пропускает или повторяет уроки, если день меняется между страницами).
+    Здесь позиция курсора — «дата.id», она уникальна, и страница всегда
+    начинается строго после этой пары.
+    """
+    ordering = ('date', 'id')
+
+    def _get_position_from_instance(self, instance, ordering):
+        return f'{instance.date.isoformat()}.{instance.id}'
+
+    def position_filter(self, position, reverse):
+        day, _, pk = position.partition('.')
+        try:
+            day, pk = parse_date(day), int(pk)
+        except ValueError:
+            day = None
+        if day is None:
+            raise NotFound(self.invalid_cursor_message)
+        if reverse:
+            return Q(date__lt=day) | Q(date=day, id__lt=pk)
+        return Q(date__gt=day) | Q(date=day, id__gt=pk)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Тот же разбор курсора и расчёт ссылок, что в CursorPagination;
+        # отличается только фильтр по позиции.
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, position = self.cursor or (0, False, None)
+
+        queryset = queryset.order_by(*(('-date', '-id') if reverse else self.ordering))
+        if position is not None:
+            queryset = queryset.filter(self.position_filter(position, reverse))
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(results[-1], self.ordering)
+
+        earlier = position is not None or offset > 0
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = earlier, following is not None
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next, self.has_previous = following is not None, earlier
+            self.next_position, self.previous_position = following, position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+RequestStats = namedtuple('RequestStats', 'view method status queries db_time total_time duplicates')
+ViewSummary = namedtuple(
+    'ViewSummary',
+    'view requests total_p50 total_p95 total_p99 queries_p50 queries_p95 queries_max db_p95 over_budget duplicates',
+)
+
+# Сколько повторяющихся запросов запоминать на один HTTP-запрос.
+MAX_DUPLICATES = 5
+SQL_PREVIEW = 300
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    """
+    Обёртка для connection.execute_wrapper: считает запросы, их время и
+    повторы одного и того же SQL (параметры не учитываются, поэтому N+1
+    виден как один шаблон с большим счётчиком). Работает без DEBUG и не
+    хранит текст каждого запроса.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.signatures = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            self.signatures[sql] += 1
+
+    def duplicates(self):
+        return tuple(
+            (sql[:SQL_PREVIEW], count)
+            for sql, count in self.signatures.most_common(MAX_DUPLICATES) if count > 1
+        )
+
+
+def percentile(values, p):
+    # Ближайший ранг; values должны быть отсортированы.
+    if not values:
+        return 0
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def query_budget(view):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(view, getattr(settings, 'QUERY_BUDGET', None))
+
+
+class StatsBuffer:
+    """Последние N запросов к приложению (кольцевой буфер в памяти процесса)."""
+
+    def __init__(self, size):
+        self._lock = threading.Lock()
+        self._items = deque(maxlen=size)
+
+    def add(self, stats):
+        with self._lock:
+            self._items.append(stats)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._items)
+
+    def summary(self):
+        """Перцентили по каждому представлению, самые медленные (p95) сверху."""
+        by_view = {}
+        for stats in self.snapshot():
+            by_view.setdefault(stats.view, []).append(stats)
+
+        result = []
+        for view, items in by_view.items():
+            total = sorted(item.total_time for item in items)
+            queries = sorted(item.queries for item in items)
+            db_time = sorted(item.db_time for item in items)
+            budget = query_budget(view)
+            duplicates = Counter()
+            for item in items:
+                for sql, count in item.duplicates:
+                    duplicates[sql] = max(duplicates[sql], count)
+            result.append(ViewSummary(
+                view, len(items),
+                percentile(total, 50), percentile(total, 95), percentile(total, 99),
+                percentile(queries, 50), percentile(queries, 95), queries[-1],
+                percentile(db_time, 95),
+                sum(item.queries > budget for item in items) if budget is not None else 0,
+                duplicates.most_common(MAX_DUPLICATES),
+            ))
+        result.sort(key=lambda summary: summary.total_p95, reverse=True)
+        return result
+
+
+stats_buffer = StatsBuffer(getattr(settings, 'QUERY_PROFILER_BUFFER', 1000))
+
+
+def watch(stack, recorder):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return request.path
+    return match.view_name or match.route
+
+
+class QueryProfilerMiddleware:
+    """
+    Записывает в stats_buffer число запросов, время БД, общее время ответа и
+    повторяющиеся запросы каждого представления. При превышении QUERY_BUDGET
+    (или QUERY_BUDGETS[имя представления]) пишет предупреждение в лог, а при
+    QUERY_BUDGET_ACTION = 'raise' выбрасывает QueryBudgetExceeded.
+
+    Запросы, которые выполняет уже возвращённый StreamingHttpResponse при
+    отдаче тела, не учитываются.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Под ASGI цепочка остаётся асинхронной: иначе Django обернул бы её в
+        # sync_to_async, и асинхронные представления ушли бы в рабочий поток.
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            watch(stack, recorder)
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # Соединения с БД привязаны к потоку: асинхронный ORM ходит в базу из
+        # потока sync_to_async (один на запрос), там же и ставится обёртка.
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(watch)(stack, recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, recorder, time.perf_counter() - start)
+
+    def finish(self, request, response, recorder, total):
+        view = view_name(request)
+        stats_buffer.add(RequestStats(
+            view, request.method, response.status_code, recorder.count,
+            recorder.time * 1000, total * 1000, recorder.duplicates(),
+        ))
+        budget = query_budget(view)
+        if budget is not None and recorder.count > budget:
+            message = f"{view}: {recorder.count} запросов к БД при бюджете {budget}"
+            if getattr(settings, 'QUERY_BUDGET_ACTION', 'log') == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,27 @@
+import csv
+import io
+
+from rest_framework.renderers import BaseRenderer
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    ?format=csv для эндпоинтов, отдающих {'results': [плоские словари]}.
+    Заголовок берётся из ключей первой строки.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data.get('results', []) if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            # Ошибки (например, 400 с описанием параметров) отдаются одной строкой.
+            rows = [data]
+        output = io.StringIO()
+        if rows:
+            writer = csv.DictWriter(output, fieldnames=list(rows[0]), extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        # BOM, чтобы Excel открыл кириллицу без выбора кодировки.
+        return ('\ufeff' + output.getvalue()).encode(self.charset)
@@ -0,0 +1,32 @@
+from rest_framework import serializers
+
+from .models import Schedule, ExtraLesson
+
+
+class ScheduleSerializer(serializers.ModelSerializer):
+    group_name = serializers.CharField(source='group.name', read_only=True)
+    teacher_name = serializers.CharField(source='teacher.__str__', read_only=True)
+    classroom_number = serializers.CharField(source='classroom.room_number', read_only=True, default=None)
+    is_online = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Schedule
+        fields = (
+            'id', 'group', 'group_name', 'teacher', 'teacher_name', 'classroom', 'classroom_number',
+            'weekday', 'start_time', 'end_time', 'repeat_weekly', 'is_online',
+        )
+
+    def get_is_online(self, obj) -> bool:
+        return obj.group.is_online or obj.group.is_individual_online
+
+
+class ExtraLessonSerializer(serializers.ModelSerializer):
+    teacher_name = serializers.CharField(source='teacher.__str__', read_only=True)
+    classroom_number = serializers.CharField(source='classroom.room_number', read_only=True, default=None)
+
+    class Meta:
+        model = ExtraLesson
+        fields = (
+            'id', 'teacher', 'teacher_name', 'classroom', 'classroom_number',
+            'date', 'start_time', 'end_time', 'is_individual', 'is_online',
+        )
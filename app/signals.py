@@ -0,0 +1,129 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import caching, changes, daily
+from .conflicts import conflict_index, lesson_owners, SCHEDULE, EXTRA
+from .models import Group, Teacher, Classroom, Schedule, ExtraLesson, DailyTimetable
+from .occupancy import occupancy
+
+
+def update_indexes(kind, pk, owners=None, key=None, start=None, end=None):
+    # owners=None — урок удалён.
+    for index in (conflict_index, occupancy):
+        if not index.loaded:
+            continue
+        if owners is None:
+            index.discard(kind, pk)
+        else:
+            index.add(kind, pk, owners, key, start, end)
+
+
+# Индексы в памяти меняются только после коммита: откат не должен оставлять
+# в них уроки, которых нет в БД. Значения берутся сейчас — до коммита
+# объект ещё могут изменить.
+@receiver(post_save, sender=Schedule)
+@receiver(post_save, sender=ExtraLesson)
+def index_lesson(sender, instance, using, **kwargs):
+    kind = SCHEDULE if sender is Schedule else EXTRA
+    args = (kind, instance.pk, lesson_owners(instance, kind), instance.weekday if kind == SCHEDULE else instance.date,
+            instance.start_time, instance.end_time)
+    transaction.on_commit(lambda: update_indexes(*args), using=using)
+
+
+@receiver(post_delete, sender=Schedule)
+@receiver(post_delete, sender=ExtraLesson)
+def unindex_lesson(sender, instance, using, **kwargs):
+    kind, pk = SCHEDULE if sender is Schedule else EXTRA, instance.pk
+    transaction.on_commit(lambda: update_indexes(kind, pk), using=using)
+
+
+@receiver(pre_save, sender=Schedule)
+@receiver(pre_save, sender=ExtraLesson)
+def remember_cache_scopes(sender, instance, **kwargs):
+    # При переносе урока к другому учителю или в другую аудиторию
+    # устаревают и старые, и новые области кэша.
+    instance._old_cache_scopes = set()
+    instance._old_owners = None
+    instance._old_day = None
+    if instance.pk is not None:
+        old = sender.objects.filter(pk=instance.pk).first()
+        if old is not None:
+            instance._old_cache_scopes = caching.lesson_scopes(old)
+            instance._old_owners = {'group': getattr(old, 'group_id', None), 'teacher': old.teacher_id}
+            instance._old_day = old.weekday if sender is Schedule else old.date
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_save, sender=ExtraLesson)
+@receiver(post_delete, sender=Schedule)
+@receiver(post_delete, sender=ExtraLesson)
+def invalidate_lesson_cache(sender, instance, using, **kwargs):
+    caching.bump_on_commit(caching.lesson_scopes(instance) | getattr(instance, '_old_cache_scopes', set()), using)
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_save, sender=ExtraLesson)
+def log_lesson_save(sender, instance, created, using, **kwargs):
+    kind = SCHEDULE if sender is Schedule else EXTRA
+    action = changes.CREATED if created else changes.UPDATED
+    changes.record([changes.change(instance, kind, action, getattr(instance, '_old_owners', None))], using)
+
+
+@receiver(post_delete, sender=Schedule)
+@receiver(post_delete, sender=ExtraLesson)
+def log_lesson_delete(sender, instance, using, **kwargs):
+    kind = SCHEDULE if sender is Schedule else EXTRA
+    changes.record([changes.change(instance, kind, changes.DELETED)], using)
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_save, sender=ExtraLesson)
+@receiver(post_delete, sender=Schedule)
+@receiver(post_delete, sender=ExtraLesson)
+def refresh_daily_timetables(sender, instance, **kwargs):
+    daily.refresh_lesson(
+        instance, SCHEDULE if sender is Schedule else EXTRA,
+        getattr(instance, '_old_owners', None), getattr(instance, '_old_day', None),
+    )
+
+
+@receiver(pre_save, sender=Group)
+@receiver(pre_save, sender=Teacher)
+@receiver(pre_save, sender=Classroom)
+def remember_displayed_fields(sender, instance, **kwargs):
+    instance._old_displayed = None
+    if instance.pk is not None:
+        fields = daily.DISPLAYED_FIELDS[sender._meta.model_name]
+        instance._old_displayed = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=Teacher)
+@receiver(post_save, sender=Classroom)
+def refresh_entity_daily_timetables(sender, instance, created, **kwargs):
+    # Названия входят в готовый JSON: при их изменении пересчитываются дни
+    # только тех групп и учителей, где они показаны. Сохранение без изменений
+    # (например, повторное в админке) готовые дни не трогает.
+    name = sender._meta.model_name
+    old = getattr(instance, '_old_displayed', None)
+    if created or old is None or old == tuple(getattr(instance, field) for field in daily.DISPLAYED_FIELDS[name]):
+        return
+    daily.refresh_entity(name, instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Teacher)
+def drop_daily_timetables(sender, instance, **kwargs):
+    DailyTimetable.objects.filter(kind=sender._meta.model_name, owner_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=Teacher)
+@receiver(post_save, sender=Classroom)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_delete, sender=Classroom)
+def invalidate_entity_cache(sender, instance, using, **kwargs):
+    # Общая версия тоже растёт: от названий зависят сводные страницы вроде календаря.
+    caching.bump_on_commit({caching.scope(sender._meta.model_name, instance.pk), caching.ALL, caching.NAMES}, using)
@@ -0,0 +1,245 @@
+import time as perf
+from collections import namedtuple
+
+from django.db import transaction
+
+from .availability import DAY_START, DAY_END, working_weekdays
+from .bulk import apply_bulk
+from .conflicts import SCHEDULE
+from .models import Classroom, Schedule, LessonRequirement, WEEKDAYS
+from .occupancy import TICK_SECONDS, to_tick, tick_to_time, span_mask
+
+# Занятость учителей, групп и аудиторий решатель хранит в тех же 5-минутных
+# битовых масках, что и app/occupancy.py: проверка пересечения — одно побитовое И.
+Task = namedtuple('Task', 'requirement ticks online')
+Placement = namedtuple('Placement', 'requirement weekday start end classroom_id')
+
+
+class SolveResult:
+    def __init__(self):
+        self.placements = []
+        self.unplaced = []
+        self.replaced_ids = []
+        self.steps = 0
+        self.elapsed = 0.0
+
+    @property
+    def complete(self):
+        return not self.unplaced
+
+    def lessons(self):
+        return [
+            Schedule(
+                group=p.requirement.group, teacher=p.requirement.teacher, classroom_id=p.classroom_id,
+                weekday=p.weekday, start_time=tick_to_time(p.start), end_time=tick_to_time(p.end),
+            )
+            for p in self.placements
+        ]
+
+
+class TimetableSolver:
+    """
+    Составляет еженедельное расписание по учебной нагрузке (LessonRequirement).
+
+    Каждое занятие — переменная, его значения — (день, начало, аудитория).
+    Занятия перебираются от самых трудных (длинные, у загруженных учителей
+    и групп) к лёгким, для каждого сразу отсекаются значения, пересекающиеся
+    с уже занятым временем учителя, группы и аудиторий (битовые маски), и
+    при тупике выполняется возврат. Если из тупика не удалось выйти за
+    backtrack_limit шагов (или исчерпан общий лимит max_steps), занятие
+    попадает в result.unplaced, а перебор продолжается дальше.
+
+    Занятия одной нагрузки ставятся в разные дни. Существующие строки
+    Schedule, не относящиеся к решаемой нагрузке, считаются неподвижными.
+    """
+
+    def __init__(self, requirements=None, weekdays=None, day_start=DAY_START, day_end=DAY_END,
+                 step=30, max_steps=200000, backtrack_limit=500):
+        self.requirements = list(
+            (requirements if requirements is not None else LessonRequirement.objects.all())
+            .select_related('group', 'teacher')
+        )
+        self.weekdays = list(weekdays or working_weekdays())
+        self.first_tick = to_tick(day_start, round_up=True)
+        self.last_tick = to_tick(day_end)
+        self.step = max(1, step * 60 // TICK_SECONDS)
+        self.max_steps = max_steps
+        self.backtrack_limit = backtrack_limit
+        self.busy = {}
+        self.previous = {}
+
+    def occupy(self, field, owner_id, weekday, mask):
+        key = (field, owner_id, weekday)
+        self.busy[key] = self.busy.get(key, 0) | mask
+
+    def release(self, field, owner_id, weekday, mask):
+        key = (field, owner_id, weekday)
+        self.busy[key] &= ~mask
+
+    def is_free(self, field, owner_id, weekday, mask):
+        return not self.busy.get((field, owner_id, weekday), 0) & mask
+
+    def load(self, result):
+        pairs = {(r.group_id, r.teacher_id) for r in self.requirements}
+        rows = Schedule.objects.filter(
+            group_id__in={group for group, _ in pairs}, teacher_id__in={teacher for _, teacher in pairs},
+        ) if pairs else Schedule.objects.none()
+        for pk, group_id, teacher_id, classroom_id, weekday, start, end in rows.values_list(
+            'id', 'group_id', 'teacher_id', 'classroom_id', 'weekday', 'start_time', 'end_time'
+        ):
+            if (group_id, teacher_id) in pairs:
+                result.replaced_ids.append(pk)
+                self.previous.setdefault((group_id, teacher_id), []).append(
+                    (weekday, to_tick(start), classroom_id)
+                )
+
+        fixed = Schedule.objects.exclude(id__in=result.replaced_ids).values_list(
+            'group_id', 'teacher_id', 'classroom_id', 'weekday', 'start_time', 'end_time'
+        )
+        for group_id, teacher_id, classroom_id, weekday, start, end in fixed.iterator():
+            mask = span_mask(to_tick(start), to_tick(end, round_up=True))
+            self.occupy('group', group_id, weekday, mask)
+            self.occupy('teacher', teacher_id, weekday, mask)
+            if classroom_id is not None:
+                self.occupy('classroom', classroom_id, weekday, mask)
+        self.classrooms = list(Classroom.objects.order_by('room_number').values_list('id', flat=True))
+
+    def tasks(self):
+        teacher_load, group_load = {}, {}
+        for r in self.requirements:
+            minutes = r.lessons_per_week * r.duration
+            teacher_load[r.teacher_id] = teacher_load.get(r.teacher_id, 0) + minutes
+            group_load[r.group_id] = group_load.get(r.group_id, 0) + minutes
+        tasks = [
+            Task(r, -(-r.duration * 60 // TICK_SECONDS), r.group.is_online or r.group.is_individual_online)
+            for r in self.requirements for _ in range(r.lessons_per_week)
+        ]
+        tasks.sort(key=lambda task: (
+            -task.ticks, -teacher_load[task.requirement.teacher_id], -group_load[task.requirement.group_id],
+            task.online, task.requirement.pk,
+        ))
+        return tasks
+
+    def candidates(self, task, used_days):
+        r = task.requirement
+        # Сначала прежние места занятий — при повторном решении для одного
+        # учителя расписание меняется как можно меньше.
+        options = list(self.previous.get((r.group_id, r.teacher_id), ()))
+        options += [
+            (weekday, start, None)
+            for weekday in self.weekdays
+            for start in range(self.first_tick, self.last_tick - task.ticks + 1, self.step)
+        ]
+        for weekday, start, room in options:
+            if weekday in used_days or weekday not in self.weekdays:
+                continue
+            if start < self.first_tick or start + task.ticks > self.last_tick:
+                continue
+            mask = span_mask(start, start + task.ticks)
+            if not (self.is_free('teacher', r.teacher_id, weekday, mask)
+                    and self.is_free('group', r.group_id, weekday, mask)):
+                continue
+            if task.online:
+                yield weekday, start, None, mask
+                continue
+            rooms = [room] if room is not None else self.classrooms
+            for classroom_id in rooms:
+                if self.is_free('classroom', classroom_id, weekday, mask):
+                    yield weekday, start, classroom_id, mask
+                    break
+
+    def place(self, task, option):
+        weekday, _, classroom_id, mask = option
+        self.occupy('teacher', task.requirement.teacher_id, weekday, mask)
+        self.occupy('group', task.requirement.group_id, weekday, mask)
+        if classroom_id is not None:
+            self.occupy('classroom', classroom_id, weekday, mask)
+
+    def unplace(self, task, option):
+        weekday, _, classroom_id, mask = option
+        self.release('teacher', task.requirement.teacher_id, weekday, mask)
+        self.release('group', task.requirement.group_id, weekday, mask)
+        if classroom_id is not None:
+            self.release('classroom', classroom_id, weekday, mask)
+
+    def solve(self):
+        started = perf.perf_counter()
+        result = SolveResult()
+        self.load(result)
+        tasks = self.tasks()
+        used_days = {}
+        # Занятия одной нагрузки в разные дни, пока дней хватает.
+        spread = {r.pk: r.lessons_per_week <= len(self.weekdays) for r in self.requirements}
+
+        def used(task):
+            return used_days.setdefault(task.requirement.pk, set()) if spread[task.requirement.pk] else set()
+
+        chosen = [None] * len(tasks)
+        iterators = [None] * len(tasks)
+        i = deepest = greedy_until = 0
+        stalled_at = 0
+        while i < len(tasks):
+            task = tasks[i]
+            if i > deepest:
+                deepest, stalled_at = i, result.steps
+            greedy = i <= greedy_until or result.steps >= self.max_steps
+            if greedy:
+                option = next(self.candidates(task, used(task)), None)
+            else:
+                if iterators[i] is None:
+                    iterators[i] = self.candidates(task, used(task))
+                option = next(iterators[i], None)
+            result.steps += 1
+            if option is not None:
+                self.place(task, option)
+                used(task).add(option[0])
+                chosen[i] = option
+                i += 1
+                continue
+            iterators[i] = None
+            if greedy or i == 0 or result.steps - stalled_at > self.backtrack_limit:
+                # Возврат не помог: занятие остаётся неразмещённым. Снятые при
+                # возврате занятия до самой глубокой точки расставляются жадно.
+                chosen[i] = None
+                greedy_until = deepest
+                stalled_at = result.steps
+                i += 1
+                continue
+            i -= 1
+            previous_task = tasks[i]
+            if chosen[i] is not None:
+                self.unplace(previous_task, chosen[i])
+                used(previous_task).discard(chosen[i][0])
+            chosen[i] = None
+
+        missing = {}
+        for task, option in zip(tasks, chosen):
+            if option is None:
+                missing[task.requirement] = missing.get(task.requirement, 0) + 1
+                continue
+            weekday, start, classroom_id, _ = option
+            result.placements.append(Placement(task.requirement, weekday, start, start + task.ticks, classroom_id))
+        result.unplaced = list(missing.items())
+        weekday_order = {code: n for n, (code, _) in enumerate(WEEKDAYS)}
+        result.placements.sort(key=lambda p: (weekday_order[p.weekday], p.start, p.requirement.pk))
+        result.elapsed = perf.perf_counter() - started
+        return result
+
+
+def solve(teacher=None, **options):
+    """
+    Решение для всей нагрузки или только для нагрузки одного учителя
+    (повторное решение после изменений: остальное расписание не трогается).
+    """
+    requirements = LessonRequirement.objects.all()
+    if teacher is not None:
+        requirements = requirements.filter(teacher=teacher)
+    return TimetableSolver(requirements, **options).solve()
+
+
+def apply_solution(result):
+    # Заменяет прежние занятия решённой нагрузки новыми; итог ещё раз
+    # проверяется на пересечения в apply_bulk.
+    with transaction.atomic():
+        Schedule.objects.filter(id__in=result.replaced_ids).delete()
+        return apply_bulk(SCHEDULE, created=result.lessons())
@@ -1,3 +1,1112 @@
-from django.test import TestCase
+import csv
+import io
+import random
+import threading
+import zipfile
+from datetime import date, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import analytics, caching, changes
+from .benchmark import generate, run_suite, compare
+from .bulk import reassign
+from .changes import LocalBroker, sequence
+from .conflicts import use_conflict_index, conflict_index, find_conflicts, SCHEDULE
+from .archive import archive_extra_lessons
+from .availability import free_slots, merge_intervals
+from .ical import fold, iter_calendar
+from .importer import import_schedule
+from .month_calendar import month_lessons, shift_month
+from .occupancy import occupancy, free_runs
+from .occurrences import expand, iter_days
+from .profiling import stats_buffer, percentile, QueryBudgetExceeded
+from .solver import solve, apply_solution
+from .models import (
+    Group, Teacher, Classroom, Schedule, ExtraLesson, ArchivedExtraLesson, LessonChange, LessonRequirement,
+    DailyTimetable, WEEKDAYS, weekday_code,
+)
+
+
+class ConflictIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rooms = [Classroom.objects.create(room_number=str(n)) for n in range(1, 4)]
+        rnd = random.Random(1)
+        for n, room in enumerate(cls.rooms):
+            cls.group = Group.objects.create(name=f"Группа {n}")
+            cls.teacher = Teacher.objects.create(name="Иван", surname=str(n))
+            for code, _ in WEEKDAYS:
+                for hour in rnd.sample(range(8, 20), 4):
+                    Schedule.objects.create(
+                        group=cls.group, teacher=cls.teacher, classroom=room, weekday=code,
+                        start_time=time(hour, 0), end_time=time(hour, 45),
+                    )
+            for day in range(14):
+                hour = rnd.randrange(8, 20)
+                lesson_date = date(2025, 3, 3) + timedelta(days=day)
+                if Schedule.objects.filter(classroom=room, weekday=weekday_code(lesson_date),
+                                           start_time=time(hour, 0)).exists():
+                    continue
+                ExtraLesson.objects.create(
+                    teacher=cls.teacher, classroom=room, date=lesson_date, is_individual="А. Б.",
+                    start_time=time(hour, 0), end_time=time(hour, 45),
+                )
+
+    def tearDown(self):
+        conflict_index.clear()
+
+    def _orm_busy(self, room, lesson_date, start, end):
+        return (
+            Schedule.objects.filter(classroom=room, weekday=weekday_code(lesson_date),
+                                    start_time__lt=end, end_time__gt=start).exists()
+            or ExtraLesson.objects.filter(classroom=room, date=lesson_date,
+                                          start_time__lt=end, end_time__gt=start).exists()
+        )
+
+    def test_index_matches_orm(self):
+        rnd = random.Random(2)
+        with use_conflict_index() as index:
+            for _ in range(300):
+                room = rnd.choice(self.rooms)
+                lesson_date = date(2025, 3, 3) + timedelta(days=rnd.randrange(14))
+                start = time(rnd.randrange(7, 21), rnd.choice([0, 15, 30, 45]))
+                end = time(min(start.hour + rnd.randrange(0, 3), 23), rnd.choice([0, 10, 50]))
+                if end <= start:
+                    continue
+                busy = (
+                    index.schedule_overlaps('classroom', room.id, weekday_code(lesson_date), start, end)
+                    or index.extra_lesson_overlaps('classroom', room.id, lesson_date, start, end)
+                )
+                self.assertEqual(busy, self._orm_busy(room, lesson_date, start, end))
+
+    def test_index_follows_save_and_delete(self):
+        room = self.rooms[0]
+        with use_conflict_index() as index:
+            with self.captureOnCommitCallbacks(execute=True):
+                lesson = Schedule.objects.create(
+                    group=self.group, teacher=self.teacher, classroom=room, weekday='mon',
+                    start_time=time(21, 0), end_time=time(22, 0),
+                )
+            self.assertTrue(index.schedule_overlaps('classroom', room.id, 'mon', time(21, 30), time(21, 40)))
+            with self.assertNumQueries(0):
+                with self.assertRaises(ValidationError):
+                    Schedule(group=self.group, teacher=self.teacher, classroom=room, weekday='mon',
+                             start_time=time(21, 30), end_time=time(22, 30)).clean()
+
+            lesson.start_time, lesson.end_time = time(22, 0), time(23, 0)
+            with self.captureOnCommitCallbacks(execute=True):
+                lesson.save()
+            self.assertFalse(index.schedule_overlaps('classroom', room.id, 'mon', time(21, 0), time(22, 0)))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                lesson.delete()
+            self.assertFalse(index.schedule_overlaps('classroom', room.id, 'mon', time(22, 0), time(23, 0)))
+        self.assertFalse(conflict_index.loaded)
+
+
+class ScheduleImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name="Группа 1")
+        Group.objects.create(name="Онлайн", is_online=True)
+        cls.teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        Teacher.objects.create(name="Пётр", surname="Петров")
+        cls.room = Classroom.objects.create(room_number="101")
+        Schedule.objects.create(group=cls.group, teacher=cls.teacher, classroom=cls.room,
+                                weekday='mon', start_time=time(9, 0), end_time=time(10, 0))
+
+    def test_csv_import_reports_row_errors(self):
+        stream = io.StringIO(
+            "group,teacher,classroom,weekday,start_time,end_time\n"
+            "Группа 1,Иван Иванов,101,tue,09:00,10:00\n"
+            "Группа 1,Иван Иванов,101,Вторник,09:30,10:30\n"
+            "Группа 1,Иван Иванов,101,mon,09:30,10:30\n"
+            "Нет такой,Иван Иванов,101,wed,09:00,10:00\n"
+            "Онлайн,Пётр Петров,101,mon,09:00,10:00\n"
+            "Группа 1,Иван Иванов,101,thu,11:00,10:00\n"
+        )
+        # На каждую пачку: INSERT строк, номер последнего изменения и INSERT в
+        # журнал изменений; в конце — пересчёт готовых дней затронутых групп и
+        # учителей (3 запроса).
+        with self.assertNumQueries(16):
+            result = import_schedule(stream, 'csv', chunk_size=1)
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual([error['line'] for error in result.errors], [3, 4, 5, 7])
+        self.assertIsNone(Schedule.objects.get(group__name="Онлайн").classroom)
+
+    def test_api_import_jsonl(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile("week.ndjson", (
+            '{"group": "Группа 1", "teacher": "Иван Иванов", "classroom": "101",'
+            ' "weekday": "fri", "start_time": "12:00", "end_time": "13:00", "repeat_weekly": false}\n'
+            'not json\n'
+        ).encode())
+        response = self.client.post('/api/schedule/import/', {'file': upload})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['errors'][0]['line'], 2)
+        self.assertFalse(Schedule.objects.get(weekday='fri').repeat_weekly)
+        response = self.client.post('/api/schedule/import/', {'file': SimpleUploadedFile("week.txt", b'')})
+        self.assertEqual(response.json()['detail'], "Неизвестный формат: txt")
+
+    def test_exclusion_violation_cancels_import(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile("week.csv", (
+            "group,teacher,classroom,weekday,start_time,end_time\n"
+            "Группа 1,Иван Иванов,101,tue,09:00,10:00\n"
+        ).encode())
+        error = IntegrityError('conflicting key value violates exclusion constraint "schedule_classroom_no_overlap"')
+        with mock.patch.object(changes, 'record', side_effect=error):
+            response = self.client.post('/api/schedule/import/', {'file': upload})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['created'], 0)
+        self.assertIsNone(response.json()['errors'][0]['line'])
+        self.assertFalse(Schedule.objects.filter(weekday='tue').exists())
+
+
+class TimetableApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teachers = [Teacher.objects.create(name="Учитель", surname=str(n)) for n in range(3)]
+        cls.rooms = [Classroom.objects.create(room_number=str(n)) for n in range(3)]
+        groups = [Group.objects.create(name=f"Группа {n}", is_online=n == 0) for n in range(3)]
+        schedules, extra_lessons = [], []
+        for n in range(60):
+            schedules.append(Schedule(
+                group=groups[n % 3], teacher=cls.teachers[n % 3],
+                classroom=None if n % 3 == 0 else cls.rooms[n % 3],
+                weekday=WEEKDAYS[n % 7][0], start_time=time(8 + n % 12), end_time=time(9 + n % 12),
+            ))
+            extra_lessons.append(ExtraLesson(
+                teacher=cls.teachers[n % 3], classroom=cls.rooms[n % 3], is_individual="А. Б.",
+                date=date(2025, 3, 3) + timedelta(days=n), start_time=time(18), end_time=time(19),
+            ))
+        Schedule.objects.bulk_create(schedules)
+        ExtraLesson.objects.bulk_create(extra_lessons)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for url in ('/api/schedules/', '/api/extra-lessons/'):
+            for page_size in (5, 50):
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, {'page_size': page_size})
+                self.assertEqual(len(response.json()['results']), page_size)
+
+    def test_cursor_pagination_walks_all_rows(self):
+        url, seen = '/api/schedules/?page_size=25', []
+        while url:
+            data = self.client.get(url).json()
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(sorted(seen), list(Schedule.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_extra_lesson_cursor_is_keyset_within_one_date(self):
+        ExtraLesson.objects.filter(date__lt=date(2025, 3, 10)).update(date=date(2025, 3, 3))
+        expected = list(ExtraLesson.objects.order_by('date', 'id').values_list('id', flat=True))
+        url, seen, pages = '/api/extra-lessons/?page_size=3', [], []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).json()
+            self.assertNotIn('OFFSET', queries[0]['sql'])
+            pages.append(data)
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(seen, expected)
+
+        previous = self.client.get(pages[2]['previous']).json()
+        self.assertEqual(previous['results'], pages[1]['results'])
+        self.assertEqual(self.client.get('/api/extra-lessons/', {'cursor': 'x'}).status_code, 404)
+
+    def test_filters(self):
+        teacher = self.teachers[1]
+        data = self.client.get('/api/schedules/', {'teacher': teacher.id, 'weekday': 'tue'}).json()
+        self.assertEqual(
+            {row['id'] for row in data['results']},
+            set(Schedule.objects.filter(teacher=teacher, weekday='tue').values_list('id', flat=True)),
+        )
+
+        data = self.client.get('/api/extra-lessons/', {
+            'date_from': '2025-03-03', 'date_to': '2025-03-30', 'weekday': 'mon',
+        }).json()
+        self.assertEqual([row['date'] for row in data['results']],
+                         ['2025-03-03', '2025-03-10', '2025-03-17', '2025-03-24'])
+
+        self.assertEqual(self.client.get('/api/schedules/', {'group': 'x'}).status_code, 400)
+
+
+class OccurrenceExpansionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name="Группа 1")
+        cls.teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        room = Classroom.objects.create(room_number="101")
+        for n, (code, _) in enumerate(WEEKDAYS):
+            Schedule.objects.create(group=cls.group, teacher=cls.teacher, classroom=room, weekday=code,
+                                    start_time=time(9 + n), end_time=time(10 + n))
+        Schedule.objects.create(group=cls.group, teacher=cls.teacher, weekday='mon', repeat_weekly=False,
+                                start_time=time(18), end_time=time(19))
+        other_teacher = Teacher.objects.create(name="Пётр", surname="Петров")
+        for day in range(0, 60, 3):
+            ExtraLesson.objects.create(teacher=other_teacher, date=date(2025, 3, 1) + timedelta(days=day),
+                                       start_time=time(12), end_time=time(13), is_individual="А. Б.")
+
+    def test_heap_merge_and_day_expansion_agree(self):
+        date_from, date_to = date(2025, 3, 5), date(2025, 4, 20)
+        merged = list(expand(date_from, date_to, fast=False))
+        by_day = list(expand(date_from, date_to, fast=True))
+
+        self.assertEqual(merged, by_day)
+        self.assertEqual(merged, sorted(merged))
+        self.assertEqual(sum(1 for o in merged if o.kind == 'schedule'), (date_to - date_from).days + 1)
+        self.assertEqual(sum(len(lessons) for _, lessons in iter_days(date_from, date_to)), len(merged))
+        self.assertTrue(all(o.start_time != time(18) for o in merged))
+
+    def test_group_filter_skips_extra_lessons(self):
+        with self.assertNumQueries(1):
+            occurrences = list(expand(date(2025, 3, 1), date(2025, 3, 7), group=self.group))
+        self.assertEqual([o.date.weekday() for o in occurrences], [5, 6, 0, 1, 2, 3, 4])
+
+
+class TimetableCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name="Группа 1")
+        cls.teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        cls.other_teacher = Teacher.objects.create(name="Пётр", surname="Петров")
+        cls.lesson = Schedule.objects.create(group=cls.group, teacher=cls.teacher, weekday='mon',
+                                             start_time=time(9), end_time=time(10))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeat_and_conditional_requests_skip_database(self):
+        url = f'/api/schedules/?group={self.group.id}'
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            not_modified_since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified_since.status_code, 304)
+
+    def test_versions_change_only_after_commit(self):
+        # Читатель между записью и коммитом получает прежний ответ из кэша,
+        # а не кэширует старые строки под новой версией.
+        url = f'/api/schedules/?group={self.group.id}'
+        self.assertEqual(len(self.client.get(url).json()['results']), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Schedule.objects.create(group=self.group, teacher=self.teacher, weekday='tue',
+                                    start_time=time(9), end_time=time(10))
+            with self.assertNumQueries(0):
+                self.assertEqual(len(self.client.get(url).json()['results']), 1)
+        self.assertEqual(len(self.client.get(url).json()['results']), 2)
+
+    def test_changes_invalidate_affected_entries(self):
+        group_url = f'/api/schedules/?group={self.group.id}'
+        other_teacher_url = f'/api/schedules/?teacher={self.other_teacher.id}'
+        etag = self.client.get(group_url)['ETag']
+        self.assertEqual(self.client.get(other_teacher_url).json()['results'], [])
+
+        self.teacher.surname = "Сидоров"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher.save()
+        response = self.client.get(group_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['teacher_name'], "Иван Сидоров")
+
+        self.lesson.teacher = self.other_teacher
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.save()
+        self.assertEqual(len(self.client.get(other_teacher_url).json()['results']), 1)
+
+
+class ScheduleCalendarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        group = Group.objects.create(name="Группа <1>")
+        cls.teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        room = Classroom.objects.create(room_number="101")
+        for code, _ in WEEKDAYS:
+            Schedule.objects.create(group=group, teacher=cls.teacher, classroom=room, weekday=code,
+                                    start_time=time(10), end_time=time(11))
+        ExtraLesson.objects.create(teacher=cls.teacher, date=date(2025, 1, 15), is_individual="А. Б.",
+                                   start_time=time(9), end_time=time(10))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_shift_month_wraps_year(self):
+        self.assertEqual(shift_month(2025, 1, -1), (2024, 12))
+        self.assertEqual(shift_month(2024, 12, 1), (2025, 1))
+        self.assertEqual(shift_month(2025, 13, 0), (2026, 1))
+
+    def test_month_lessons(self):
+        with self.assertNumQueries(2):
+            days = month_lessons(2025, 1)
+        self.assertEqual(len(days), 31)
+        self.assertEqual(len(days[15]), 2)
+        self.assertIn("Доп. урок", days[15][0])
+        self.assertIn("Группа &lt;1&gt;", days[16][0])
+
+    def test_calendar_view_is_cached_until_data_changes(self):
+        url = '/admin/app/schedule/calendar/'
+        response = self.client.get(url, {'month': 1, 'year': 2025})
+        self.assertContains(response, '?month=12&year=2024')
+        self.assertContains(response, '?month=2&year=2025')
+        self.assertContains(response, 'Иван Иванов')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'month': 1, 'year': 2025})
+        self.assertFalse([q for q in queries if 'app_schedule' in q['sql'] or 'app_extralesson' in q['sql']])
+
+        self.teacher.surname = "Петров"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher.save()
+        self.assertContains(self.client.get(url, {'month': 1, 'year': 2025}), 'Иван Петров')
+
+
+class FreeSlotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        group = Group.objects.create(name="Группа 1")
+        cls.teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        cls.room_a = Classroom.objects.create(room_number="101")
+        cls.room_b = Classroom.objects.create(room_number="102")
+        for start, end in ((9, 10), (10, 12), (15, 16)):
+            Schedule.objects.create(group=group, teacher=cls.teacher, classroom=cls.room_a, weekday='mon',
+                                    start_time=time(start), end_time=time(end))
+        ExtraLesson.objects.create(teacher=Teacher.objects.create(name="Пётр", surname="Петров"),
+                                   classroom=cls.room_b, date=date(2025, 3, 3),
+                                   start_time=time(8), end_time=time(20), is_individual="А. Б.")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_merge_intervals(self):
+        self.assertEqual(merge_intervals([(5, 7), (1, 3), (2, 4), (4, 5)]), [[1, 7]])
+
+    def test_free_slots_by_weekday_and_date(self):
+        slots = [(s.room_number, s.start, s.end) for s in free_slots(60, weekday='mon')]
+        self.assertEqual(slots, [
+            ("101", time(8), time(9)), ("101", time(12), time(15)), ("101", time(16), time(21)),
+            ("102", time(8), time(21)),
+        ])
+        slots = [(s.room_number, s.start, s.end) for s in free_slots(90, lesson_date=date(2025, 3, 3))]
+        self.assertEqual(slots, [("101", time(12), time(15)), ("101", time(16), time(21))])
+
+        with self.assertNumQueries(0):
+            free_slots(90, lesson_date=date(2025, 3, 3))
+
+    def test_api_subtracts_teacher_busy_time(self):
+        response = self.client.get('/api/free-slots/', {
+            'weekday': 'mon', 'duration': 30, 'classroom': self.room_b.id, 'teacher': self.teacher.id,
+            'day_start': '09:00', 'day_end': '18:00',
+        })
+        self.assertEqual(response.json()['results'], [
+            {'classroom': self.room_b.id, 'classroom_number': "102", 'start': "12:00", 'end': "15:00"},
+            {'classroom': self.room_b.id, 'classroom_number': "102", 'start': "16:00", 'end': "18:00"},
+        ])
+        self.assertEqual(self.client.get('/api/free-slots/', {'weekday': 'mon'}).status_code, 400)
+
+
+class DoubleBookingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name="Группа 1")
+        cls.online_group = Group.objects.create(name="Онлайн", is_online=True)
+        cls.teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        cls.other_teacher = Teacher.objects.create(name="Пётр", surname="Петров")
+        cls.room = Classroom.objects.create(room_number="101")
+        cls.lesson = Schedule.objects.create(group=cls.group, teacher=cls.teacher, classroom=cls.room,
+                                             weekday='mon', start_time=time(9), end_time=time(10))
+
+    def tearDown(self):
+        conflict_index.clear()
+
+    def assertBusy(self, lesson, message):
+        with self.assertRaisesMessage(ValidationError, message):
+            lesson.save()
+
+    def test_teacher_and_group_conflicts_on_save(self):
+        for use_index in (False, True):
+            if use_index:
+                conflict_index.load()
+            self.assertBusy(Schedule(group=self.online_group, teacher=self.teacher, weekday='mon',
+                                     start_time=time(9, 30), end_time=time(10, 30)), "Учитель занят")
+            self.assertBusy(Schedule(group=self.group, teacher=self.other_teacher, weekday='mon',
+                                     start_time=time(9, 30), end_time=time(10, 30)), "Группа занята")
+            self.assertBusy(ExtraLesson(teacher=self.teacher, date=date(2025, 3, 3), is_online=True,
+                                        start_time=time(9, 30), end_time=time(10, 30)), "Учитель занят")
+        Schedule.objects.create(group=self.online_group, teacher=self.teacher, weekday='mon',
+                                start_time=time(10), end_time=time(11))
+
+    def test_end_must_be_after_start(self):
+        self.assertBusy(Schedule(group=self.group, teacher=self.other_teacher, weekday='tue',
+                                 start_time=time(10), end_time=time(9)), "Время окончания должно быть позже")
+        self.assertBusy(ExtraLesson(teacher=self.teacher, date=date(2025, 3, 4), is_individual="А. Б.",
+                                    start_time=time(10), end_time=time(10)), "Время окончания должно быть позже")
+        # Ограничение в БД срабатывает и в обход clean().
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Schedule.objects.bulk_create([Schedule(group=self.group, teacher=self.teacher, weekday='tue',
+                                                   start_time=time(10), end_time=time(9))])
+
+    def test_find_conflicts_reports_each_pair_once(self):
+        # bulk_create обходит clean(), как при загрузке старых данных.
+        duplicate = Schedule.objects.bulk_create([
+            Schedule(group=self.online_group, teacher=self.teacher, weekday='mon',
+                     start_time=time(9, 30), end_time=time(10, 30)),
+        ])[0]
+        extra = ExtraLesson.objects.bulk_create([
+            ExtraLesson(teacher=self.other_teacher, classroom=self.room, date=date(2025, 3, 3),
+                        start_time=time(9, 45), end_time=time(11), is_individual="А. Б."),
+        ])[0]
+        found = {(c.field, c.day, c.first.id, c.second.id) for c in find_conflicts()}
+        self.assertEqual(found, {
+            ('teacher', 'mon', self.lesson.id, duplicate.id),
+            ('classroom', date(2025, 3, 3), self.lesson.id, extra.id),
+        })
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    def test_parallel_saves_do_not_double_book(self):
+        group_ids = [Group.objects.create(name=f"Группа {n}").id for n in range(8)]
+        teacher_ids = [Teacher.objects.create(name="Учитель", surname=str(n)).id for n in range(8)]
+        room_ids = [Classroom.objects.create(room_number=str(n)).id for n in range(2)]
+        saved, rejected, failed = [], [], []
+
+        def book(worker):
+            rnd = random.Random(worker)
+            try:
+                for _ in range(15):
+                    start = rnd.randrange(8 * 60, 12 * 60, 15)
+                    lesson = Schedule(
+                        group_id=group_ids[worker], teacher_id=teacher_ids[worker],
+                        classroom_id=rnd.choice(room_ids), weekday='mon',
+                        start_time=time(start // 60, start % 60), end_time=time(start // 60 + 1, start % 60),
+                    )
+                    try:
+                        lesson.save()
+                        saved.append(lesson.id)
+                    except ValidationError:
+                        rejected.append(lesson)
+            except Exception as exc:
+                failed.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=book, args=(worker,)) for worker in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(failed, [])
+        self.assertTrue(saved)
+        self.assertTrue(rejected)
+        self.assertEqual(Schedule.objects.count(), len(saved))
+        self.assertEqual(list(find_conflicts()), [])
+
+
+class ICalFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name="Группа; 1")
+        cls.teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        room = Classroom.objects.create(room_number="101")
+        Schedule.objects.create(group=cls.group, teacher=cls.teacher, classroom=room, weekday='wed',
+                                start_time=time(9), end_time=time(10))
+        ExtraLesson.objects.create(teacher=cls.teacher, date=date(2025, 9, 20), is_individual="А. Б.",
+                                   start_time=time(12), end_time=time(13), is_online=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fold_long_lines(self):
+        folded = fold("DESCRIPTION:" + "я" * 100)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in folded.split("\r\n")))
+        self.assertEqual(folded.replace("\r\n ", ""), "DESCRIPTION:" + "я" * 100 + "\r\n")
+
+    def test_teacher_feed_contents(self):
+        # Разовое занятие не попадает ни в календари, ни в ленту.
+        Schedule.objects.create(group=self.group, teacher=self.teacher, weekday='fri', repeat_weekly=False,
+                                start_time=time(9), end_time=time(10))
+        body = "".join(iter_calendar('teacher', self.teacher.id, str(self.teacher), today=date(2025, 10, 1)))
+        self.assertIn("DTSTART:20250903T090000\r\nDTEND:20250903T100000\r\nRRULE:FREQ=WEEKLY;BYDAY=WE", body)
+        self.assertIn("SUMMARY:Группа\\; 1", body)
+        self.assertIn("DTSTART:20250920T120000", body)
+        self.assertIn("LOCATION:Онлайн", body)
+        self.assertEqual(body.count("BEGIN:VEVENT"), 2)
+
+    def test_feed_etag_and_not_modified(self):
+        url = f'/api/ical/group/{self.group.id}.ics'
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertEqual(b"".join(response.streaming_content).count(b"BEGIN:VEVENT"), 1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Schedule.objects.create(group=self.group, teacher=self.teacher, weekday='fri',
+                                    start_time=time(9), end_time=time(10))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(self.client.get('/api/ical/group/999.ics').status_code, 404)
+
+
+class AsyncTimetableTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name="Группа 1")
+        teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        for n, (code, _) in enumerate(reversed(WEEKDAYS)):
+            Schedule.objects.create(group=cls.group, teacher=teacher, weekday=code,
+                                    start_time=time(9 + n), end_time=time(10 + n))
+        for day in range(5):
+            ExtraLesson.objects.create(teacher=teacher, date=date(2025, 3, 3), is_individual=str(day),
+                                       start_time=time(18, day * 10), end_time=time(18, day * 10 + 5))
+
+    async def test_schedule_list_matches_sync_api(self):
+        response = await self.async_client.get('/api/async/schedules/', {'page_size': 4})
+        data = response.json()
+        self.assertEqual(len(data['results']), 4)
+        rest = (await self.async_client.get(data['next'])).json()
+        self.assertIsNone(rest['next'])
+        ids = [row['id'] for row in data['results'] + rest['results']]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(ids), 7)
+
+    async def test_extra_lesson_keyset_within_one_date(self):
+        url, seen = '/api/async/extra-lessons/?page_size=2&date_from=2025-03-01', []
+        while url:
+            data = (await self.async_client.get(url)).json()
+            seen += [row['is_individual'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(seen, ['0', '1', '2', '3', '4'])
+        self.assertEqual((await self.async_client.get('/api/async/extra-lessons/?after=x')).status_code, 400)
+
+    async def test_group_timetable(self):
+        data = (await self.async_client.get(f'/api/async/groups/{self.group.id}/timetable/')).json()
+        self.assertEqual([row['weekday'] for row in data['lessons']], [code for code, _ in WEEKDAYS])
+        self.assertEqual((await self.async_client.get('/api/async/groups/999/timetable/')).status_code, 404)
+
+
+class BulkLessonActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.teachers = [Teacher.objects.create(name="Учитель", surname=str(n)) for n in range(3)]
+        cls.room = Classroom.objects.create(room_number="101")
+        cls.lessons = [
+            Schedule.objects.create(group=Group.objects.create(name=f"Группа {n}"), teacher=cls.teachers[n],
+                                    classroom=cls.room, weekday='mon', start_time=time(9 + n), end_time=time(10 + n))
+            for n in range(2)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def run_action(self, url, action, ids, **params):
+        return self.client.post(url, {'action': action, '_selected_action': ids, **params}, follow=True)
+
+    def test_shift_time_moves_whole_set(self):
+        ids = [lesson.id for lesson in self.lessons]
+        self.run_action('/admin/app/schedule/', 'shift_time', ids, minutes=90)
+        self.assertEqual(
+            list(Schedule.objects.order_by('id').values_list('start_time', flat=True)),
+            [time(10, 30), time(11, 30)],
+        )
+
+    def test_conflict_rolls_back_everything(self):
+        other = Schedule.objects.create(group=Group.objects.create(name="Другая"), teacher=self.teachers[2],
+                                        classroom=self.room, weekday='tue', start_time=time(10), end_time=time(11))
+        ids = [lesson.id for lesson in self.lessons]
+        response = self.run_action('/admin/app/schedule/', 'move_to_weekday', ids, weekday='tue')
+        self.assertContains(response, "Аудитория занята")
+        self.assertEqual(Schedule.objects.filter(weekday='tue').get(), other)
+
+    def test_exclusion_violation_is_shown_as_form_error(self):
+        # На PostgreSQL пересечение, пропущенное проверкой, ловит ограничение
+        # из миграции 0007; админка показывает ошибку вместо 500.
+        error = IntegrityError('conflicting key value violates exclusion constraint "schedule_classroom_no_overlap"')
+        with mock.patch.object(changes, 'record', side_effect=error):
+            response = self.run_action('/admin/app/schedule/', 'shift_time', [self.lessons[0].id], minutes=15)
+        self.assertContains(response, "Аудитория занята")
+        self.assertEqual(Schedule.objects.get(id=self.lessons[0].id).start_time, time(9))
+
+    def test_reassign_teacher_checks_teacher_conflicts(self):
+        Schedule.objects.create(group=Group.objects.create(name="Другая"), teacher=self.teachers[2],
+                                weekday='mon', start_time=time(10, 30), end_time=time(11, 30))
+        with self.assertRaises(ValidationError):
+            reassign(SCHEDULE, Schedule.objects.filter(id=self.lessons[1].id), 'teacher', self.teachers[2])
+        self.run_action('/admin/app/schedule/', 'reassign_teacher', [self.lessons[0].id], teacher=self.teachers[2].id)
+        self.assertEqual(Schedule.objects.get(id=self.lessons[0].id).teacher, self.teachers[2])
+
+    def test_repeat_weekly_actions_go_through_bulk_path(self):
+        ids = [lesson.id for lesson in self.lessons]
+        head = LessonChange.objects.count()
+        group_scope = caching.scope('group', self.lessons[0].group_id)
+        version = caching.current_versions([group_scope])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.run_action('/admin/app/schedule/', 'remove_repeat_weekly', ids)
+        self.assertFalse(Schedule.objects.filter(repeat_weekly=True).exists())
+        self.assertEqual(LessonChange.objects.count(), head + 2)
+        self.assertNotEqual(caching.current_versions([group_scope]), version)
+        self.run_action('/admin/app/schedule/', 'make_repeat_weekly', ids)
+        self.assertEqual(Schedule.objects.filter(repeat_weekly=True).count(), 2)
+
+    def test_copy_week(self):
+        lesson = ExtraLesson.objects.create(teacher=self.teachers[2], classroom=self.room, date=date(2025, 3, 4),
+                                            is_individual="А. Б.", start_time=time(9), end_time=time(10))
+        self.run_action('/admin/app/extralesson/', 'copy_week', [lesson.id],
+                        date_from='2025-03-01', date_to='2025-03-31')
+        self.assertEqual(
+            list(ExtraLesson.objects.order_by('date').values_list('date', flat=True)),
+            [date(2025, 3, 4), date(2025, 3, 11), date(2025, 3, 18), date(2025, 3, 25)],
+        )
+
+
+class QueryProfilerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        for n in range(5):
+            Schedule.objects.create(group=Group.objects.create(name=f"Группа {n}"),
+                                    teacher=Teacher.objects.create(name="Учитель", surname=str(n)),
+                                    classroom=Classroom.objects.create(room_number=str(n)),
+                                    weekday='mon', start_time=time(9 + n), end_time=time(10 + n))
+
+    def setUp(self):
+        stats_buffer.clear()
+        self.client.force_login(self.admin)
+
+    def test_changelist_has_no_n_plus_one(self):
+        self.client.get('/admin/app/schedule/')
+        stats = [item for item in stats_buffer.snapshot() if item.view == 'admin:app_schedule_changelist']
+        self.assertEqual(len(stats), 1)
+        self.assertGreater(stats[0].queries, 0)
+        # Подгрузка внешнего ключа по одному объекту выглядит как WHERE id = %s LIMIT 21.
+        self.assertFalse([sql for sql, _ in stats[0].duplicates if 'LIMIT 21' in sql])
+
+    def test_dashboard_shows_summary(self):
+        self.client.get('/api/schedules/')
+        response = self.client.get('/admin/profiling/')
+        self.assertContains(response, 'schedule-list')
+        self.client.post('/admin/profiling/')
+        self.assertFalse([item for item in stats_buffer.snapshot() if item.view == 'schedule-list'])
+
+    def test_query_budget(self):
+        with self.settings(QUERY_BUDGETS={'schedule-list': 0}, QUERY_BUDGET_ACTION='raise'):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/schedules/')
+        with self.settings(QUERY_BUDGETS={'schedule-list': 0}), self.assertLogs('app.profiling', 'WARNING'):
+            self.client.get('/api/schedules/')
+
+    async def test_async_views_stay_async(self):
+        # Синхронная middleware заставила бы Django писать в лог адаптацию цепочки.
+        with self.settings(DEBUG=True), self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler().load_middleware(is_async=True)
+        await self.async_client.get('/api/async/schedules/')
+        [stats] = [item for item in stats_buffer.snapshot() if item.view == 'async-schedule-list']
+        self.assertGreater(stats.queries, 0)
+
+    def test_percentile(self):
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile([], 50), 0)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_suite_runs_and_compares(self):
+        generate(groups=5, teachers=5, classrooms=5, lessons=30, extra_lessons=30, days=60)
+        results = run_suite(['schedule_create', 'api_schedules_cached'], repeat=3)
+        self.assertEqual(set(results), {'schedule_create', 'api_schedules_cached'})
+        self.assertEqual(results['api_schedules_cached']['queries'], 0)
+
+        baseline = {'results': {'schedule_create': {**results['schedule_create'], 'median_ms': 0.001}}}
+        [(name, _, _, _, regressed)] = compare(results, baseline)
+        self.assertEqual(name, 'schedule_create')
+        self.assertTrue(regressed)
+
+
+class TimetableSolverTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rooms = [Classroom.objects.create(room_number=str(n)) for n in range(2)]
+        cls.teachers = [Teacher.objects.create(name="Учитель", surname=str(n)) for n in range(3)]
+        cls.groups = [Group.objects.create(name=f"Группа {n}", is_online=n == 3) for n in range(4)]
+        for n, group in enumerate(cls.groups):
+            for teacher in cls.teachers[:2] if n % 2 else cls.teachers[1:]:
+                LessonRequirement.objects.create(group=group, teacher=teacher, lessons_per_week=3, duration=90)
+
+    def test_solution_is_conflict_free(self):
+        result = solve(day_start=time(9), day_end=time(14))
+        self.assertTrue(result.complete)
+        self.assertEqual(len(result.placements), 24)
+        self.assertEqual(Schedule.objects.count(), 0)
+
+        self.assertEqual(apply_solution(result), 24)
+        self.assertEqual(list(find_conflicts()), [])
+        self.assertFalse(Schedule.objects.filter(group=self.groups[3], classroom__isnull=False).exists())
+        for requirement in LessonRequirement.objects.all():
+            days = Schedule.objects.filter(group=requirement.group, teacher=requirement.teacher).values('weekday')
+            self.assertEqual(days.distinct().count(), 3)
+
+    def test_resolve_for_one_teacher_keeps_other_lessons(self):
+        apply_solution(solve())
+        teacher = self.teachers[0]
+        others = set(Schedule.objects.exclude(teacher=teacher).values_list('id', flat=True))
+        LessonRequirement.objects.filter(teacher=teacher).update(lessons_per_week=4)
+
+        result = solve(teacher=teacher)
+        self.assertEqual(len(result.placements), 8)
+        apply_solution(result)
+        self.assertEqual(set(Schedule.objects.exclude(teacher=teacher).values_list('id', flat=True)), others)
+        self.assertEqual(Schedule.objects.filter(teacher=teacher).count(), 8)
+        self.assertEqual(list(find_conflicts()), [])
+
+    def test_reports_unplaced_lessons(self):
+        result = solve(day_start=time(9), day_end=time(10, 30))
+        self.assertFalse(result.complete)
+        self.assertEqual(len(result.placements) + sum(n for _, n in result.unplaced), 24)
+
+
+class OccupancyMapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        cls.rooms = [Classroom.objects.create(room_number=str(n)) for n in (101, 102)]
+        cls.group = Group.objects.create(name="Группа")
+        cls.lesson = Schedule.objects.create(group=cls.group, teacher=cls.teacher, classroom=cls.rooms[0],
+                                             weekday='wed', start_time=time(10), end_time=time(11, 30))
+        ExtraLesson.objects.create(teacher=cls.teacher, classroom=cls.rooms[1], date=date(2025, 3, 5),
+                                   is_individual="А. Б.", start_time=time(12), end_time=time(13))
+
+    def setUp(self):
+        cache.clear()
+        occupancy.load()
+        self.addCleanup(occupancy.clear)
+
+    def test_free_runs(self):
+        self.assertEqual(free_runs(0b0111_0011), [(0, 2), (4, 7)])
+        self.assertEqual(free_runs(0b0111_0011, min_ticks=3), [(4, 7)])
+
+    def test_masks_follow_saves_and_deletes(self):
+        self.assertTrue(occupancy.overlaps('classroom', self.rooms[0].id, 'wed', time(11), time(12)))
+        self.assertTrue(occupancy.overlaps('teacher', self.teacher.id, 'wed', time(12, 30), time(14),
+                                           date=date(2025, 3, 5)))
+        self.assertFalse(occupancy.overlaps('teacher', self.teacher.id, 'wed', time(12, 30), time(14)))
+
+        self.lesson.start_time, self.lesson.end_time = time(15), time(16)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.save()
+        self.assertFalse(occupancy.overlaps('classroom', self.rooms[0].id, 'wed', time(11), time(12)))
+        self.assertAlmostEqual(occupancy.utilisation('classroom', self.rooms[0].id, 'wed', time(8), time(18)), 0.1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.delete()
+        self.assertEqual(occupancy.mask('group', self.group.id, 'wed'), 0)
+
+    def test_free_slots_match_orm(self):
+        bitset = free_slots(60, lesson_date=date(2025, 3, 5), teacher=self.teacher.id)
+        occupancy.clear()
+        self.assertEqual(bitset, free_slots(60, lesson_date=date(2025, 3, 5), teacher=self.teacher.id))
+
+
+class AnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        cls.room = Classroom.objects.create(room_number="101")
+        Classroom.objects.create(room_number="102")
+        Schedule.objects.create(group=Group.objects.create(name="Офлайн"), teacher=cls.teacher, classroom=cls.room,
+                                weekday='mon', start_time=time(10), end_time=time(11, 30))
+        Schedule.objects.create(group=Group.objects.create(name="Онлайн", is_online=True), teacher=cls.teacher,
+                                weekday='tue', start_time=time(10), end_time=time(11))
+        ExtraLesson.objects.create(teacher=cls.teacher, classroom=cls.room, date=date(2025, 3, 5),
+                                   is_individual="А. Б.", start_time=time(12), end_time=time(12, 45))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_utilisation(self):
+        [room, other] = analytics.utilisation('classroom', week=date(2025, 3, 7))
+        self.assertEqual((room['mon'], room['wed'], room['minutes']), (90, 45, 135))
+        self.assertEqual(other['minutes'], 0)
+        self.assertEqual(analytics.utilisation('classroom')[0]['wed'], 0)
+
+    def test_utilisation_ignores_days_off(self):
+        Schedule.objects.create(group=Group.objects.create(name="Воскресная"), teacher=self.teacher,
+                                classroom=self.room, weekday='sun', start_time=time(8), end_time=time(21))
+        [room, _] = analytics.utilisation('classroom')
+        self.assertEqual((room['sun'], room['minutes']), (780, 90))
+        with self.settings(WORKING_WEEKDAYS=['sun']):
+            cache.clear()
+            [room, _] = analytics.utilisation('classroom')
+        self.assertEqual((room['minutes'], room['utilisation']), (780, 1))
+
+    def test_heatmap_and_online_split(self):
+        rows = {row['weekday']: row for row in analytics.heatmap('teacher', self.teacher.id)}
+        self.assertEqual((rows['mon']['10'], rows['mon']['11'], rows['mon']['12']), (1, 0.5, 0))
+        [split] = analytics.online_split(week=date(2025, 3, 5))
+        self.assertEqual((split['online'], split['offline']), (60, 135))
+
+    def test_results_are_cached_until_timetable_changes(self):
+        analytics.utilisation('teacher')
+        with self.assertNumQueries(0):
+            analytics.utilisation('teacher')
+        with self.captureOnCommitCallbacks(execute=True):
+            Schedule.objects.filter(weekday='tue').get().delete()
+        self.assertEqual(analytics.utilisation('teacher')[0]['minutes'], 90)
+
+    def test_cache_is_scoped_by_week_and_owner_kind(self):
+        analytics.utilisation('classroom')
+        analytics.utilisation('teacher', week=date(2025, 3, 5))
+        with self.captureOnCommitCallbacks(execute=True):
+            # Доп. урок другой недели не трогает ни еженедельную, ни мартовскую сводку.
+            ExtraLesson.objects.create(teacher=self.teacher, classroom=self.room, date=date(2025, 4, 2),
+                                       is_individual="В. Г.", start_time=time(9), end_time=time(10))
+        with self.assertNumQueries(0):
+            analytics.utilisation('classroom')
+            analytics.utilisation('teacher', week=date(2025, 3, 3))
+        with self.captureOnCommitCallbacks(execute=True):
+            Schedule.objects.filter(weekday='mon').get().delete()
+        self.assertEqual(analytics.utilisation('classroom')[0]['minutes'], 0)
+
+    def test_csv_export(self):
+        response = self.client.get('/api/analytics/utilisation/', {'by': 'teacher', 'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = response.content.decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], 'id,name,mon,tue,wed,thu,fri,sat,sun,minutes,utilisation')
+        self.assertIn('Иван Иванов', lines[1])
+        self.assertEqual(self.client.get('/api/analytics/heatmap/', {'by': 'group'}).status_code, 400)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        room = Classroom.objects.create(room_number="101")
+        for n, code in enumerate(('wed', 'mon')):
+            Schedule.objects.create(group=Group.objects.create(name=f"Группа <{n}>"), teacher=teacher,
+                                    classroom=room, weekday=code, start_time=time(10), end_time=time(11))
+        for day in (date(2025, 3, 5), date(2025, 4, 5)):
+            ExtraLesson.objects.create(teacher=teacher, date=day, is_individual="А. Б.", is_online=True,
+                                       start_time=time(9), end_time=time(10))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_endpoint_uses_list_filters(self):
+        response = self.client.get('/api/export/extra-lessons.csv', {'date_from': '2025-04-01'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="extra-lessons.csv"')
+        rows = list(csv.reader(io.StringIO(self.read(response).decode('utf-8-sig'))))
+        self.assertEqual(rows[0][0], "Дата")
+        self.assertEqual(rows[1:], [['2025-04-05', 'Суббота', 'Иван Иванов', '', '09:00', '10:00', 'А. Б.', 'да']])
+        self.assertEqual(self.client.get('/api/export/schedules.csv', {'group': 'x'}).status_code, 400)
+
+    def test_xlsx_is_valid_zip_with_rows_in_weekday_order(self):
+        content = self.read(self.client.get('/api/export/schedules.xlsx'))
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertLess(sheet.index('Понедельник'), sheet.index('Среда'))
+        self.assertIn('Группа &lt;1&gt;', sheet)
+
+    def test_export_requires_staff(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/export/extra-lessons.csv').status_code, 302)
+        self.client.force_login(User.objects.create_user('user', password='password'))
+        self.assertEqual(self.client.get('/api/export/schedules.xlsx').status_code, 302)
+
+    def test_admin_export_action(self):
+        ids = list(Schedule.objects.values_list('id', flat=True))
+        response = self.client.post('/admin/app/schedule/', {'action': 'export_csv', '_selected_action': ids})
+        self.assertEqual(len(self.read(response).decode('utf-8-sig').splitlines()), 3)
+
+
+class StartupWarmUpTests(TestCase):
+    def test_warm_up_does_not_touch_database(self):
+        from core.startup import warm_up
+
+        with self.assertNumQueries(0):
+            warm_up()
+
+
+class ChangeFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name="Группа 1")
+        cls.first = Teacher.objects.create(name="Иван", surname="Иванов")
+        cls.second = Teacher.objects.create(name="Пётр", surname="Петров")
+
+    def feed(self, **params):
+        return self.client.get('/api/changes/', params).json()
+
+    def test_delta_follows_lesson_between_teachers(self):
+        start = self.feed()['last']
+        lesson = Schedule.objects.create(group=self.group, teacher=self.first, weekday='mon',
+                                         start_time=time(9), end_time=time(10))
+        lesson.teacher = self.second
+        lesson.save()
+
+        first = self.feed(since=start, teacher=self.first.id)
+        self.assertEqual([event['action'] for event in first['results']], ['created', 'deleted'])
+        self.assertEqual(first['results'][0]['data']['start_time'], '09:00:00')
+        second = self.feed(since=start, teacher=self.second.id)
+        self.assertEqual([event['action'] for event in second['results']], ['updated'])
+
+        lesson_id = lesson.id
+        lesson.delete()
+        data = self.feed(since=first['last'], group=self.group.id)
+        self.assertEqual([(event['action'], event['id']) for event in data['results']], [('deleted', lesson_id)])
+        self.assertEqual(self.feed(since=data['last'])['results'], [])
+        self.assertEqual(self.client.get('/api/changes/', {'group': 1, 'teacher': 1}).status_code, 400)
+
+    def test_bulk_writes_are_logged_with_previous_owner(self):
+        Schedule.objects.create(group=self.group, teacher=self.first, weekday='mon',
+                                start_time=time(9), end_time=time(10))
+        start = self.feed()['last']
+        reassign(SCHEDULE, Schedule.objects.all(), 'teacher', self.second)
+        data = self.feed(since=start, teacher=self.first.id, limit=1)
+        self.assertEqual([event['action'] for event in data['results']], ['deleted'])
+        self.assertFalse(data['more'])
+
+    def test_unsequenced_changes_stay_hidden_until_numbered(self):
+        # Так запись выглядит на PostgreSQL между коммитом и sequence().
+        start = self.feed()['last']
+        lesson = Schedule.objects.create(group=self.group, teacher=self.first, weekday='mon',
+                                         start_time=time(9), end_time=time(10))
+        LessonChange.objects.filter(seq__gt=start).update(seq=None)
+        self.assertEqual(self.feed(since=start), {'last': start, 'more': False, 'results': []})
+        self.assertEqual(sequence(), 1)
+        [event] = self.feed(since=start)['results']
+        self.assertEqual((event['seq'], event['id']), (start + 1, lesson.id))
+
+    async def test_event_stream_sends_backlog(self):
+        lesson = await ExtraLesson.objects.acreate(teacher=self.first, date=date(2025, 3, 3), is_individual="А",
+                                                   start_time=time(9), end_time=time(10))
+        response = await self.async_client.get('/api/changes/stream/', {'since': 0, 'teacher': self.first.id})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        event = (await anext(chunks)).decode()
+        self.assertIn('event: change', event)
+        self.assertIn(f'"id": {lesson.id}', event)
+        await chunks.aclose()
+
+    async def test_local_broker_wakes_waiters(self):
+        broker = LocalBroker()
+        version = broker.version
+        self.assertFalse(await broker.wait(version, 0.01))
+        threading.Timer(0.01, broker.publish).start()
+        self.assertTrue(await broker.wait(version, 5))
+        self.assertTrue(await broker.wait(version, 0.01))
+
+
+@override_settings(EXTRA_LESSON_RETENTION_DAYS=30)
+class ExtraLessonArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        today = date.today()
+        cls.old = ExtraLesson.objects.create(teacher=teacher, date=today - timedelta(days=100), is_individual="А",
+                                             start_time=time(9), end_time=time(10))
+        cls.recent = ExtraLesson.objects.create(teacher=teacher, date=today + timedelta(days=1), is_individual="Б",
+                                                start_time=time(9), end_time=time(10))
+
+    def ids(self, **params):
+        return [row['id'] for row in self.client.get('/api/extra-lessons/', params).json()['results']]
+
+    def test_archive_moves_old_lessons_and_keeps_history_readable(self):
+        log_size = LessonChange.objects.count()
+        self.assertEqual(archive_extra_lessons(batch_size=1), 1)
+        self.assertEqual(list(ExtraLesson.objects.values_list('id', flat=True)), [self.recent.id])
+        self.assertEqual(ArchivedExtraLesson.objects.get().id, self.old.id)
+        self.assertEqual(LessonChange.objects.count(), log_size)
+
+        today = date.today()
+        self.assertEqual(self.ids(date_from=today.isoformat()), [self.recent.id])
+        history_from = (today - timedelta(days=200)).isoformat()
+        self.assertEqual(self.ids(date_from=history_from), [self.old.id, self.recent.id])
+        # Период без начала или только с концом в прошлом тоже читает архив.
+        self.assertEqual(self.ids(), [self.old.id, self.recent.id])
+        self.assertEqual(self.ids(date_to=(today - timedelta(days=50)).isoformat()), [self.old.id])
+        self.assertEqual(self.client.get(f'/api/extra-lessons/{self.old.id}/').json()['is_individual'], "А")
+        self.assertEqual(archive_extra_lessons(), 0)
+
+    def test_dry_run_only_counts(self):
+        self.assertEqual(archive_extra_lessons(dry_run=True), 1)
+        self.assertFalse(ArchivedExtraLesson.objects.exists())
+
+
+class MyDayTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name="Группа 1")
+        cls.teacher = Teacher.objects.create(name="Иван", surname="Иванов")
+        cls.today = date.today()
+        cls.lesson = Schedule.objects.create(group=cls.group, teacher=cls.teacher, weekday=weekday_code(cls.today),
+                                             start_time=time(9), end_time=time(10))
+
+    def day(self, kind, pk, **params):
+        response = self.client.get(f'/api/my-day/{kind}/{pk}/', params)
+        return response.json()['lessons'] if response.status_code == 200 else response.status_code
+
+    def test_precomputed_day_is_one_query(self):
+        with self.assertNumQueries(1):
+            lessons = self.day('group', self.group.id)
+        self.assertEqual([(lesson['id'], lesson['start'], lesson['teacher']) for lesson in lessons],
+                         [(self.lesson.id, '09:00', "Иван Иванов")])
+
+    def test_day_is_refreshed_when_lessons_change(self):
+        ExtraLesson.objects.create(teacher=self.teacher, date=self.today, is_individual="А. Б.",
+                                   start_time=time(8), end_time=time(8, 30))
+        self.assertEqual([lesson.get('student') for lesson in self.day('teacher', self.teacher.id)], ["А. Б.", None])
+
+        self.lesson.weekday = weekday_code(self.today + timedelta(days=1))
+        self.lesson.save()
+        self.assertEqual(self.day('group', self.group.id), [])
+        self.assertEqual(len(self.day('group', self.group.id, date=(self.today + timedelta(days=8)).isoformat())), 1)
+
+    def test_entity_changes_refresh_only_affected_days(self):
+        other = Group.objects.create(name="Группа 2")
+        self.assertEqual(self.day('group', other.id), [])
+        untouched = DailyTimetable.objects.get(kind='group', owner_id=other.id).updated_at
+        with self.assertNumQueries(2):
+            self.group.save()
+        self.teacher.surname = "Петров"
+        self.teacher.save()
+        self.assertEqual(DailyTimetable.objects.get(kind='group', owner_id=other.id).updated_at, untouched)
+        self.assertEqual([lesson['teacher'] for lesson in self.day('group', self.group.id)], ["Иван Петров"])
+
+    def test_missing_rows_and_errors(self):
+        DailyTimetable.objects.all().delete()
+        self.assertEqual(len(self.day('teacher', self.teacher.id)), 1)
+        self.assertTrue(DailyTimetable.objects.filter(kind='teacher', owner_id=self.teacher.id).exists())
+        self.assertEqual(len(self.day('group', self.group.id, date=(self.today + timedelta(days=28)).isoformat())), 1)
+        self.assertEqual(self.day('group', 999), 404)
+        self.assertEqual(self.day('group', self.group.id, date='x'), 400)
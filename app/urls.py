@@ -1,3 +1,24 @@
+from django.urls import path, re_path
+from rest_framework.routers import DefaultRouter
+
+from . import views, async_views
+
+router = DefaultRouter()
+router.register('schedules', views.ScheduleViewSet, basename='schedule')
+router.register('extra-lessons', views.ExtraLessonViewSet, basename='extra-lesson')
 
 urlpatterns = [
-]
+    path('schedule/import/', views.ScheduleImportView.as_view(), name='schedule-import'),
+    path('free-slots/', views.FreeSlotView.as_view(), name='free-slots'),
+    path('changes/', views.ChangeFeedView.as_view(), name='changes'),
+    path('changes/stream/', async_views.change_stream, name='change-stream'),
+    path('analytics/utilisation/', views.UtilisationView.as_view(), name='analytics-utilisation'),
+    path('analytics/heatmap/', views.HeatmapView.as_view(), name='analytics-heatmap'),
+    path('analytics/online/', views.OnlineSplitView.as_view(), name='analytics-online'),
+    path('async/schedules/', async_views.schedule_list, name='async-schedule-list'),
+    path('async/extra-lessons/', async_views.extra_lesson_list, name='async-extra-lesson-list'),
+    path('async/groups/<int:pk>/timetable/', async_views.group_timetable, name='async-group-timetable'),
+    re_path(r'^my-day/(?P<kind>group|teacher)/(?P<pk>\d+)/$', views.my_day, name='my-day'),
+    re_path(r'^export/(?P<kind>schedules|extra-lessons)\.(?P<fmt>csv|xlsx)$', views.export_lessons, name='export'),
+    re_path(r'^ical/(?P<kind>group|teacher|classroom)/(?P<pk>\d+)\.ics$', views.ical_feed, name='ical-feed'),
+] + router.urls
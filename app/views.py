@@ -0,0 +1,310 @@
+import io
+from datetime import timedelta
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+from django.views.decorators.http import condition, require_safe
+from rest_framework import status, viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from . import analytics, archive, changes, daily
+from .availability import free_slots, DAY_START, DAY_END
+from .caching import TimetableCacheMixin
+from .export import export_schedules, export_extra_lessons
+from .ical import iter_calendar, feed_etag, FEED_MODELS
+from .importer import import_schedule, import_format
+from .models import Schedule, ExtraLessonHistory, WEEKDAYS, weekday_code
+from .pagination import ScheduleCursorPagination, ExtraLessonCursorPagination
+from .renderers import CSVRenderer
+from .serializers import ScheduleSerializer, ExtraLessonSerializer
+
+WEEKDAY_CODES = [code for code, _ in WEEKDAYS]
+
+
+def int_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Ожидается целое число."})
+
+
+def date_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: "Ожидается дата в формате ГГГГ-ММ-ДД."})
+    return parsed
+
+
+def weekday_param(params):
+    value = params.get('weekday')
+    if value in (None, ''):
+        return None
+    if value not in WEEKDAY_CODES:
+        raise ValidationError({'weekday': "Ожидается один из: " + ", ".join(WEEKDAY_CODES)})
+    return value
+
+
+def time_param(params, name, default):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        parsed = parse_time(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: "Ожидается время в формате ЧЧ:ММ."})
+    return parsed
+
+
+def date_range_params(params):
+    date_from, date_to = date_param(params, 'date_from'), date_param(params, 'date_to')
+    if date_from and date_to and date_from > date_to:
+        raise ValidationError({'date_to': "Конец периода раньше начала."})
+    return date_from, date_to
+
+
+def filter_schedules(queryset, params):
+    for field in ('group', 'teacher', 'classroom'):
+        value = int_param(params, field)
+        if value is not None:
+            queryset = queryset.filter(**{f'{field}_id': value})
+
+    weekday = weekday_param(params)
+    if weekday:
+        queryset = queryset.filter(weekday=weekday)
+
+    date_from, date_to = date_range_params(params)
+    if date_from and date_to and (date_to - date_from).days < 6:
+        weekdays = {weekday_code(date_from + timedelta(days=n)) for n in range((date_to - date_from).days + 1)}
+        queryset = queryset.filter(weekday__in=weekdays)
+    return queryset
+
+
+def filter_extra_lessons(queryset, params):
+    for field in ('teacher', 'classroom'):
+        value = int_param(params, field)
+        if value is not None:
+            queryset = queryset.filter(**{f'{field}_id': value})
+
+    weekday = weekday_param(params)
+    if weekday:
+        # В Django week_day считается с воскресенья: 1 — воскресенье, 2 — понедельник.
+        queryset = queryset.filter(date__week_day=(WEEKDAY_CODES.index(weekday) + 1) % 7 + 1)
+
+    date_from, date_to = date_range_params(params)
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+    return queryset
+
+
+class ScheduleViewSet(TimetableCacheMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Еженедельное расписание. Фильтры: group, teacher, classroom, weekday,
+    date_from/date_to (оставляет дни недели, попадающие в период).
+    """
+    serializer_class = ScheduleSerializer
+    pagination_class = ScheduleCursorPagination
+
+    def get_queryset(self):
+        queryset = Schedule.objects.select_related('group', 'teacher', 'classroom')
+        return filter_schedules(queryset, self.request.query_params)
+
+
+class ExtraLessonViewSet(TimetableCacheMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Дополнительные уроки. Фильтры: teacher, classroom, weekday, date_from, date_to.
+    Архив (app/archive.py) читается, если период без date_from или любая
+    его граница раньше границы архива, и при запросе урока по id.
+    """
+    serializer_class = ExtraLessonSerializer
+    pagination_class = ExtraLessonCursorPagination
+
+    def get_queryset(self):
+        params = self.request.query_params
+        if self.action == 'retrieve':
+            lessons = ExtraLessonHistory.objects
+        else:
+            lessons = archive.extra_lessons(*date_range_params(params))
+        return filter_extra_lessons(lessons.select_related('teacher', 'classroom'), params)
+
+
+class ScheduleImportView(APIView):
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': "Файл не передан."}, status=status.HTTP_400_BAD_REQUEST)
+        name = request.data.get('format') or upload.name.rsplit('.', 1)[-1]
+        fmt = import_format(name)
+        if fmt is None:
+            return Response({'detail': f"Неизвестный формат: {name}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        result = import_schedule(stream, fmt, dry_run=dry_run)
+        response_status = status.HTTP_201_CREATED if result.created and not dry_run else status.HTTP_200_OK
+        if result.error_count and not result.created:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(result.as_dict(), status=response_status)
+
+
+class FreeSlotView(APIView):
+    """
+    Свободные окна аудиторий. Параметры: date или weekday, duration (минуты),
+    необязательные day_start, day_end, classroom (можно несколько) и teacher.
+    """
+
+    def get(self, request):
+        params = request.query_params
+        lesson_date = date_param(params, 'date')
+        weekday = weekday_param(params)
+        if lesson_date is None and weekday is None:
+            raise ValidationError({'date': "Укажите date или weekday."})
+        duration = int_param(params, 'duration')
+        if duration is None or duration <= 0:
+            raise ValidationError({'duration': "Ожидается положительное число минут."})
+        day_start = time_param(params, 'day_start', DAY_START)
+        day_end = time_param(params, 'day_end', DAY_END)
+        try:
+            classrooms = [int(pk) for pk in params.getlist('classroom')] or None
+        except ValueError:
+            raise ValidationError({'classroom': "Ожидается целое число."})
+
+        slots = free_slots(
+            duration, weekday=weekday, lesson_date=lesson_date, classrooms=classrooms,
+            teacher=int_param(params, 'teacher'), day_start=day_start, day_end=day_end,
+        )
+        return Response({'results': [
+            {
+                'classroom': slot.classroom_id,
+                'classroom_number': slot.room_number,
+                'start': slot.start.strftime('%H:%M'),
+                'end': slot.end.strftime('%H:%M'),
+            }
+            for slot in slots
+        ]})
+
+
+def change_filter(params):
+    # Журнал изменений фильтруется по одному учителю или одной группе.
+    owners = [(field, int_param(params, field)) for field in changes.OWNER_FIELDS]
+    owners = [(field, pk) for field, pk in owners if pk is not None]
+    if len(owners) > 1:
+        raise ValidationError({'teacher': "Укажите либо group, либо teacher."})
+    return owners[0] if owners else (None, None)
+
+
+class ChangeFeedView(APIView):
+    """
+    Изменения уроков после номера since (для всех, group или teacher).
+    Без since возвращается только текущий номер — с него клиент начинает
+    синхронизацию. Ответ: last (следующий since), more и results.
+    """
+
+    def get(self, request):
+        params = request.query_params
+        field, owner_id = change_filter(params)
+        since = int_param(params, 'since')
+        limit = int_param(params, 'limit') or changes.DEFAULT_LIMIT
+        if since is None:
+            return Response({'last': changes.head(), 'more': False, 'results': []})
+        events, last, more = changes.delta(since, field, owner_id, max(1, min(limit, changes.MAX_LIMIT)))
+        return Response({'last': last, 'more': more, 'results': events})
+
+
+class AnalyticsView(APIView):
+    """
+    Базовый класс отчётов о загрузке: параметры by (classroom или teacher)
+    и week (любая дата недели — учесть доп. уроки этой недели).
+    Выгрузка в CSV — ?format=csv.
+    """
+    permission_classes = [IsAdminUser]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, CSVRenderer]
+
+    def owner_field(self, params):
+        value = params.get('by', 'classroom')
+        if value not in analytics.OWNER_NAMES:
+            raise ValidationError({'by': "Ожидается classroom или teacher."})
+        return value
+
+
+class UtilisationView(AnalyticsView):
+    def get(self, request):
+        params = request.query_params
+        return Response({'results': analytics.utilisation(self.owner_field(params), date_param(params, 'week'))})
+
+
+class HeatmapView(AnalyticsView):
+    def get(self, request):
+        params = request.query_params
+        rows = analytics.heatmap(self.owner_field(params), int_param(params, 'id'), date_param(params, 'week'))
+        return Response({'results': rows})
+
+
+class OnlineSplitView(AnalyticsView):
+    def get(self, request):
+        return Response({'results': analytics.online_split(date_param(request.query_params, 'week'))})
+
+
+@require_safe
+@condition(etag_func=lambda request, kind, pk: feed_etag(kind, pk))
+def ical_feed(request, kind, pk):
+    # Календарные клиенты опрашивают ленту каждые несколько минут: при
+    # совпадении ETag ответ 304 отдаётся декоратором condition без запросов к БД.
+    obj = get_object_or_404(FEED_MODELS[kind], pk=pk)
+    response = StreamingHttpResponse(iter_calendar(kind, pk, str(obj)), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="{kind}-{pk}.ics"'
+    return response
+
+
+@require_safe
+def my_day(request, kind, pk):
+    # Готовый JSON из DailyTimetable (app/daily.py) отдаётся как есть, без DRF
+    # и сериализаторов; ?date= — другой день, по умолчанию сегодня.
+    try:
+        day = date_param(request.GET, 'date') or timezone.localdate()
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400, safe=False)
+    content = daily.day_json(kind, int(pk), day)
+    if content is None:
+        raise Http404
+    return HttpResponse(content, content_type='application/json')
+
+
+@require_safe
+@staff_member_required
+def export_lessons(request, kind, fmt):
+    # Выгрузка — инструмент администраторов, как импорт и отчёты: потоковый
+    # файл за год нагружает сервер, а не раскрывает данных сверх публичного API.
+    # Те же фильтры, что и у списков API; строки отдаются потоком.
+    try:
+        if kind == 'schedules':
+            queryset = filter_schedules(Schedule.objects.all(), request.GET)
+            return export_schedules(queryset, fmt)
+        lessons = archive.extra_lessons(*date_range_params(request.GET))
+        queryset = filter_extra_lessons(lessons.all(), request.GET)
+        return export_extra_lessons(queryset, fmt)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400, safe=False)
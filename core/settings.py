@@ -12,19 +12,41 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.utils import get_random_secret_key
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def env_bool(name, default):
+    value = os.environ.get(name)
+    return default if value is None else value.lower() in ('1', 'true', 'yes', 'on')
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-^xk5628rrc15==gc&#bj0^-ffdl+)ht_c684nw%*ys2(cptp4a'
-
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
-ALLOWED_HOSTS = [
+# Рабочий профиль: DJANGO_DEBUG=0 (см. ниже, что он меняет).
+DEBUG = env_bool('DJANGO_DEBUG', True)
+
+
+def env_secret(name, debug_default):
+    # Секреты в репозитории не хранятся: в рабочем профиле их обязательно
+    # задают через окружение, при разработке подставляется значение по умолчанию.
+    value = os.environ.get(name)
+    if value:
+        return value
+    if not DEBUG:
+        raise ImproperlyConfigured(f"Не задана переменная окружения {name} (обязательна при DJANGO_DEBUG=0).")
+    return debug_default
+
+
+# SECURITY WARNING: keep the secret key used in production secret!
+# При разработке ключ случайный: сессии живут до перезапуска процесса.
+SECRET_KEY = env_secret('DJANGO_SECRET_KEY', get_random_secret_key())
+ALLOWED_HOSTS = os.environ['DJANGO_ALLOWED_HOSTS'].split(',') if os.environ.get('DJANGO_ALLOWED_HOSTS') else [
     'tamirlan1919-ansarschdule-ed72.twc1.net',
     'localhost',
     '127.0.0.1',
@@ -45,9 +67,15 @@ INSTALLED_APPS = [
     "django.contrib.admin",
     'app',
     'rest_framework',
-    'drf_spectacular',
 ]
 
+# Схема OpenAPI (drf_spectacular) нужна только при разработке: без неё
+# рабочий процесс не импортирует генератор схемы при старте. Схема строится
+# по запросу к /api/schema/.
+API_SCHEMA = env_bool('DJANGO_API_SCHEMA', DEBUG)
+if API_SCHEMA:
+    INSTALLED_APPS.append('drf_spectacular')
+
 
 JAZZMIN_SETTINGS = {
     "site_title": "Управление школой",
@@ -56,6 +84,17 @@ JAZZMIN_SETTINGS = {
     "welcome_sign": "Добро пожаловать в панель управления",
     "show_sidebar": True,
     "navigation_expanded": True,
+    "custom_links": {
+        "app": [{
+            "name": "Календарь",
+            "url": "admin:app_schedule_calendar",
+            "icon": "fas fa-calendar-alt",
+        }, {
+            "name": "Профилирование",
+            "url": "admin_profiling",
+            "icon": "fas fa-tachometer-alt",
+        }],
+    },
 }
 
 MIDDLEWARE = [
@@ -66,6 +105,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'app.profiling.QueryProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -74,7 +114,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -82,6 +121,14 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Шаблоны компилируются один раз на процесс (в том числе при DEBUG,
+            # как и по умолчанию в Django; здесь — явно).
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -93,25 +140,48 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'default_db',
-        'USER': 'gen_user',
-        'PASSWORD': "s}lH0\T4hT-\:k",
-        'HOST': '91.135.157.147',
-        'PORT': '5432',
+if os.environ.get('DB_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'default_db'),
+            'USER': os.environ.get('DB_USER', 'gen_user'),
+            'PASSWORD': env_secret('DB_PASSWORD', ''),
+            'HOST': env_secret('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Пул соединений psycopg 3 (Django 5.1+): одно соединение на
+                # запрос не открывается заново, что важно для ASGI с тысячами
+                # одновременных запросов. При включённом пуле CONN_MAX_AGE = 0.
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 20)),
+                    'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                },
+            },
+        }
     }
-}
-
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+    if not env_bool('DB_POOL', True):
+        # Без пула соединение живёт CONN_MAX_AGE секунд и проверяется перед
+        # повторным использованием (CONN_HEALTH_CHECKS).
+        del DATABASES['default']['OPTIONS']['pool']
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0 if DEBUG else 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # BEGIN IMMEDIATE: проверка пересечений и запись урока не пересекаются
+                # с транзакциями других процессов (см. app/locking.py).
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+        }
     }
-}
-
 
 
 # Password validation
@@ -133,10 +203,50 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
-REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
 }
 
+# Алиас кэша для ответов расписания (см. app/caching.py)
+TIMETABLE_CACHE = 'default'
+
+# Профилирование запросов (см. app/profiling.py): размер кольцевого буфера,
+# бюджет запросов к БД на один ответ (None — без проверки), бюджеты
+# отдельных представлений и реакция на превышение: 'log' или 'raise'.
+QUERY_PROFILER_BUFFER = 1000
+QUERY_BUDGET = None
+QUERY_BUDGETS = {}
+QUERY_BUDGET_ACTION = 'log'
+
+# Брокер оповещений о новых записях журнала изменений (см. app/changes.py).
+# LocalBroker будит SSE-потоки только своего процесса; при нескольких
+# воркерах — PollingBroker (опрос журнала раз в CHANGE_POLL_INTERVAL секунд)
+# или свой класс с методами publish() и wait().
+CHANGE_BROKER = 'app.changes.LocalBroker'
+CHANGE_POLL_INTERVAL = 2
+
+# Доп. уроки старше стольких дней команда archive_extra_lessons переносит в
+# архивную таблицу; запросы за более ранние периоды читают и архив
+# (см. app/archive.py). None — без архивирования.
+EXTRA_LESSON_RETENTION_DAYS = 365
+
+# На сколько дней вперёд хранится готовое расписание групп и учителей для
+# /api/my-day/ (см. app/daily.py); окно сдвигает build_daily_timetables.
+DAILY_TIMETABLE_DAYS = 14
+
+
+REST_FRAMEWORK = {}
+if API_SCHEMA:
+    REST_FRAMEWORK['DEFAULT_SCHEMA_CLASS'] = 'drf_spectacular.openapi.AutoSchema'
+if not DEBUG:
+    # Браузерный интерфейс DRF тянет формы и шаблоны на первом запросе.
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ['rest_framework.renderers.JSONRenderer']
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -153,6 +263,19 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.environ.get('DJANGO_STATIC_ROOT', BASE_DIR / 'staticfiles')
+if not DEBUG:
+    # Имена файлов с хэшем содержимого (после collectstatic): их можно
+    # кэшировать навсегда.
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'},
+    }
+
+# Прогрев при импорте core.wsgi / core.asgi (см. core/startup.py): URLconf и
+# шаблоны админки загружаются до первого запроса, например в мастер-процессе
+# gunicorn --preload, а не в первом запросе каждого воркера.
+WARMUP_ON_STARTUP = env_bool('DJANGO_WARMUP', not DEBUG)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
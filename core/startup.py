@@ -0,0 +1,21 @@
+from django.conf import settings
+
+
+def warm_up():
+    """
+    Загружает то, что иначе загрузилось бы на первом запросе воркера:
+    URLconf (а с ним все представления, DRF и сериализаторы) и основные
+    шаблоны админки в кэширующий загрузчик. К БД не подключается, поэтому
+    безопасно вызывать до fork.
+    """
+    from django.template.loader import get_template
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    for name in ('admin/base_site.html', 'admin/change_list.html', 'admin/change_form.html'):
+        get_template(name)
+
+
+def maybe_warm_up():
+    if getattr(settings, 'WARMUP_ON_STARTUP', False):
+        warm_up()
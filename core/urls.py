@@ -14,10 +14,22 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
+from app.admin import profiling_view
+
 urlpatterns = [
+    path('admin/profiling/', admin.site.admin_view(profiling_view), name='admin_profiling'),
     path('admin/', admin.site.urls),
     path('api/', include('app.urls'))
 ]
+
+if settings.API_SCHEMA:
+    from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+
+    urlpatterns += [
+        path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+        path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='api-docs'),
+    ]